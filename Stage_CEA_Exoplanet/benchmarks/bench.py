@@ -0,0 +1,344 @@
+"""
+Benchmark Module
+------------------------------------------------
+This module measures the wall time and peak memory of the main steps of the
+analysis, so that performance regressions in loading, filtering,
+classification or plotting show up before they reach the notebook:
+    load/<file>             parse each catalog of `Dataset/` (no columnar cache)
+    preset/<group>/<name>   `apply_filters()` of every preset of `utils.presets`
+    classification          density ratio and composition category of every planet
+    spline/<model>          composition radius of every planet (`utils.composition`)
+    render/<plot>           every plot of `utils.plots`, drawn headlessly to PNG
+
+Cases run on the NEA table at several scale factors: 1x is the table itself,
+larger factors resample its rows with replacement (fixed seed), and the
+NEA load is timed on a CSV of the scaled table. No column is made up: only
+the presets and plots whose columns the catalog has are benchmarked (see
+`presets.supported_presets()`; e.g. "paper/Fulton_2017" is left out).
+
+Every case is timed cold: per-frame caches (statistics, sorted indexes, plot
+arrays, fits, density grids) are dropped before each repetition, and the
+best of `repeat` runs is kept. Peak memory is measured in a separate run
+with `tracemalloc` (Python and NumPy allocations). Results are compared to
+a JSON baseline; a case slower than `threshold` times its baseline is a
+regression. A case that raises is a failure. Either makes the command exit
+with status 1.
+
+Usage (from Stage_CEA_Exoplanet/):
+    python -m benchmarks.bench --save                    # record benchmarks/baseline.json
+    python -m benchmarks.bench --threshold 1.3           # compare to it
+    python -m benchmarks.bench --scales 1 10 -k preset/ -k render/
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import argparse
+import gc
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------ CONFIGURATION ------------------------
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+SCALES = (1, 10, 100)
+REPEAT = 3
+SEED = 0
+
+# A case slower than THRESHOLD x its baseline time is a regression; times
+# below NOISE_FLOOR seconds are compared as NOISE_FLOOR
+THRESHOLD = 1.5
+NOISE_FLOOR = 0.005
+
+CATALOG_SUFFIXES = ('.csv', '.vot', '.xml')
+
+# Sample drawn by the plots taking a filtered table
+RENDER_PRESET = "stellar_type/M"
+RENDER_DPI = 100
+
+# `function()` is timed; `reset()` runs untimed before each repetition
+Case = namedtuple("Case", ["name", "function", "reset"])
+Measurement = namedtuple("Measurement", ["name", "scale", "seconds", "peak_mb", "error"])
+
+
+
+
+# ------------------------ SYNTHETIC CATALOGS ------------------------
+def scaled_catalog(df, scale, seed=SEED):
+    """`scale` x the rows of `df`: the table itself for 1, else rows resampled with replacement."""
+    if scale == 1:
+        return df.reset_index(drop=True)
+    rows = np.random.default_rng(seed).integers(0, len(df), size=int(scale * len(df)))
+    return df.take(rows).reset_index(drop=True)
+
+
+
+
+# ------------------------ CASES ------------------------
+def _forget(*frames):
+    # Drop every per-frame cache, so that each repetition runs cold
+    from utils import cache
+    from utils.crossmatch import forget_joins
+    from utils.indexes import forget_indexes
+    from utils.plotdata import forget_plot_arrays
+    from utils.plots import forget_density_grids
+    from utils.regression import forget_fits
+    from utils.statistics import forget_statistics
+
+    for df in frames:
+        forget_indexes(df)
+        forget_statistics(df)
+        forget_plot_arrays(df)
+        cache.forget_fingerprint(df)
+    cache.clear_selection_cache()
+    forget_joins()
+    forget_density_grids()
+    forget_fits()
+
+
+def load_cases(paths):
+    """One case per catalog file: parse it without the columnar cache."""
+    from utils.datasets import parse_catalog
+
+    return [Case(f"load/{path.name}", lambda path=path: parse_catalog(path), gc.collect) for path in paths]
+
+
+def preset_cases(df):
+    """One case per preset configuration the catalog supports (`presets.supported_presets()`)."""
+    from utils.filters import apply_filters
+    from utils.presets import supported_presets
+
+    return [Case(f"preset/{name}", lambda filters=filters: apply_filters(df, **filters), lambda: _forget(df))
+            for name, filters in supported_presets(df=df).items()]
+
+
+def classification_cases(df):
+    from utils.classification import classify_planets, density_ratio_from_mass_radius
+
+    mass, radius = df['pl_bmasse'].to_numpy(dtype=float), df['pl_rade'].to_numpy(dtype=float)
+    return [Case("classification",
+                 lambda: classify_planets(mass, density_ratio_from_mass_radius(mass, radius)), gc.collect)]
+
+
+def spline_cases(df):
+    """One case per composition model, at each planet's mass (and equilibrium temperature)."""
+    from utils.composition import COMPOSITION_MODELS, model_temperatures, radius
+
+    mass, eqt = df['pl_bmasse'].to_numpy(dtype=float), df['pl_eqt'].to_numpy(dtype=float)
+    return [Case(f"spline/{model}",
+                 lambda model=model: radius(mass, model, eqt if model_temperatures(model) else None), gc.collect)
+            for model in COMPOSITION_MODELS]
+
+
+def _draw(function, arguments):
+    import matplotlib.pyplot as plt
+    from utils.render import headless
+
+    with headless():
+        fig = function(**arguments)
+    try:
+        fig.savefig(io.BytesIO(), format='png', dpi=RENDER_DPI)
+    finally:
+        plt.close(fig)
+
+
+def render_cases(df, jwst):
+    """One case per plot of `utils.plots` whose columns the tables have, on the `RENDER_PRESET` sample."""
+    import inspect
+    from utils import plots
+    from utils.filters import apply_filters
+    from utils.presets import ALL_PRESET_FILTERS
+    from utils.render import JWST_TABLE_PLOTS
+
+    sample = apply_filters(df, **ALL_PRESET_FILTERS[RENDER_PRESET])
+    cases = []
+    for name in plots.PLOT_COLUMNS:
+        function = getattr(plots, name)
+        tables = {'df': df, 'df_JWST': jwst, 'df_filtered': jwst if name in JWST_TABLE_PLOTS else sample}
+        read = tables['df_filtered']
+        if any(c not in read for c in plots.plot_columns(name, densities='pl_dens' in read)):
+            continue
+        arguments = {p: tables[p] for p in inspect.signature(function).parameters if p in tables}
+        cases.append(Case(f"render/{name}", lambda f=function, a=arguments: _draw(f, a),
+                          lambda: _forget(df, sample, jwst)))
+    return cases
+
+
+
+
+# ------------------------ MEASUREMENT ------------------------
+def measure(case, scale, repeat=REPEAT):
+    """
+    Best wall time of `repeat` runs of a case, and its peak traced memory
+    (MiB); a case that raises is returned with its `error` set instead.
+    """
+    try:
+        times = []
+        for _ in range(repeat):
+            case.reset()
+            start = time.perf_counter()
+            case.function()
+            times.append(time.perf_counter() - start)
+
+        case.reset()
+        tracemalloc.start()
+        try:
+            case.function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as error:
+        return Measurement(case.name, scale, None, None, f"{type(error).__name__}: {error}")
+    return Measurement(case.name, scale, min(times), peak / 2 ** 20, None)
+
+
+def _selected(name, patterns):
+    return not patterns or any(pattern in name for pattern in patterns)
+
+
+def run_benchmarks(scales=SCALES, repeat=REPEAT, patterns=(), log=print):
+    """Measure every case (or those whose name contains one of `patterns`) at each scale."""
+    from utils.datasets import DATASET_DIR, DEFAULT_DATASET, parse_catalog
+
+    nea_path = DATASET_DIR / DEFAULT_DATASET
+    nea, jwst = parse_catalog(nea_path), parse_catalog(DATASET_DIR / "JWST.csv")
+    results = []
+
+    def run(cases, scale):
+        for case in cases:
+            if _selected(case.name, patterns):
+                results.append(measure(case, scale, repeat))
+                log(_format(results[-1]))
+
+    for scale in scales:
+        df = scaled_catalog(nea, scale)
+        with tempfile.TemporaryDirectory() as directory:
+            if scale == 1:
+                paths = sorted(p for p in DATASET_DIR.iterdir() if p.suffix.lower() in CATALOG_SUFFIXES)
+            elif _selected(f"load/{nea_path.name}", patterns):
+                # Same file name, so that it is read with the NEA options
+                paths = [Path(directory) / nea_path.name]
+                df.to_csv(paths[0], index=False)
+            else:
+                paths = []
+            run(load_cases(paths), scale)
+
+        run(preset_cases(df), scale)
+        run(classification_cases(df), scale)
+        run(spline_cases(df), scale)
+        run(render_cases(df, jwst), scale)
+        _forget(df, jwst)
+
+    return results
+
+
+
+
+# ------------------------ BASELINES ------------------------
+def _key(measurement):
+    return f"{measurement.name}@{measurement.scale}x"
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Write the successful measurements (merged into an existing baseline) as JSON."""
+    path = Path(path)
+    baseline = load_baseline(path)
+    baseline.update({_key(m): dict(seconds=m.seconds, peak_mb=m.peak_mb) for m in results if m.error is None})
+    document = dict(
+        created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        python=platform.python_version(), machine=platform.platform(),
+        numpy=np.__version__, pandas=pd.__version__,
+        results=dict(sorted(baseline.items())),
+    )
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Measurements of a baseline file, keyed "<case>@<scale>x" ({} if there is none)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def failures(results):
+    """The measurements of the cases that raised."""
+    return [m for m in results if m.error is not None]
+
+
+def regressions(results, baseline, threshold=THRESHOLD):
+    """(measurement, baseline seconds, slowdown) of the cases slower than `threshold` x their baseline."""
+    slow = []
+    for m in results:
+        reference = baseline.get(_key(m))
+        if m.error is None and reference is not None:
+            slowdown = max(m.seconds, NOISE_FLOOR) / max(reference['seconds'], NOISE_FLOOR)
+            if slowdown > threshold:
+                slow.append((m, reference['seconds'], slowdown))
+    return slow
+
+
+
+
+# ------------------------ COMMAND LINE ------------------------
+def _format(m):
+    if m.error is not None:
+        return f"{_key(m):<60} FAILED ({m.error})"
+    return f"{_key(m):<60} {m.seconds * 1e3:10.1f} ms {m.peak_mb:10.1f} MiB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, filtering, classification and plotting.")
+    parser.add_argument('--scales', type=float, nargs='+', default=SCALES, help="scale factors of the NEA table")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed runs per case (the best is kept)")
+    parser.add_argument('-k', dest='patterns', action='append', default=[], help="only cases containing this text")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--save', action='store_true', help="record the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown factor counted as a regression")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) if float(s).is_integer() else s for s in args.scales]
+    results = run_benchmarks(scales, args.repeat, args.patterns)
+
+    failed = failures(results)
+    for m in failed:
+        print(f"FAILURE {_key(m)}: {m.error}")
+    if failed:
+        print(f"{len(failed)} failure(s) in {len(results)} case(s)")
+
+    if args.save:
+        print(f"Baseline written to {save_baseline(results, args.baseline)}")
+        return 1 if failed else 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}: run with --save first")
+        return 1 if failed else 0
+
+    slow = regressions(results, baseline, args.threshold)
+    for m, reference, slowdown in slow:
+        print(f"REGRESSION {_key(m)}: {m.seconds * 1e3:.1f} ms vs {reference * 1e3:.1f} ms ({slowdown:.2f}x)")
+    print(f"{len(slow)} regression(s) above {args.threshold}x in {len(results)} case(s)")
+    return 1 if slow or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# Makes `utils` importable when pytest is run from Stage_CEA_Exoplanet/ (tests/ has no package)
@@ -0,0 +1,132 @@
+"""
+Accumulator Tests
+------------------------------------------------
+Population statistics merged from row blocks, or updated by subtracting
+removed rows and merging added ones (`utils.accumulators`), must equal the
+statistics computed on the pooled rows: counts and histograms exactly,
+moments and regression sums to rounding, and the derived Gaussian and line
+fits as computed directly from the sample.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+from utils.accumulators import (
+    Histogram, LineSums, Moments, RADIUS_EDGES, accumulate, gaussian_fits, histogram, merge,
+    moments, population_statistics, regression_fits, subtract, update_population
+)
+from utils.classification import CATEGORY_LABELS, catalog_density_ratio, classify_planets
+from utils.regression import fit_lines
+
+
+def _sample(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'pl_bmasse': 10 ** rng.uniform(-0.5, 1.5, size=n),
+        'pl_rade': rng.uniform(0.5, 35, size=n),
+        'pl_orbper': 10 ** rng.uniform(-0.5, 2.5, size=n),
+        'pl_dens': rng.uniform(0.5, 12, size=n),
+    })
+    for column in df.columns:
+        df.loc[rng.random(n) < 0.05, column] = np.nan
+    return df
+
+
+def _assert_same(a, b):
+    # Counts exactly, floating-point sums to rounding
+    for x, y in zip(a, b):
+        if isinstance(x, Histogram):
+            np.testing.assert_array_equal(x.counts, y.counts)
+        elif isinstance(x, Moments):
+            np.testing.assert_array_equal(x.count, y.count)
+            np.testing.assert_allclose(x.mean, y.mean, rtol=1e-12)
+            np.testing.assert_allclose(x.m2, y.m2, rtol=1e-9)
+        else:
+            np.testing.assert_allclose(x.sums, y.sums, rtol=1e-11)
+            np.testing.assert_array_equal(x.x_min, y.x_min)
+            np.testing.assert_array_equal(x.x_max, y.x_max)
+
+
+# ------------------------ MERGING ------------------------
+def test_merged_blocks_equal_the_whole():
+    df = _sample()
+    blocks = [df.iloc[start:start + 450] for start in range(0, len(df), 450)]
+    _assert_same(accumulate(population_statistics(block) for block in blocks), population_statistics(df))
+    _assert_same(merge(population_statistics(df.iloc[:1]), population_statistics(df.iloc[1:])),
+                 population_statistics(df))
+
+
+def test_subtracted_block_equals_the_rest():
+    df = _sample()
+    rest = population_statistics(df.iloc[700:])
+    remaining = subtract(population_statistics(df), population_statistics(df.iloc[:700]))
+    for name in ('categories', 'density_histogram', 'radius', 'radius_histogram', 'period'):
+        _assert_same([getattr(remaining, name)], [getattr(rest, name)])
+    np.testing.assert_allclose(remaining.radius_period.sums, rest.radius_period.sums, rtol=1e-9)
+
+
+def test_update_equals_recompute():
+    old = _sample()
+    removed, edited = [5, 17, 400, 2999], list(range(100, 140))
+    kept = old.drop(index=removed)
+    kept.loc[edited, 'pl_rade'] *= 1.3
+    added = _sample(n=60, seed=1)
+    new = pd.concat([kept, added], ignore_index=True)
+
+    # Edited rows are taken out with their old values and merged back with their new ones
+    stats = update_population(population_statistics(old), removed=old.loc[removed + edited],
+                              added=pd.concat([kept.loc[edited], added]))
+    expected = population_statistics(new)
+    for x, y in zip(stats, expected):
+        if isinstance(x, LineSums):
+            np.testing.assert_allclose(x.sums, y.sums, rtol=1e-9)
+        else:
+            _assert_same([x], [y])
+
+
+
+
+# ------------------------ RESULTS ------------------------
+def test_fits_match_the_sample():
+    df = _sample()
+    stats = accumulate(population_statistics(df.iloc[i::3]) for i in range(3))
+    ratio = catalog_density_ratio(df)
+    measured = np.isfinite(ratio)
+    labels = classify_planets(df['pl_bmasse'].to_numpy()[measured], ratio[measured])
+
+    fits = gaussian_fits(stats)
+    for k, category in enumerate(CATEGORY_LABELS):
+        members = ratio[measured][labels == k]
+        mu, std = norm.fit(members)
+        assert fits.loc[category, 'count'] == len(members)
+        np.testing.assert_allclose([fits.loc[category, 'mu'], fits.loc[category, 'std']], [mu, std], rtol=1e-10)
+
+    line = regression_fits(stats)['radius_period']
+    direct, = fit_lines(df['pl_orbper'].to_numpy(), df['pl_rade'].to_numpy())
+    np.testing.assert_allclose([line.slope, line.intercept, line.slope_err],
+                               [direct.slope, direct.intercept, direct.slope_err], rtol=1e-9)
+    assert line.n == direct.n
+
+
+def test_histogram_matches_numpy():
+    values = np.append(np.random.default_rng(3).uniform(-1, 31, size=1000), [0.0, 30.0, np.nan])
+    counts = histogram(values, RADIUS_EDGES).counts[0]
+    inside = values[(values >= 0) & (values <= 30)]
+    np.testing.assert_array_equal(counts[1:-1], np.histogram(inside, RADIUS_EDGES)[0])
+    assert counts[0] == np.sum(values < 0) and counts[-1] == np.sum(values > 30)
+
+
+def test_moments_and_mismatched_edges():
+    values = np.random.default_rng(4).normal(size=500)
+    m = merge(moments(values[:123]), moments(values[123:]))
+    np.testing.assert_allclose([m.mean[0], m.m2[0] / m.count[0]], [values.mean(), values.var()], rtol=1e-12)
+    with pytest.raises(ValueError, match='edges'):
+        merge(histogram(values, RADIUS_EDGES), histogram(values, RADIUS_EDGES[:-1]))
@@ -0,0 +1,84 @@
+"""
+Selection Cache Tests
+------------------------------------------------
+Memoized selections (`utils.cache`) and the presets built on them must
+return the rows of the current content of a frame: a frame edited in place,
+or with a column reassigned or added, never hits the selection of its old
+content.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import cached_apply_filters, cached_apply_query, dataset_fingerprint
+from utils.filters import apply_filters, apply_query
+from utils.presets import M_type
+
+
+def _catalog(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pl_name': [f"planet {i}" for i in range(n)],
+        'st_spectype': rng.choice(['M3 V', 'K2 V', 'G5 V'], size=n),
+        'st_teff': rng.uniform(2500, 7000, size=n),
+        'pl_rade': rng.uniform(0.5, 20, size=n),
+    })
+
+
+def _assert_same_rows(result, expected):
+    np.testing.assert_array_equal(result.index.to_numpy(), expected.index.to_numpy())
+
+
+# ------------------------ STALENESS ------------------------
+def test_preset_after_loc_edit():
+    df = _catalog()
+    before = M_type(df)
+    rows = df.index[df['st_spectype'] != 'M3 V'][:5]
+    df.loc[rows, 'st_spectype'] = 'M1 V'
+    after = M_type(df)
+    assert len(after) == len(before) + 5
+    _assert_same_rows(after, apply_filters(df, st_type='M'))
+
+
+def test_cached_filters_after_in_place_shift():
+    df = _catalog()
+    cached_apply_filters(df, rade_max=4)
+    df['pl_rade'] *= 0.1
+    _assert_same_rows(cached_apply_filters(df, rade_max=4), apply_filters(df, rade_max=4))
+
+
+def test_cached_query_after_column_reassigned():
+    df = _catalog()
+    cached_apply_query(df, "st_teff < 4000")
+    df['st_teff'] = df['st_teff'].to_numpy()[::-1].copy()
+    _assert_same_rows(cached_apply_query(df, "st_teff < 4000"), apply_query(df, "st_teff < 4000"))
+
+
+def test_fingerprint_follows_the_content():
+    df = _catalog()
+    first = dataset_fingerprint(df)
+    assert dataset_fingerprint(df) == first
+    df['pl_rade'] = df['pl_rade'] + 1
+    assert dataset_fingerprint(df) != first
+    second = dataset_fingerprint(df)
+    df['pl_bmasse'] = 1.0
+    assert dataset_fingerprint(df) != second
+
+
+
+
+# ------------------------ WITHOUT COPY-ON-WRITE ------------------------
+def test_without_copy_on_write_selections_are_evaluated(monkeypatch):
+    from utils import statistics
+
+    monkeypatch.setattr(statistics, '_copy_on_write', lambda: False)
+    df = _catalog()
+    M_type(df)
+    df.loc[df.index[:20], 'st_spectype'] = 'M0 V'
+    _assert_same_rows(M_type(df), apply_filters(df, st_type='M'))
@@ -0,0 +1,103 @@
+"""
+Chunked Filtering Tests
+------------------------------------------------
+Filtering a catalog in row blocks across worker processes (`utils.chunked`)
+must select exactly the rows `filter_mask()` / `query_mask()` select on the
+whole table, from a CSV file, a Feather file, `.npy` columns or a DataFrame
+in shared memory, in the catalog order and with the requested columns.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import datasets
+from utils.chunked import chunked_filters, chunked_query
+from utils.datasets import parse_catalog, write_columnar
+from utils.filters import filter_mask, query_mask
+
+CONFIGURATIONS = [
+    dict(st_type='M', rade_max=4),
+    dict(Teff_min=4700, Teff_max=6500, rade_err=0.08),
+    dict(mission='Kepler', multiplicity_min=2),
+    dict(rade_min=30),
+]
+QUERY = "st_teff between 4700 6500 and pl_rade / pl_radeerr1 > 12 and st_spectype startswith 'G'"
+
+
+def _catalog(n=2500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'pl_name': [f"planet {i}" for i in range(n)],
+        'disc_facility': rng.choice(['Kepler', 'K2', 'TESS'], size=n),
+        'st_spectype': rng.choice(['M3 V', 'K2 V', 'G5 V'], size=n),
+        'st_teff': rng.uniform(2500, 7000, size=n).round(1),
+        'pl_rade': rng.uniform(0.5, 20, size=n).round(3),
+        'sy_pnum': rng.integers(1, 7, size=n),
+    })
+    df['pl_radeerr1'] = (df['pl_rade'] * rng.uniform(0, 0.2, size=n)).round(4)
+    df['pl_radeerr2'] = -df['pl_radeerr1']
+    for column in ('st_spectype', 'st_teff', 'pl_radeerr1'):
+        df[column] = df[column].mask(rng.random(n) < 0.1)
+    return df
+
+
+@pytest.fixture(scope='module')
+def sources(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("chunked")
+    csv = folder / "population.csv"
+    _catalog().to_csv(csv, index=False)
+    df = parse_catalog(csv)
+    paths = {'csv': csv, 'npcols': folder / "population.npcols"}
+    write_columnar(df, paths['npcols'])
+    if datasets.feather is not None:
+        paths['feather'] = folder / "population.feather"
+        write_columnar(df, paths['feather'])
+    return df, paths
+
+
+def _source(sources, kind):
+    df, paths = sources
+    if kind == 'feather' and kind not in paths:
+        pytest.skip("pyarrow is not installed")
+    return df, (df if kind == 'frame' else paths[kind])
+
+
+# ------------------------ EQUIVALENCE ------------------------
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('kind', ['csv', 'feather', 'npcols', 'frame'])
+def test_filters_match_filter_mask(sources, kind, workers):
+    df, source = _source(sources, kind)
+    for filters in CONFIGURATIONS:
+        rows = chunked_filters(source, as_index=True, workers=workers, chunk_rows=300, **filters)
+        np.testing.assert_array_equal(rows, np.flatnonzero(filter_mask(df, **filters)), err_msg=str(filters))
+
+
+@pytest.mark.parametrize('kind', ['csv', 'feather', 'npcols', 'frame'])
+def test_query_rows_and_columns(sources, kind):
+    df, source = _source(sources, kind)
+    columns = ['pl_name', 'pl_rade', 'st_spectype']
+    selected = chunked_query(source, QUERY, columns=columns, workers=2, chunk_rows=400)
+    expected = df[columns].iloc[np.flatnonzero(query_mask(df, QUERY))]
+    assert list(selected.columns) == columns
+    np.testing.assert_array_equal(selected.index, expected.index)
+    np.testing.assert_array_equal(selected['pl_name'].to_numpy(), expected['pl_name'].to_numpy())
+    np.testing.assert_array_equal(selected['pl_rade'].to_numpy(), expected['pl_rade'].to_numpy())
+
+
+def test_csv_rows_match_apply_filters(sources):
+    df, paths = sources
+    selected = chunked_filters(paths['csv'], workers=2, chunk_rows=500, st_type='K', rade_max=4)
+    pd.testing.assert_frame_equal(selected, df[filter_mask(df, st_type='K', rade_max=4)], check_dtype=False)
+
+
+def test_missing_column_is_reported(sources):
+    _, paths = sources
+    with pytest.raises(KeyError, match='sy_kepmag'):
+        chunked_filters(paths['csv'], as_index=True, workers=1, kp=14.2)
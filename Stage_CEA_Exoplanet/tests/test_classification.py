@@ -0,0 +1,79 @@
+"""
+Classification Tests
+------------------------------------------------
+The vectorised classification (`utils.classification`) must label every
+planet as the original row-by-row `classify_planet()` of the plots did
+(reproduced below), thresholds and missing values included.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.classification import (
+    CATEGORY_COLORS, CATEGORY_LABELS, ROCKY_DENSITY_RATIO, WATER_WORLD_MAX_MASS, as_categorical,
+    catalog_density_ratio, category_colors, classify_planet, classify_planets, density_ratio,
+    density_ratio_from_mass_radius
+)
+
+
+def _scalar_color(mass, density_ratio):
+    # The original classification, applied row by row with DataFrame.apply
+    mid_density = (1 + 2.11 / 4.79) / 2
+
+    if density_ratio >= mid_density:
+        return 'saddlebrown'      # Earth-like
+    elif mass <= 6:
+        return 'lightskyblue'     # Water world
+    else:
+        return 'darkblue'         # Sub-Neptune
+
+
+def _sample(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    mass = 10 ** rng.uniform(-1, 2, size=n)
+    ratio = rng.uniform(0, 2, size=n)
+    mass[rng.random(n) < 0.05] = np.nan
+    ratio[rng.random(n) < 0.05] = np.nan
+    # Values on the thresholds themselves
+    mass[:4] = WATER_WORLD_MAX_MASS
+    ratio[:2] = ROCKY_DENSITY_RATIO
+    ratio[2:4] = np.nextafter(ROCKY_DENSITY_RATIO, 0)
+    return mass, ratio
+
+
+# ------------------------ SCALAR EQUIVALENCE ------------------------
+def test_colors_match_the_scalar_classification():
+    mass, ratio = _sample()
+    expected = [_scalar_color(m, r) for m, r in zip(mass, ratio)]
+    assert category_colors(classify_planets(mass, ratio)).tolist() == expected
+    assert [classify_planet(m, r) for m, r in zip(mass[:200], ratio[:200])] == expected[:200]
+
+
+def test_labels_from_series_and_lists():
+    mass, ratio = _sample(n=300, seed=1)
+    labels = classify_planets(pd.Series(mass), pd.Series(ratio))
+    assert labels.dtype == np.int8
+    np.testing.assert_array_equal(classify_planets(mass.tolist(), ratio.tolist()), labels)
+    names = dict(zip(CATEGORY_COLORS, CATEGORY_LABELS))
+    assert list(as_categorical(labels)) == [names[_scalar_color(m, r)] for m, r in zip(mass, ratio)]
+
+
+
+
+# ------------------------ DENSITY RATIO ------------------------
+def test_catalog_density_ratio():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({'pl_dens': rng.uniform(1, 10, size=100),
+                       'pl_bmasse': rng.uniform(0.5, 20, size=100),
+                       'pl_rade': rng.uniform(0.5, 4, size=100)})
+    np.testing.assert_allclose(catalog_density_ratio(df), df['pl_dens'] / 4.79)
+    np.testing.assert_allclose(catalog_density_ratio(df.drop(columns='pl_dens')),
+                               density_ratio_from_mass_radius(df['pl_bmasse'], df['pl_rade']))
+    # An Earth mass of an Earth radius has the bulk density of the Earth
+    np.testing.assert_allclose(density_ratio_from_mass_radius([1.0], [1.0]), density_ratio([5.514]))
@@ -0,0 +1,102 @@
+"""
+Cross-Match Tests
+------------------------------------------------
+NEA planets must be matched with JWST targets (`utils.crossmatch`) on
+normalised names first, then on position within the tolerance, with the
+planet letter or the orbital period telling planets of one system apart.
+Every planet the original `pl_name.isin(df_JWST['Planet'])` test flagged
+stays flagged, and a join follows edits of the planet table.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.crossmatch import jwst_observations, normalize_names, observed_by_jwst, parse_degrees
+
+ARCSEC = 1 / 3600
+
+# Minus sign of negative declinations as read from JWST.csv (UTF-8 replacement character decoded as latin1)
+MINUS = 'ï¿½'
+
+
+def _jwst():
+    return pd.DataFrame({
+        'Planet':     ['GJ 436 b', 'GJ 436 b', 'WASP-39 b', 'Kepler-51 d', 'HD 1000 b', 'LHS 3844 b'],
+        'RA (deg)':   ['175.55', '175.55', '217.33', '295.90', '10.0', '340.5'],
+        'Dec (deg)':  ['26.70', '26.70', f'{MINUS}3.44', '49.56', '20.0', f'{MINUS}69.17'],
+        'Period (d)': [2.64, 2.64, 4.06, 130.2, 7.5, 0.46],
+        'prog_no':    [1185, 2000, 1366, 2454, 3000, 1846],
+        'Cycle':      [1, 2, 1, 2, 3, 1],
+        'Prog Type':  ['GTO', 'GO', 'ERS', 'GO', 'GO', 'GO'],
+        'Obs type':   ['Transit', 'Eclipse', 'Transit', 'Transit', 'Transit', 'Eclipse'],
+    })
+
+
+def _planets():
+    return pd.DataFrame({
+        'pl_name':   ['GJ-436b', 'wasp_39.b', 'Kepler-51 d', 'TOI 1000.01', 'HD 1000 c',
+                      'LHS 3844 b', 'Kepler-51 b', 'Far away b', None],
+        'ra':        [175.55, 217.33, np.nan, 10.0 + 2 * ARCSEC, 10.0, 340.5, 295.90, 10.0 + 60 * ARCSEC, 1.0],
+        'dec':       [26.70, -3.44, np.nan, 20.0, 20.0, -69.17, 49.56, 20.0, 1.0],
+        'pl_orbper': [2.64, 4.06, 130.2, 7.52, 7.5, 0.46, 45.2, 7.5, 1.0],
+    })
+
+
+def _matched(join):
+    return {row: sorted(group['prog_no']) for row, group in join.groupby('row')}
+
+
+# ------------------------ MATCHING ------------------------
+def test_names_and_positions():
+    join = jwst_observations(_planets(), _jwst())
+    assert _matched(join) == {
+        0: [1185, 2000],    # every observation of a name matched with another spelling
+        1: [1366],
+        2: [2454],          # by name, without coordinates
+        3: [3000],          # by position: no letter, period within 2%
+        5: [1846],
+    }
+    assert join.loc[join['row'] == 3, 'match'].tolist() == ['position']
+    assert (join.loc[join['row'] != 3, 'match'] == 'name').all()
+    assert join.loc[join['row'] == 0, 'pl_name'].tolist() == ['GJ-436b', 'GJ-436b']
+
+
+def test_position_needs_the_same_planet():
+    planets = _planets()
+    # Same system and position, but another letter (HD 1000 c), another period
+    # (Kepler-51 b) or beyond the tolerance (Far away b): no match
+    observed = observed_by_jwst(planets, _jwst())
+    assert not observed[[4, 6, 7, 8]].any()
+    assert observed_by_jwst(planets, _jwst(), tolerance_arcsec=120)[7]
+
+
+def test_flags_every_exact_name():
+    jwst = _jwst()
+    planets = pd.DataFrame({'pl_name': jwst['Planet'].tolist() + ['GJ 1214 b'],
+                            'ra': np.nan, 'dec': np.nan, 'pl_orbper': np.nan})
+    baseline = planets['pl_name'].isin(jwst['Planet']).to_numpy()
+    np.testing.assert_array_equal(observed_by_jwst(planets, jwst), baseline)
+
+
+
+
+# ------------------------ NORMALISATION ------------------------
+def test_normalisation():
+    assert normalize_names(['GJ 436 b', 'gj-436_B', 'G.J 436b', None]).tolist()[:3] == ['gj436b'] * 3
+    np.testing.assert_array_equal(parse_degrees([f'{MINUS}69.17', '12.5', 'n/a', ' 3 ']), [-69.17, 12.5, np.nan, 3.0])
+
+
+
+
+# ------------------------ STALENESS ------------------------
+def test_join_after_rename():
+    planets, jwst = _planets(), _jwst()
+    jwst_observations(planets, jwst)
+    planets.loc[7, 'pl_name'] = 'WASP-39 b'
+    assert _matched(jwst_observations(planets, jwst))[7] == [1366]
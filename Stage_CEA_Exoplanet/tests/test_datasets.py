@@ -0,0 +1,137 @@
+"""
+Dataset Tests
+------------------------------------------------
+The columnar cache of a catalog (`utils.datasets`) must give back the table
+parsed from the source, Feather or `.npy` columns alike, and be dropped as
+soon as the source changes on disk: a rewritten catalog is parsed again,
+while a catalog only touched keeps its cache. Tables returned by
+`load_dataset()` can be modified without affecting the memoized one.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import datasets
+from utils.datasets import (
+    CACHE_DIRNAME, invalidate_dataset, load_dataset, read_catalog, read_columnar, shared_dataset,
+    write_columnar
+)
+
+
+def _catalog(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pl_name': [f"planet {i}" if i % 7 else None for i in range(n)],
+        'sy_pnum': rng.integers(1, 7, size=n),
+        'pl_rade': np.where(rng.random(n) < 0.2, np.nan, rng.uniform(0.5, 20, size=n).round(3)),
+        'st_spectype': rng.choice(['M3 V', 'K2 V', 'G5 V'], size=n),
+    })
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "catalog.csv"
+    _catalog().to_csv(path, index=False)
+    yield path
+    invalidate_dataset(path)
+
+
+def _rewrite(path, df):
+    # New content with a later mtime, as a fresh export would have
+    mtime = path.stat().st_mtime_ns
+    df.to_csv(path, index=False)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def _no_parsing(monkeypatch):
+    def parse(path):
+        raise AssertionError(f"{path.name} parsed instead of read from the cache")
+    monkeypatch.setattr(datasets, 'parse_catalog', parse)
+
+
+# ------------------------ ROUND TRIP ------------------------
+@pytest.mark.parametrize('pyarrow', [True, False])
+def test_cache_round_trip(csv, monkeypatch, pyarrow):
+    if not pyarrow:
+        monkeypatch.setattr(datasets, 'feather', None)
+    elif datasets.feather is None:
+        pytest.skip("pyarrow is not installed")
+
+    parsed = read_catalog(csv)
+    suffix = '.feather' if pyarrow else '.npcols'
+    assert sorted(p.suffix for p in (csv.parent / CACHE_DIRNAME).glob(f"{csv.name}.*")) == sorted(['.json', suffix])
+
+    _no_parsing(monkeypatch)
+    pd.testing.assert_frame_equal(read_catalog(csv), parsed)
+    pd.testing.assert_frame_equal(read_catalog(csv, ['pl_rade', 'pl_name']), parsed[['pl_rade', 'pl_name']])
+
+
+@pytest.mark.parametrize('suffix', ['.feather', '.npcols'])
+def test_columnar_rows(tmp_path, suffix):
+    if suffix == '.feather' and datasets.feather is None:
+        pytest.skip("pyarrow is not installed")
+    df = _catalog()
+    target = tmp_path / f"table{suffix}"
+    write_columnar(df, target)
+    pd.testing.assert_frame_equal(read_columnar(target, ['sy_pnum', 'pl_name'], slice(10, 30)),
+                                  df[['sy_pnum', 'pl_name']].iloc[10:30].reset_index(drop=True))
+
+
+
+
+# ------------------------ INVALIDATION ------------------------
+def test_rewritten_catalog_is_parsed_again(csv):
+    first = load_dataset(csv)
+    changed = _catalog(seed=1)
+    _rewrite(csv, changed)
+    reloaded = load_dataset(csv)
+    assert reloaded is not first
+    pd.testing.assert_frame_equal(reloaded, read_catalog(csv, use_cache=False))
+    np.testing.assert_array_equal(reloaded['sy_pnum'], changed['sy_pnum'])
+    assert len(list((csv.parent / CACHE_DIRNAME).glob(f"{csv.name}.*"))) == 2     # stale copy removed
+
+
+def test_touched_catalog_keeps_its_cache(csv, monkeypatch):
+    parsed = read_catalog(csv)
+    _rewrite(csv, pd.read_csv(csv))         # same bytes, later mtime
+    _no_parsing(monkeypatch)
+    pd.testing.assert_frame_equal(read_catalog(csv), parsed)
+
+
+def test_memoized_until_modified(csv):
+    first = shared_dataset(csv, columns=['pl_rade'])
+    assert shared_dataset(csv, columns=['pl_rade']) is first
+    _rewrite(csv, _catalog(seed=2))
+    assert shared_dataset(csv, columns=['pl_rade']) is not first
+
+
+
+
+# ------------------------ ISOLATION ------------------------
+def test_loaded_tables_do_not_share_edits(csv):
+    parsed = read_catalog(csv, use_cache=False)
+    df = load_dataset(csv)
+    df.loc[df.index[:10], 'pl_rade'] = -1.0
+    df['sy_pnum'] *= 10
+    df['extra'] = 1
+    del df['pl_name']
+    pd.testing.assert_frame_equal(load_dataset(csv), parsed)
+    pd.testing.assert_frame_equal(shared_dataset(csv), parsed)
+
+
+def test_loaded_tables_without_copy_on_write(csv, monkeypatch):
+    from utils import statistics
+
+    monkeypatch.setattr(statistics, '_copy_on_write', lambda: False)
+    # Without copy-on-write, writes through a column array would reach any frame sharing it
+    df, shared = load_dataset(csv), shared_dataset(csv)
+    assert not any(np.shares_memory(df[c].to_numpy(), shared[c].to_numpy()) for c in ('sy_pnum', 'pl_rade'))
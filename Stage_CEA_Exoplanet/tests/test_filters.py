@@ -0,0 +1,281 @@
+"""
+Filter Tests
+------------------------------------------------
+Compiled filters must select the rows of the original chained pandas
+`apply_filters()` (reproduced below), whether written as keywords, as the
+equivalent query string or in a batch. Filtering must stay pure when the
+planner caches per-frame state (column statistics, sorted indexes): a frame
+edited in place, or with a column reassigned, is filtered on its current
+values, also without pandas copy-on-write (where nothing cached is reused).
+Presets reading columns a catalog lacks fail clearly, and batch evaluation
+leaves them out.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.filters import (
+    apply_filters, apply_query, batch_filter_masks, filter_index, filter_mask, keyword_query
+)
+
+
+def _catalog(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pl_name': [f"planet {i}" for i in range(n)],
+        'disc_facility': rng.choice(['Kepler', 'K2', 'TESS'], size=n),
+        'st_teff': rng.uniform(2500, 7000, size=n),
+        'st_met': rng.normal(0, 0.2, size=n),
+        'pl_rade': rng.uniform(0.5, 20, size=n),
+    })
+
+
+def _expected(df, column, test):
+    return np.flatnonzero(test(df[column].to_numpy()))
+
+
+def _full_catalog(n=2000, seed=1):
+    # Every column read by the filter keywords, with missing values
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'disc_facility': rng.choice(['Kepler', 'K2', 'TESS'], size=n),
+        'discoverymethod': rng.choice(['Transit', 'Radial Velocity'], size=n),
+        'disc_year': rng.integers(1995, 2025, size=n),
+        'st_spectype': rng.choice(['M3 V', 'K2 V', 'G5 V', 'F8'], size=n),
+        'sy_pnum': rng.integers(1, 7, size=n),
+    })
+    for column, low, high in [('sy_kepmag', 8, 18), ('st_teff', 2500, 7000), ('st_met', -0.5, 0.5),
+                              ('st_age', 0, 13), ('st_rad', 0.1, 3), ('pl_rade', 0.5, 20),
+                              ('pl_bmasse', 0.1, 300), ('pl_dens', 0.1, 15), ('pl_orbeccen', 0, 0.9),
+                              ('pl_trandep', 0, 20), ('pl_eqt', 100, 3000), ('pl_orbper', 0.5, 500),
+                              ('pl_imppar', 0, 1.2)]:
+        df[column] = rng.uniform(low, high, size=n)
+    for value, error in [('st_rad', 'st_raderr'), ('pl_rade', 'pl_radeerr'), ('pl_bmasse', 'pl_bmasseerr')]:
+        df[f"{error}1"] = df[value] * rng.uniform(0, 0.4, size=n)
+        df[f"{error}2"] = -df[value] * rng.uniform(0, 0.4, size=n)
+    for column in df.columns:
+        df[column] = df[column].mask(rng.random(n) < 0.1)
+    return df.sample(frac=1, random_state=seed).set_index(rng.permutation(n) * 3)
+
+
+def _relative_error(df, value, error):
+    mask = df[value].notna() & df[f"{error}1"].notna() & df[f"{error}2"].notna()
+    return mask, df[[f"{error}1", f"{error}2"]].max(axis=1) / df[value]
+
+
+def _baseline_filter(df, keyword, v):
+    # One cut of the original apply_filters(), on pandas Series
+    if keyword == 'stellar_radius_err_max':
+        mask, snr = _relative_error(df, 'st_rad', 'st_raderr')
+        return mask & (snr < v)
+    if keyword == 'rade_err':
+        mask, snr = _relative_error(df, 'pl_rade', 'pl_radeerr')
+        return mask & (snr < v)
+    if keyword == 'mass_err':
+        mask, snr = _relative_error(df, 'pl_bmasse', 'pl_bmasseerr')
+        return mask & (snr < v)
+    if keyword == 'Fulton_2017':
+        mask = df['st_teff'].notna() & df['st_rad'].notna()
+        return mask & (df['st_rad'] > 10 ** (0.00025 * (df['st_teff'] / (1 - 5500) + 0.20)))
+    return {
+        'mission': lambda: df['disc_facility'].notna() & (df['disc_facility'] == v),
+        'discovery_method': lambda: df['discoverymethod'].notna() & (df['discoverymethod'] == v),
+        'date_min': lambda: df['disc_year'] > v,
+        'date_max': lambda: df['disc_year'] < v,
+        'kp': lambda: df['sy_kepmag'] < v,
+        'st_type': lambda: df['st_spectype'].fillna('').str.startswith(v),
+        'Teff_min': lambda: df['st_teff'] > v,
+        'Teff_max': lambda: df['st_teff'] < v,
+        'metallicity_min': lambda: df['st_met'] > v,
+        'metallicity_max': lambda: df['st_met'] < v,
+        'age_min': lambda: df['st_age'] > v,
+        'age_max': lambda: df['st_age'] < v,
+        'rade_min': lambda: df['pl_rade'] > v,
+        'rade_max': lambda: df['pl_rade'] < v,
+        'mass_min': lambda: df['pl_bmasse'] > v,
+        'mass_max': lambda: df['pl_bmasse'] < v,
+        'density_min': lambda: df['pl_dens'] > v,
+        'density_max': lambda: df['pl_dens'] < v,
+        'eccentricity_max': lambda: df['pl_orbeccen'] < v,
+        'transit_depth_min': lambda: df['pl_trandep'] > v,
+        'transit_depth_max': lambda: df['pl_trandep'] < v,
+        'eqt_min': lambda: df['pl_eqt'] > v,
+        'eqt_max': lambda: df['pl_eqt'] < v,
+        'P': lambda: df['pl_orbper'] < v,
+        'b': lambda: df['pl_imppar'] < v,
+        'multiplicity_min': lambda: df['sy_pnum'] >= v,
+        'multiplicity_max': lambda: df['sy_pnum'] <= v,
+    }[keyword]()
+
+
+def _baseline(df, **filters):
+    # The original apply_filters(): one boolean slice of a copy per cut
+    df_filtered = df.copy()
+    for keyword, value in filters.items():
+        if value is not None and value is not False:
+            df_filtered = df_filtered[_baseline_filter(df_filtered, keyword, value)]
+    return df_filtered
+
+
+KEYWORD_VALUES = {
+    'mission': ['Kepler', 'K2'], 'discovery_method': ['Transit'], 'date_min': [2010], 'date_max': [2017],
+    'kp': [14.2], 'st_type': ['M', 'G', 'K'], 'Teff_min': [4700], 'Teff_max': [6500],
+    'metallicity_min': [-0.1], 'metallicity_max': [0.2], 'age_min': [2], 'age_max': [10],
+    'stellar_radius_err_max': [0.1], 'Fulton_2017': [True], 'rade_min': [1], 'rade_max': [4.0],
+    'rade_err': [0.08], 'mass_min': [1], 'mass_max': [20], 'mass_err': [0.25], 'density_min': [3],
+    'density_max': [15], 'eccentricity_max': [0.3], 'transit_depth_min': [1], 'transit_depth_max': [15],
+    'eqt_min': [300], 'eqt_max': [1500], 'P': [50], 'b': [0.7], 'multiplicity_min': [2], 'multiplicity_max': [4],
+}
+
+
+def _configurations(count=150, seed=2):
+    rng = np.random.default_rng(seed)
+    keywords = list(KEYWORD_VALUES)
+    configurations = [{keyword: KEYWORD_VALUES[keyword][0]} for keyword in keywords]
+    for _ in range(count):
+        chosen = rng.choice(keywords, size=rng.integers(0, 7), replace=False)
+        configurations.append({k: KEYWORD_VALUES[k][rng.integers(len(KEYWORD_VALUES[k]))] for k in chosen})
+    return configurations
+
+
+# ------------------------ BASELINE EQUIVALENCE ------------------------
+def test_keywords_match_the_baseline():
+    df = _full_catalog()
+    for filters in _configurations():
+        pd.testing.assert_frame_equal(apply_filters(df, **filters), _baseline(df, **filters))
+
+
+def test_queries_match_the_keywords():
+    df = _full_catalog()
+    for filters in _configurations(count=50):
+        np.testing.assert_array_equal(apply_query(df, keyword_query(**filters)).index,
+                                      _baseline(df, **filters).index)
+
+
+def test_query_conditions_match_pandas():
+    df = _full_catalog()
+    queries = {
+        "st_teff between 4700 6500 and pl_rade < 4":
+            (df['st_teff'] >= 4700) & (df['st_teff'] <= 6500) & (df['pl_rade'] < 4),
+        "st_spectype startswith 'M' and pl_rade / pl_radeerr1 > 12":
+            df['st_spectype'].fillna('').str.startswith('M') & (df['pl_rade'] / df['pl_radeerr1'] > 12),
+        "disc_facility in ('K2', 'TESS') and 1 < pl_orbper <= 10":
+            df['disc_facility'].isin(['K2', 'TESS']) & (df['pl_orbper'] > 1) & (df['pl_orbper'] <= 10),
+        "log10(pl_bmasse) - 2 * log10(pl_rade) >= 0.5 and disc_facility != 'Kepler'":
+            (np.log10(df['pl_bmasse']) - 2 * np.log10(df['pl_rade']) >= 0.5)
+            & df['disc_facility'].notna() & (df['disc_facility'] != 'Kepler'),     # missing values fail `!=` too
+    }
+    for query, expected in queries.items():
+        pd.testing.assert_frame_equal(apply_query(df, query), df[expected], obj=query)
+
+
+def test_batch_matches_single_configurations():
+    df = _full_catalog()
+    configurations = {f"c{i}": filters for i, filters in enumerate(_configurations(count=40))}
+    masks = batch_filter_masks(df, configurations)
+    indices = batch_filter_masks(df, configurations, as_index=True)
+    for name, filters in configurations.items():
+        np.testing.assert_array_equal(masks[name].to_numpy(), filter_mask(df, **filters))
+        np.testing.assert_array_equal(indices[name], np.flatnonzero(filter_mask(df, **filters)))
+
+
+
+
+# ------------------------ STATISTICS ------------------------
+def test_range_cut_after_in_place_shift():
+    df = _catalog()
+    assert len(apply_filters(df, metallicity_min=1.0)) == 0     # beyond the column max
+    df['st_met'] += 10
+    np.testing.assert_array_equal(filter_index(df, metallicity_min=1.0), _expected(df, 'st_met', lambda v: v > 1))
+
+
+def test_text_value_after_loc_edit():
+    df = _catalog()
+    assert len(apply_filters(df, mission='Foo')) == 0           # absent from the frequency table
+    df.loc[df.index[:100], 'disc_facility'] = 'Foo'
+    np.testing.assert_array_equal(filter_index(df, mission='Foo'), np.arange(100))
+
+
+def test_column_reassigned():
+    df = _catalog()
+    filter_index(df, metallicity_max=0)
+    df['st_met'] = -df['st_met']
+    np.testing.assert_array_equal(filter_index(df, metallicity_max=0), _expected(df, 'st_met', lambda v: v < 0))
+
+
+
+
+def test_without_copy_on_write_plans_are_scanned(monkeypatch):
+    from utils import statistics
+
+    monkeypatch.setattr(statistics, '_copy_on_write', lambda: False)
+    df = _catalog()
+    assert statistics.column_version(df['st_met']) is None
+    assert len(apply_filters(df, metallicity_min=1.0)) == 0
+    assert not statistics._statistics.get(id(df))
+    df.loc[df.index[:10], 'st_met'] = 5.0
+    np.testing.assert_array_equal(filter_index(df, metallicity_min=1.0), np.arange(10))
+
+
+
+
+# ------------------------ SORTED INDEXES ------------------------
+def test_indexed_range_after_in_place_shift():
+    df = _catalog()
+    before = filter_index(df, Teff_min=5000)
+    df['st_teff'] += 10000
+    after = filter_index(df, Teff_min=5000)
+    assert len(after) == len(df) > len(before)
+
+
+def test_indexed_range_after_loc_edit():
+    df = _catalog()
+    filter_index(df, rade_min=1, rade_max=4)
+    df.loc[df.index[:50], 'pl_rade'] = 2.0
+    np.testing.assert_array_equal(filter_index(df, rade_min=1, rade_max=4),
+                                  _expected(df, 'pl_rade', lambda v: (v > 1) & (v < 4)))
+
+
+def test_indexed_range_after_column_reassigned():
+    df = _catalog()
+    filter_index(df, Teff_max=4000)
+    df['st_teff'] = df['st_teff'].to_numpy()[::-1].copy()
+    np.testing.assert_array_equal(filter_index(df, Teff_max=4000), _expected(df, 'st_teff', lambda v: v < 4000))
+
+
+
+
+def test_indexes_without_copy_on_write_are_not_reused(monkeypatch):
+    from utils import indexes, statistics
+    from utils.filters import compile_filters
+
+    monkeypatch.setattr(statistics, '_copy_on_write', lambda: False)
+    df = _catalog()
+    plan = compile_filters(Teff_min=5000)
+    before = indexes.range_rows(df, plan)
+    assert not indexes._indexes.get(id(df))
+    df.loc[df.index[:50], 'st_teff'] = 9000.0
+    after = indexes.range_rows(df, plan)
+    np.testing.assert_array_equal(after, _expected(df, 'st_teff', lambda v: v > 5000))
+    assert len(after) > len(before)
+
+
+
+
+# ------------------------ MISSING COLUMNS ------------------------
+def test_presets_needing_missing_columns_are_skipped():
+    from utils.presets import ALL_PRESET_FILTERS, evaluate_presets
+
+    df = _catalog().assign(st_spectype='M5 V')
+    masks = evaluate_presets(df=df)
+    assert 'paper/Fulton_2017' not in masks and 'stellar_type/M' in masks
+    assert masks['stellar_type/M'].all()
+    with pytest.raises(KeyError, match='sy_kepmag'):
+        apply_filters(df, **ALL_PRESET_FILTERS['paper/Fulton_2017'])
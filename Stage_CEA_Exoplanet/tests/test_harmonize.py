@@ -0,0 +1,83 @@
+"""
+Harmonisation Tests
+------------------------------------------------
+The merged catalog kept in memory by `utils.harmonize` must follow its
+sources: a rewritten source is merged again and replaces the stale table,
+a touched but unchanged one keeps it, and at most `MERGED_CACHE_SIZE`
+tables are kept.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import datasets, harmonize
+from utils.harmonize import CANONICAL_COLUMNS, TEXT_COLUMNS, load_harmonized
+
+NEA_COLUMNS = {c: (c, None if c in TEXT_COLUMNS else 1.0) for c in CANONICAL_COLUMNS}
+
+
+def _catalog(names, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(names)
+    return pd.DataFrame({'pl_name': names, 'ra': rng.uniform(0, 360, size=n), 'dec': rng.uniform(-90, 90, size=n),
+                         'pl_orbper': rng.uniform(1, 100, size=n), 'pl_rade': rng.uniform(0.5, 4, size=n)})
+
+
+def _rewrite(path, df=None):
+    # New content (or the same bytes when df is None) with a later mtime
+    mtime = path.stat().st_mtime_ns if path.exists() else 0
+    if df is None:
+        path.write_bytes(path.read_bytes())
+    else:
+        df.to_csv(path, index=False)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    paths = {'first': tmp_path / "first.csv", 'second': tmp_path / "second.csv"}
+    _rewrite(paths['first'], _catalog(['A-1 b', 'A-2 b']))
+    _rewrite(paths['second'], _catalog(['A-1 b', 'B-1 c', 'B-2 c'], seed=1))
+    monkeypatch.setattr(harmonize, 'SOURCES', {name: dict(file=str(path), columns=NEA_COLUMNS)
+                                               for name, path in paths.items()})
+    monkeypatch.setattr(harmonize, '_merged', OrderedDict())
+    monkeypatch.setattr(datasets, 'DATASET_DIR', tmp_path)     # merged tables persisted here
+    return paths
+
+
+# ------------------------ MEMOIZED MERGES ------------------------
+def test_rewritten_source_replaces_the_merged_table(sources):
+    first = load_harmonized(('first', 'second'))
+    assert first['pl_name'].tolist() == ['A-1 b', 'A-2 b', 'B-1 c', 'B-2 c']
+    assert load_harmonized(('first', 'second')) is first
+
+    _rewrite(sources['second'], _catalog(['C-1 b'], seed=2))
+    assert load_harmonized(('first', 'second'))['pl_name'].tolist() == ['A-1 b', 'A-2 b', 'C-1 b']
+    assert len(harmonize._merged) == 1
+
+
+def test_touched_source_keeps_the_merged_table(sources, monkeypatch):
+    first = load_harmonized(('first', 'second'), columns=['pl_name'])
+    _rewrite(sources['first'])
+
+    def merge(*args):
+        raise AssertionError("merged again")
+    monkeypatch.setattr(harmonize, 'merge_catalogs', merge)
+    assert load_harmonized(('first', 'second'), columns=['pl_name']) is first
+
+
+def test_memo_is_bounded(sources, monkeypatch):
+    monkeypatch.setattr(harmonize, 'MERGED_CACHE_SIZE', 2)
+    for columns in (['pl_name'], ['pl_rade'], ['ra'], ['pl_name']):
+        load_harmonized(('first', 'second'), columns=columns)
+    assert [memo[2] for memo in harmonize._merged] == [('ra',), ('pl_name',)]
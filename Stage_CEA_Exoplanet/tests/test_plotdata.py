@@ -0,0 +1,70 @@
+"""
+Plot Data Tests
+------------------------------------------------
+The arrays cached per frame for the plots (`utils.plotdata`) must follow the
+current content of the frame: a column edited in place or reassigned is
+drawn with its new values, and so are the quantities derived from it.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.classification import classify_planets, density_ratio, density_ratio_from_mass_radius
+from utils.plotdata import plot_array, plot_arrays
+
+
+def _sample(n=200, seed=0, densities=True):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'pl_name': [f"planet {i}" for i in range(n)],
+        'pl_bmasse': rng.uniform(0.5, 20, size=n),
+        'pl_rade': rng.uniform(0.5, 4, size=n),
+        'pl_orbper': rng.uniform(1, 100, size=n),
+    })
+    if densities:
+        df['pl_dens'] = rng.uniform(1, 10, size=n)
+    return df
+
+
+# ------------------------ STALENESS ------------------------
+def test_column_after_loc_edit():
+    df = _sample()
+    plot_array(df, 'pl_orbper')
+    df.loc[df.index[:10], 'pl_orbper'] = 1000.0
+    np.testing.assert_array_equal(plot_array(df, 'pl_orbper'), df['pl_orbper'].to_numpy())
+
+
+def test_density_ratio_after_in_place_edit():
+    df = _sample()
+    plot_array(df, 'density_ratio')
+    df['pl_dens'] *= 2
+    np.testing.assert_allclose(plot_array(df, 'density_ratio'), density_ratio(df['pl_dens'].to_numpy()))
+
+
+def test_density_ratio_from_mass_and_radius_after_reassignment():
+    df = _sample(densities=False)
+    plot_array(df, 'density_ratio')
+    df['pl_rade'] = df['pl_rade'] * 2
+    expected = density_ratio_from_mass_radius(df['pl_bmasse'].to_numpy(), df['pl_rade'].to_numpy())
+    np.testing.assert_allclose(plot_array(df, 'density_ratio'), expected)
+
+
+def test_category_after_mass_edit():
+    df = _sample()
+    plot_arrays(df, 'category', 'color')
+    df.loc[df.index[:50], 'pl_bmasse'] = 50.0
+    mass, ratio, category = plot_arrays(df, 'pl_bmasse', 'density_ratio', 'category')
+    np.testing.assert_array_equal(category, classify_planets(mass, ratio))
+
+
+def test_arrays_are_read_only_and_reused():
+    df = _sample()
+    first = plot_array(df, 'pl_bmasse')
+    assert not first.flags.writeable
+    assert plot_array(df, 'pl_bmasse') is first
@@ -0,0 +1,66 @@
+"""
+Regression Tests
+------------------------------------------------
+Memoized line fits (`utils.regression`) must be the fits of the current
+content of the fitted columns: a column edited in place or reassigned, an
+error column included, is fitted again, while unchanged columns reuse the
+memoized fit.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.regression import cached_line_fit, fit_lines, fit_subsets
+
+
+def _sample(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    period = 10 ** rng.uniform(0, 2, size=n)
+    return pd.DataFrame({
+        'pl_orbper': period,
+        'pl_rade': 2 * period ** -0.1 * 10 ** rng.normal(0, 0.05, size=n),
+        'pl_radeerr1': rng.uniform(0.05, 0.2, size=n),
+        'pl_other': rng.uniform(size=n),
+    })
+
+
+def _direct(df, **options):
+    return fit_lines(df['pl_orbper'].to_numpy(), df['pl_rade'].to_numpy(), **options)[0]
+
+
+# ------------------------ MEMOIZED FITS ------------------------
+def test_fit_is_reused_until_a_fitted_column_changes():
+    df = _sample()
+    first = cached_line_fit(df, 'pl_orbper', 'pl_rade')
+    df['pl_other'] += 1
+    assert cached_line_fit(df, 'pl_orbper', 'pl_rade') is first
+
+
+def test_fit_after_in_place_edit():
+    df = _sample()
+    cached_line_fit(df, 'pl_orbper', 'pl_rade')
+    df.loc[df.index[:100], 'pl_rade'] *= 3
+    assert cached_line_fit(df, 'pl_orbper', 'pl_rade') == _direct(df)
+
+
+def test_weighted_fit_after_error_column_reassigned():
+    df = _sample()
+    cached_line_fit(df, 'pl_orbper', 'pl_rade', method='wls', y_err='pl_radeerr1')
+    df['pl_radeerr1'] = df['pl_radeerr1'].to_numpy()[::-1].copy()
+    expected = _direct(df, method='wls', y_err=df['pl_radeerr1'].to_numpy())
+    assert cached_line_fit(df, 'pl_orbper', 'pl_rade', method='wls', y_err='pl_radeerr1') == expected
+
+
+def test_subsets_match_direct_fits():
+    df = _sample()
+    subsets = {'short': df['pl_orbper'].to_numpy() < 10, 'first': np.arange(100)}
+    fits = fit_subsets(df, 'pl_orbper', 'pl_rade', subsets)
+    direct = fit_lines(df['pl_orbper'].to_numpy(), df['pl_rade'].to_numpy(), list(subsets.values()))
+    for name, fit in zip(subsets, direct):
+        assert tuple(fits.loc[name]) == tuple(fit)
@@ -0,0 +1,158 @@
+"""
+Snapshot Tests
+------------------------------------------------
+Results carried over from one catalog version to the next (`utils.snapshots`)
+must equal the results recomputed from scratch on the new version: filter
+selections updated from row-level diffs, JWST join tables, and a whole
+`refresh_catalog()` round on a rewritten catalog.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.crossmatch import forget_joins, jwst_observations
+from utils.datasets import invalidate_dataset
+from utils.filters import compile_filters, filter_index
+from utils.snapshots import (
+    diff_catalogs, list_snapshots, refresh_catalog, update_observations, update_selection
+)
+
+PRESETS = {
+    'M': dict(st_type='M'),
+    'small': dict(rade_max=4),
+    'hot small': dict(Teff_min=5000, rade_min=1, rade_max=4),
+    'heavy': dict(mass_min=10),
+}
+
+
+def _catalog(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pl_name': [f"Star-{i // 2} {'bc'[i % 2]}" for i in range(n)],
+        'st_spectype': rng.choice(['M3 V', 'K2 V', 'G5 V'], size=n),
+        'st_teff': rng.uniform(2500, 7000, size=n).round(1),
+        'pl_rade': rng.uniform(0.5, 20, size=n).round(3),
+        'pl_bmasse': rng.uniform(0.1, 300, size=n).round(3),
+        'ra': rng.uniform(0, 360, size=n).round(5),
+        'dec': rng.uniform(-90, 90, size=n).round(5),
+        'pl_orbper': rng.uniform(0.5, 500, size=n).round(4),
+    })
+
+
+def _next_version(old, seed=1):
+    # Planets removed, added, edited (in filtered and matched columns) and reordered
+    rng = np.random.default_rng(seed)
+    new = old.drop(index=[3, 40, 41, 200]).copy()
+    edited = rng.choice(new.index, size=20, replace=False)
+    new.loc[edited[:10], 'pl_rade'] = (new.loc[edited[:10], 'pl_rade'] * 0.2).round(3)
+    new.loc[edited[10:15], 'st_spectype'] = 'M1 V'
+    new.loc[edited[15:], 'ra'] = 12.0
+    added = _catalog(n=6, seed=seed + 10).assign(pl_name=[f"New-{i} b" for i in range(6)])
+    added.loc[0, 'pl_name'] = 'JWST-1 b'
+    return pd.concat([new, added]).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def _jwst(planets):
+    targets = planets.iloc[::25]
+    return pd.DataFrame({
+        'Planet': targets['pl_name'].tolist() + ['JWST-1 b', 'Elsewhere c'],
+        'RA (deg)': targets['ra'].astype(str).tolist() + ['1.0', '12.0'],
+        'Dec (deg)': targets['dec'].astype(str).tolist() + ['1.0', str(planets['dec'].iloc[7])],
+        'Period (d)': targets['pl_orbper'].tolist() + [1.0, 1.0],
+        'prog_no': np.arange(len(targets) + 2),
+        'Cycle': 1,
+        'Prog Type': 'GO',
+        'Obs type': 'Transit',
+    })
+
+
+# ------------------------ DIFFS ------------------------
+def test_diff():
+    old = _catalog()
+    new = _next_version(old)
+    diff = diff_catalogs(old, new)
+    assert len(diff.removed) == 4 and len(diff.added) == 6
+    assert set(new['pl_name'].iloc[diff.added]) == {'JWST-1 b'} | {f"New-{i} b" for i in range(1, 6)}
+    assert set(diff.columns) == {'pl_rade', 'st_spectype', 'ra'}
+    assert len(diff.changed) == 20
+    matched = diff.old_rows >= 0
+    np.testing.assert_array_equal(old['pl_name'].to_numpy()[diff.old_rows[matched]],
+                                  new['pl_name'].to_numpy()[matched])
+
+
+
+
+# ------------------------ INCREMENTAL UPDATES ------------------------
+@pytest.mark.parametrize('stored', [False, True])
+def test_selection_matches_full_recompute(stored):
+    old = _catalog()
+    new = _next_version(old)
+    diff = diff_catalogs(old, new)
+    for filters in PRESETS.values():
+        plan = compile_filters(**filters)
+        previous = filter_index(old, **filters) if stored else None
+        rows = update_selection(old, new, diff, plan, previous)
+        np.testing.assert_array_equal(rows, filter_index(new.copy(), **filters))
+
+
+def test_selection_after_schema_change():
+    old = _catalog()
+    new = _next_version(old).drop(columns='pl_bmasse').assign(pl_bmasse=lambda df: df['pl_rade'] ** 2)
+    new = new.rename(columns={'st_teff': 'teff'}).assign(st_teff=lambda df: df['teff'] + 100)
+    diff = diff_catalogs(old, new)
+    for filters in PRESETS.values():
+        rows = update_selection(old, new, diff, compile_filters(**filters))
+        np.testing.assert_array_equal(rows, filter_index(new.copy(), **filters))
+
+
+def test_observations_match_full_recompute():
+    old = _catalog()
+    new = _next_version(old)
+    jwst = _jwst(old)
+    join = update_observations(old, new, diff_catalogs(old, new), jwst)
+    forget_joins()
+    expected = jwst_observations(new.copy(), jwst)
+    pd.testing.assert_frame_equal(join, expected)
+    assert 'JWST-1 b' in set(join['pl_name'])
+
+
+
+
+# ------------------------ REFRESH ------------------------
+def test_refresh_round(tmp_path):
+    path = tmp_path / "catalog.csv"
+    old = _catalog()
+    jwst = _jwst(old)
+    old.to_csv(path, index=False)
+    try:
+        first = refresh_catalog(path, PRESETS, jwst)
+        assert first.diff is None and first.snapshot.version == 1
+
+        new = _next_version(old)
+        mtime = path.stat().st_mtime_ns
+        new.to_csv(path, index=False)
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+        update = refresh_catalog(path, PRESETS, jwst)
+        assert update.previous.version == 1 and update.snapshot.version == 2
+        assert len(update.diff.added) == 6
+
+        forget_joins()
+        parsed = pd.read_csv(path)
+        for name, filters in PRESETS.items():
+            np.testing.assert_array_equal(update.selections[name], filter_index(parsed, **filters), err_msg=name)
+        pd.testing.assert_frame_equal(update.observations, jwst_observations(parsed, jwst))
+
+        again = refresh_catalog(path, PRESETS, jwst)
+        assert again.diff is None and again.snapshot.version == 2
+        assert len(list_snapshots(path)) == 2
+    finally:
+        invalidate_dataset(path)
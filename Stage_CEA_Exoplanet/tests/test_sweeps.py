@@ -0,0 +1,76 @@
+"""
+Sweep Tests
+------------------------------------------------
+Every grid point of a parameter sweep (`utils.sweeps`) must report the
+statistics of the rows `apply_filters()` selects with its configuration,
+whether the points run in-process or in a worker pool.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import sweeps
+from utils.classification import CATEGORY_LABELS, catalog_density_ratio, classify_planets
+from utils.filters import apply_filters
+from utils.regression import fit_lines
+from utils.sweeps import parameter_grid, sweep_filters
+
+BASE = dict(st_type='M', rade_max=4)
+
+
+def _catalog(n=1500, seed=0, densities=True):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'st_spectype': rng.choice(['M3 V', 'K2 V'], size=n),
+        'pl_rade': rng.uniform(0.5, 6, size=n),
+        'pl_bmasse': 10 ** rng.uniform(-0.5, 1.5, size=n),
+        'pl_orbper': 10 ** rng.uniform(-0.5, 2, size=n),
+    })
+    for value, error in [('pl_rade', 'pl_radeerr'), ('pl_bmasse', 'pl_bmasseerr')]:
+        df[f"{error}1"] = df[value] * rng.uniform(0, 0.4, size=n)
+        df[f"{error}2"] = -df[f"{error}1"]
+    if densities:
+        df['pl_dens'] = rng.uniform(1, 10, size=n)
+        df.loc[rng.random(n) < 0.1, 'pl_dens'] = np.nan
+    return df
+
+
+def _direct(df, point):
+    sample = apply_filters(df, **BASE, **point)
+    ratio = catalog_density_ratio(sample)
+    keep = np.isfinite(ratio)
+    labels = classify_planets(sample['pl_bmasse'].to_numpy()[keep], ratio[keep])
+    values = {'n': len(sample)}
+    for k, category in enumerate(CATEGORY_LABELS):
+        label = category.lower().replace(' ', '_').replace('-', '_')
+        values[f"{label}_count"] = np.sum(labels == k)
+        values[f"{label}_mu"] = ratio[keep][labels == k].mean() if np.any(labels == k) else np.nan
+    fit, = fit_lines(sample['pl_orbper'].to_numpy(), sample['pl_rade'].to_numpy())
+    values['slope'] = fit.slope
+    return values
+
+
+# ------------------------ GRID POINTS ------------------------
+@pytest.mark.parametrize('densities', [True, False])
+def test_points_match_apply_filters(densities):
+    df = _catalog(densities=densities)
+    grid = parameter_grid(rade_err=[0.1, 0.2, 0.3], mass_err=[0.15, 0.3])
+    result = sweep_filters(grid, base=BASE, df=df, workers=1)
+    for i, point in enumerate(grid):
+        for name, value in _direct(df, point).items():
+            np.testing.assert_allclose(result.loc[i, name], value, rtol=1e-12, err_msg=f"{point} {name}")
+
+
+def test_pool_matches_in_process(monkeypatch):
+    df = _catalog()
+    grid = parameter_grid(rade_err=[0.1, 0.2, 0.3], mass_err=[0.15, 0.3])
+    serial = sweep_filters(grid, base=BASE, df=df, workers=1)
+    monkeypatch.setattr(sweeps, 'PARALLEL_MIN_POINTS', 1)
+    pd.testing.assert_frame_equal(sweep_filters(grid, base=BASE, df=df, workers=2), serial)
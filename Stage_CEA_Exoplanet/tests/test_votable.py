@@ -0,0 +1,162 @@
+"""
+VOTable Tests
+------------------------------------------------
+A table must read the same (`utils.votable`) whether it is serialised as
+TABLEDATA, BINARY or BINARY2, with fixed- or variable-length fields and
+missing values, and be yielded in chunks of `chunksize` rows in every
+format, however the file and the base64 stream are split into blocks.
+
+Usage:
+    python -m pytest -q tests
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import base64
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import votable
+from utils.votable import iter_votable, read_votable
+
+# name, datatype, arraysize, null value
+FIELDS = [
+    ('name', 'char', '12', None),
+    ('host', 'unicodeChar', '8', None),
+    ('year', 'int', None, '-1'),
+    ('planets', 'long', None, None),
+    ('mass', 'double', None, None),
+    ('transiting', 'boolean', None, None),
+]
+VARIABLE_FIELDS = [('name', 'char', '*', None), ('period', 'float', None, None)]
+
+
+def _rows(n=45, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            'name': None if i % 11 == 3 else f"K2-{i} b",
+            'host': f"Hé {i}",
+            'year': None if i % 7 == 2 else int(rng.integers(1995, 2025)),
+            'planets': int(rng.integers(1, 8)),
+            'mass': None if i % 5 == 1 else float(rng.uniform(0.01, 10)),
+            'transiting': None if i % 9 == 4 else bool(i % 2),
+            'period': float(np.float32(rng.uniform(0.5, 400))),
+        })
+    return rows
+
+
+def _cell(value, datatype):
+    # TABLEDATA text of one value
+    if value is None:
+        return ''
+    if datatype == 'boolean':
+        return 'T' if value else 'F'
+    return repr(value) if datatype in ('double', 'float') else str(value)
+
+
+def _binary(value, datatype, arraysize, null):
+    # BINARY bytes of one value (missing values as the null value, NaN or padding)
+    if datatype == 'char':
+        text = (value or '').encode('ascii')
+        return struct.pack('>I', len(text)) + text if arraysize == '*' else text.ljust(int(arraysize), b'\0')
+    if datatype == 'unicodeChar':
+        return (value or '').encode('utf-16-be').ljust(2 * int(arraysize), b'\0')
+    if datatype == 'boolean':
+        return b'?' if value is None else (b'T' if value else b'F')
+    code = {'int': '>i', 'long': '>q', 'float': '>f', 'double': '>d'}[datatype]
+    if value is None:
+        value = int(null) if null is not None else float('nan')
+    return struct.pack(code, value)
+
+
+def _votable(path, rows, fields, serialization):
+    declarations = ''.join(
+        f'<FIELD name="{name}" datatype="{datatype}"' + (f' arraysize="{size}"' if size else '')
+        + (f'><VALUES null="{null}"/></FIELD>' if null is not None else '/>')
+        for name, datatype, size, null in fields)
+
+    if serialization == 'TABLEDATA':
+        body = ''.join('<TR>' + ''.join(f'<TD>{_cell(row[f[0]], f[1])}</TD>' for f in fields) + '</TR>\n'
+                       for row in rows)
+        data = f'<TABLEDATA>\n{body}</TABLEDATA>'
+    else:
+        stream = bytearray()
+        for row in rows:
+            if serialization == 'BINARY2':
+                bits = [row[f[0]] is None for f in fields]
+                stream += np.packbits(bits).tobytes()
+            for name, datatype, size, null in fields:
+                stream += _binary(row[name], datatype, size, null)
+        text = base64.b64encode(bytes(stream)).decode()
+        lines = '\n'.join(text[i:i + 76] for i in range(0, len(text), 76))
+        data = f'<{serialization}><STREAM encoding="base64">\n{lines}\n</STREAM></{serialization}>'
+
+    path.write_text(f'<?xml version="1.0" encoding="utf-8"?>\n'
+                    f'<VOTABLE xmlns="http://www.ivoa.net/xml/VOTable/v1.3"><RESOURCE><TABLE>'
+                    f'{declarations}<DATA>{data}</DATA></TABLE></RESOURCE></VOTABLE>', encoding='utf-8')
+    return path
+
+
+def _expected(rows, fields):
+    columns = {}
+    for name, datatype, _, _ in fields:
+        values = [np.nan if row[name] is None else row[name] for row in rows]
+        numeric = datatype not in ('char', 'unicodeChar', 'boolean')
+        columns[name] = pd.to_numeric(pd.Series(values)) if numeric else np.array(values, dtype=object)
+    return pd.DataFrame(columns, columns=[f[0] for f in fields])
+
+
+# ------------------------ FORMAT PARITY ------------------------
+@pytest.mark.parametrize('fields', [FIELDS, VARIABLE_FIELDS], ids=['fixed', 'variable'])
+def test_serializations_read_the_same(tmp_path, fields):
+    rows = _rows()
+    tabledata = read_votable(_votable(tmp_path / "t.vot", rows, fields, 'TABLEDATA'))
+    pd.testing.assert_frame_equal(tabledata, _expected(rows, fields))
+    for serialization in ('BINARY', 'BINARY2'):
+        binary = read_votable(_votable(tmp_path / f"{serialization}.vot", rows, fields, serialization))
+        pd.testing.assert_frame_equal(binary, tabledata, obj=serialization)
+
+
+def test_binary_projection(tmp_path):
+    path = _votable(tmp_path / "t.vot", _rows(), FIELDS, 'BINARY2')
+    pd.testing.assert_frame_equal(read_votable(path, ['mass', 'name']), read_votable(path)[['mass', 'name']])
+    with pytest.raises(KeyError, match='radius'):
+        read_votable(path, ['radius'])
+
+
+
+
+# ------------------------ CHUNKS ------------------------
+@pytest.mark.parametrize('serialization', ['TABLEDATA', 'BINARY', 'BINARY2'])
+@pytest.mark.parametrize('fields', [FIELDS, VARIABLE_FIELDS], ids=['fixed', 'variable'])
+def test_chunks_in_every_serialization(tmp_path, monkeypatch, serialization, fields):
+    # Blocks smaller than a row and not a multiple of 4 base64 characters
+    monkeypatch.setattr(votable, 'READ_BYTES', 61)
+    monkeypatch.setattr(votable, 'STREAM_CHARS', 37)
+    rows = _rows()
+    path = _votable(tmp_path / "t.vot", rows, fields, serialization)
+    chunks = list(iter_votable(path, chunksize=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), _expected(rows, fields), check_dtype=False)
+
+
+def test_empty_table_yields_one_empty_chunk(tmp_path):
+    for serialization in ('TABLEDATA', 'BINARY'):
+        chunks = list(iter_votable(_votable(tmp_path / "t.vot", [], FIELDS, serialization)))
+        assert len(chunks) == 1 and chunks[0].empty
+        assert list(chunks[0].columns) == [f[0] for f in FIELDS]
+
+
+def test_truncated_stream(tmp_path):
+    path = _votable(tmp_path / "t.vot", _rows(), FIELDS, 'BINARY')
+    text = path.read_text()
+    end = text.index('\n</STREAM>')
+    path.write_text(text[:end - 8] + text[end:])
+    with pytest.raises(ValueError, match='Truncated'):
+        read_votable(path)
@@ -0,0 +1,207 @@
+"""
+Streaming Statistics Module
+------------------------------------------------
+This module maintains the population statistics drawn by `utils.plots`
+(category counts and Gaussian fits of the density ratio, histograms of the
+density ratio and radius, moments of radius and period, and the log-log
+radius-period and density-period regressions) as mergeable accumulators
+instead of recomputing them from the full sample.
+
+Every accumulator is a namedtuple of NumPy arrays built from a block of rows:
+    Moments    count, mean and sum of squared deviations (Chan et al.), per group
+    Histogram  counts on fixed bin edges, with underflow / overflow bins
+    LineSums   regression sufficient statistics (see `regression.line_sums()`)
+and `merge(a, b)` / `subtract(a, b)` combine two of them (or two whole
+`PopulationStatistics`) exactly as if their rows had been pooled or taken
+out. Statistics of a chunked load or of parallel workers are merged at the
+end, and a catalog update costs O(changed rows): subtract the statistics of
+the removed rows and merge those of the added ones (`update_population()`).
+
+The fitted range of a regression (`x_min`, `x_max`) only grows: after rows
+are subtracted it still spans the points ever added.
+
+Usage:
+    stats = population_statistics(sample)
+    stats = accumulate(population_statistics(chunk) for chunk in iter_source("nea"))
+    stats = update_population(stats, removed=old.take(rows), added=new.take(rows))
+    gaussian_fits(stats)          # count, mu, std per category
+    regression_fits(stats)["radius_period"]
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+from collections import namedtuple
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from utils.classification import CATEGORY_LABELS, catalog_density_ratio, classify_planets
+from utils.regression import fit_sums, line_sums
+
+
+# ------------------------ CONFIGURATION ------------------------
+# Fixed histogram bins, so that histograms of different row blocks add up
+DENSITY_RATIO_EDGES = np.linspace(0, 4, 81)
+RADIUS_EDGES = np.linspace(0, 30, 301)
+
+Moments = namedtuple("Moments", ["count", "mean", "m2"])
+# `counts` has one row per group and len(edges) + 1 columns: underflow, bins, overflow
+Histogram = namedtuple("Histogram", ["edges", "counts"])
+LineSums = namedtuple("LineSums", ["sums", "x_min", "x_max"])
+
+PopulationStatistics = namedtuple(
+    "PopulationStatistics",
+    ["categories", "density_histogram", "radius", "radius_histogram", "period",
+     "radius_period", "density_period"],
+)
+
+
+
+
+# ------------------------ ACCUMULATORS ------------------------
+def _labels(values, labels):
+    return np.zeros(len(values), dtype=np.intp) if labels is None else np.asarray(labels, dtype=np.intp)
+
+
+def moments(values, labels=None, n_groups=1):
+    """Count, mean and sum of squared deviations of the finite `values` of each group."""
+    values = np.asarray(values, dtype=float)
+    labels = _labels(values, labels)
+    keep = np.isfinite(values)
+    values, labels = values[keep], labels[keep]
+
+    count = np.bincount(labels, minlength=n_groups).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, np.bincount(labels, weights=values, minlength=n_groups) / count, 0)
+    m2 = np.bincount(labels, weights=(values - mean[labels]) ** 2, minlength=n_groups)
+    return Moments(count, mean, m2)
+
+
+def histogram(values, edges, labels=None, n_groups=1):
+    """Counts of the finite `values` of each group on fixed `edges` (plus underflow and overflow)."""
+    values = np.asarray(values, dtype=float)
+    labels = _labels(values, labels)
+    keep = np.isfinite(values)
+    values, labels = values[keep], labels[keep]
+
+    # Bin i covers [edges[i-1], edges[i]), the last one includes its upper edge (as np.histogram)
+    bins = np.searchsorted(edges, values, side='right')
+    bins[values == edges[-1]] = len(edges) - 1
+    counts = np.zeros((n_groups, len(edges) + 1), dtype=np.int64)
+    np.add.at(counts, (labels, bins), 1)
+    return Histogram(edges, counts)
+
+
+def line_statistics(x, y, labels=None, n_groups=1, log_x=True, log_y=True):
+    """Regression sufficient statistics of (x, y) in each group, in log-log space by default."""
+    return LineSums(*line_sums(x, y, labels, n_groups, log_x, log_y))
+
+
+
+
+# ------------------------ MERGING ------------------------
+def _merge_moments(a, b, sign):
+    # Pooled (sign=1) or remaining (sign=-1) moments of two blocks of rows
+    count = a.count + sign * b.count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if sign > 0:
+            mean = np.where(count > 0, a.mean + (b.mean - a.mean) * b.count / count, 0)
+            m2 = a.m2 + b.m2 + (b.mean - a.mean) ** 2 * a.count * b.count / count
+        else:
+            mean = np.where(count > 0, (a.count * a.mean - b.count * b.mean) / count, 0)
+            m2 = a.m2 - b.m2 - (b.mean - mean) ** 2 * b.count * count / a.count
+    m2 = np.where(count > 0, np.maximum(np.nan_to_num(m2), 0), 0)
+    return Moments(count, mean, m2)
+
+
+def _combine(a, b, sign):
+    if isinstance(a, Moments):
+        return _merge_moments(a, b, sign)
+    if isinstance(a, Histogram):
+        if not np.array_equal(a.edges, b.edges):
+            raise ValueError("Histograms with different bin edges cannot be combined")
+        return Histogram(a.edges, a.counts + sign * b.counts)
+    if isinstance(a, LineSums):
+        return LineSums(a.sums + sign * b.sums, np.minimum(a.x_min, b.x_min), np.maximum(a.x_max, b.x_max))
+    if isinstance(a, PopulationStatistics):
+        return PopulationStatistics(*(_combine(x, y, sign) for x, y in zip(a, b)))
+    raise TypeError(f"Not an accumulator: {type(a).__name__}")
+
+
+def merge(a, b):
+    """Accumulator of the rows of both `a` and `b` (disjoint blocks of rows)."""
+    return _combine(a, b, 1)
+
+
+def subtract(a, b):
+    """Accumulator of the rows of `a` without those of `b` (a block of rows included in `a`)."""
+    return _combine(a, b, -1)
+
+
+def accumulate(accumulators):
+    """Merge an iterable of accumulators (e.g. one per chunk or per worker)."""
+    return reduce(merge, accumulators)
+
+
+
+
+# ------------------------ POPULATION STATISTICS ------------------------
+def _column(df, column):
+    return df[column].to_numpy(dtype=float, na_value=np.nan) if column in df else np.full(len(df), np.nan)
+
+
+def population_statistics(df):
+    """Accumulators of the plotted population statistics of a block of rows."""
+    mass, radius, period = _column(df, 'pl_bmasse'), _column(df, 'pl_rade'), _column(df, 'pl_orbper')
+    # Density ratio as in the plots (pl_dens, or mass and radius for catalogs without it)
+    ratio = catalog_density_ratio(df)
+
+    # Category of the planets with a density ratio (others are left out, as in the plots)
+    measured = np.isfinite(ratio)
+    labels = classify_planets(mass[measured], ratio[measured])
+    n_categories = len(CATEGORY_LABELS)
+
+    return PopulationStatistics(
+        categories=moments(ratio[measured], labels, n_categories),
+        density_histogram=histogram(ratio[measured], DENSITY_RATIO_EDGES, labels, n_categories),
+        radius=moments(radius),
+        radius_histogram=histogram(radius, RADIUS_EDGES),
+        period=moments(period),
+        radius_period=line_statistics(period, radius),
+        density_period=line_statistics(period, ratio),
+    )
+
+
+def update_population(stats, removed=None, added=None):
+    """Statistics after taking the `removed` rows out and adding the `added` ones (DataFrames)."""
+    if removed is not None and len(removed):
+        stats = subtract(stats, population_statistics(removed))
+    if added is not None and len(added):
+        stats = merge(stats, population_statistics(added))
+    return stats
+
+
+
+
+# ------------------------ RESULTS ------------------------
+def variance(m, ddof=0):
+    """Variance of each group of a `Moments` accumulator (NaN for groups with too few values)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(m.count > ddof, m.m2 / (m.count - ddof), np.nan)
+
+
+def gaussian_fits(stats):
+    """Per-category count and Gaussian fit (as `scipy.stats.norm.fit`) of the density ratio."""
+    m = stats.categories
+    return pd.DataFrame({
+        'count': np.rint(m.count).astype(np.int64),
+        'mu': np.where(m.count > 0, m.mean, np.nan),
+        'std': np.sqrt(variance(m)),
+    }, index=pd.Index(CATEGORY_LABELS, name='category'))
+
+
+def regression_fits(stats):
+    """Log-log `LineFit`s of radius and density ratio against period."""
+    return {name: fit_sums(*getattr(stats, name))[0] for name in ('radius_period', 'density_period')}
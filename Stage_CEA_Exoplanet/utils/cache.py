@@ -0,0 +1,181 @@
+"""
+Filter Result Cache Module
+------------------------------------------------
+This module memoizes `apply_filters()` selections. A result is keyed by the
+content fingerprint of the dataset, the normalised filter plan (see
+`filters.compile_filters()`) and `filters.FILTER_VERSION`, and only the
+selected row positions are stored, never copies of the data.
+
+Results live in an in-memory LRU and, optionally, as `.npy` files in a
+directory so they survive notebook restarts. Since the key depends on the
+table content, a modified catalog (reloaded by `datasets.load_dataset()`)
+never hits a stale entry.
+
+Frames are fingerprinted once per object. The fingerprint is kept with the
+`statistics.column_version()` of every column and is recomputed as soon as
+a column the caller reads was edited in place or reassigned (or columns or
+index changed), so an edited frame never hits the selections of its old
+content. Without pandas copy-on-write such edits cannot be detected cheaply:
+fingerprints are then never reused, and selections are evaluated directly.
+
+Usage:
+    configure_selection_cache(directory="../Dataset/.catalog_cache/selections")
+    sample = cached_apply_filters(df, st_type="M", rade_max=4)
+    rows = cached_filter_index(df, st_type="M", rade_max=4)
+    close_in = cached_apply_query(df, "pl_orbsmax < 0.05 and pl_rade < 2")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import hashlib
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.filters import FILTER_VERSION, compile_filters, compile_query, evaluate_plan, plan_columns
+from utils.statistics import column_version, tracks_edits
+
+
+# ------------------------ CONFIGURATION ------------------------
+_maxsize = 256
+_directory = None
+_results = OrderedDict()    # key -> positional row indices (read-only)
+_fingerprints = {}          # id(DataFrame) -> (fingerprint, index, columns, {column: (version, Series)})
+
+
+def configure_selection_cache(maxsize=None, directory=None):
+    """Set the in-memory LRU size and/or the on-disk directory (False disables it)."""
+    global _maxsize, _directory
+    if maxsize is not None:
+        _maxsize = maxsize
+        _evict()
+    if directory is False:
+        _directory = None
+    elif directory is not None:
+        _directory = Path(directory)
+        _directory.mkdir(parents=True, exist_ok=True)
+
+
+def clear_selection_cache(disk=False):
+    """Empty the in-memory cache, and the on-disk one too if `disk` is True."""
+    _results.clear()
+    if disk and _directory is not None:
+        for path in _directory.glob("*.npy"):
+            path.unlink()
+
+
+
+
+# ------------------------ FINGERPRINTS ------------------------
+def _hash_frame(df):
+    digest = hashlib.sha1()
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _unchanged(df, entry, columns):
+    _, index, frame_columns, versions = entry
+    if df.index is not index or df.columns is not frame_columns:
+        return False
+    columns = df.columns if columns is None else columns
+    return all(column_version(df[column]) == versions[column][0] for column in columns if column in versions)
+
+
+def dataset_fingerprint(df, columns=None):
+    """
+    Content hash of a DataFrame, computed once per object and again after
+    an edit of one of `columns` (default: every column), the columns the
+    caller reads.
+    """
+    if not tracks_edits():
+        return _hash_frame(df)
+
+    key = id(df)
+    entry = _fingerprints.get(key)
+    if entry is None or not _unchanged(df, entry, columns):
+        if entry is None:
+            weakref.finalize(df, _fingerprints.pop, key, None)
+        versions = {column: (column_version(values), values) for column, values in df.items()}
+        entry = _fingerprints[key] = (_hash_frame(df), df.index, df.columns, versions)
+    return entry[0]
+
+
+def forget_fingerprint(df):
+    """Drop the memoized fingerprint of a frame, to free it."""
+    _fingerprints.pop(id(df), None)
+
+
+
+
+# ------------------------ CACHED SELECTIONS ------------------------
+def _evict():
+    while len(_results) > _maxsize:
+        _results.popitem(last=False)
+
+
+def selection_key(df, plan):
+    """Cache key of a filter plan evaluated on `df`."""
+    raw = f"{dataset_fingerprint(df, plan_columns(plan))}|{plan!r}|{FILTER_VERSION}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_plan_index(df, plan):
+    """Positional indices selected by a compiled filter plan, memoized (with copy-on-write)."""
+    if not tracks_edits():
+        # Fingerprinting the frame on every call would cost more than the plan
+        index = np.flatnonzero(evaluate_plan(df, plan))
+        index.setflags(write=False)
+        return index
+
+    key = selection_key(df, plan)
+
+    index = _results.get(key)
+    if index is not None:
+        _results.move_to_end(key)
+        return index
+
+    path = _directory / f"{key}.npy" if _directory is not None else None
+    if path is not None and path.exists():
+        index = np.load(path)
+    else:
+        index = np.flatnonzero(evaluate_plan(df, plan))
+        if path is not None:
+            np.save(path, index)
+
+    index.setflags(write=False)
+    _results[key] = index
+    _evict()
+    return index
+
+
+def store_plan_index(df, plan, index):
+    """Record the positional indices a plan selects on `df` (e.g. updated incrementally from an older version)."""
+    key = selection_key(df, plan)
+    index = np.asarray(index, dtype=np.intp)
+    index.setflags(write=False)
+    if _directory is not None:
+        np.save(_directory / f"{key}.npy", index)
+    _results[key] = index
+    _results.move_to_end(key)
+    _evict()
+    return index
+
+
+def cached_filter_index(df, **filters):
+    """Positional indices selected by `apply_filters()` keyword arguments, memoized."""
+    return cached_plan_index(df, compile_filters(**filters))
+
+
+def cached_apply_filters(df, **filters):
+    """Memoized equivalent of `apply_filters()`: same rows, same index."""
+    return df.take(cached_filter_index(df, **filters))
+
+
+def cached_apply_query(df, query):
+    """Memoized equivalent of `filters.apply_query()`."""
+    return df.take(cached_plan_index(df, compile_query(query, df)))
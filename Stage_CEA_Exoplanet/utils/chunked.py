@@ -0,0 +1,258 @@
+"""
+Chunked Filtering Module
+------------------------------------------------
+This module runs a filter plan (`apply_filters()` keyword arguments or a
+query string, see `utils.filters`) over catalogs too large to be held
+comfortably in memory, such as synthetic population catalogs of 10^6-10^8
+planets in the NEA schema.
+
+The input is split in row blocks, filtered independently by a pool of
+worker processes. Only the columns read by the plan (and the requested
+output columns) are loaded, and at most `MAX_PENDING` blocks per worker are
+in flight, so memory stays bounded by the block size whatever the catalog
+size. Supported sources:
+    CSV file        split in byte ranges at line boundaries, each worker
+                    parses its own ranges (one record per line is assumed)
+    columnar file   a `.feather` file or `.npcols` folder, as written by
+                    the catalog cache of `utils.datasets`; workers
+                    memory-map the columns and read their rows only
+    DataFrame       the plan columns are copied once into shared memory
+                    blocks, which every worker maps without copying
+
+Blocks are scanned with `filters.scan_plan()`: building column statistics
+or sorted indexes for a block read once would cost more than it saves.
+Results are the positional indices of the selected rows (`as_index=True`),
+or the selected rows concatenated in catalog order, indexed by position.
+
+Usage:
+    rows = chunked_filters("population.csv", as_index=True, st_type="M", rade_max=4)
+    sample = chunked_query("population.feather", "pl_rade / pl_radeerr1 > 12", columns=["pl_name", "pl_rade"])
+    m_dwarfs = chunked_filters(big_df, workers=8, **STELLAR_TYPE_FILTERS["M"])
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import io
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.datasets import DEFAULT_READ_OPTIONS, READ_OPTIONS, columnar_schema, read_columnar, resolve_dataset_path
+from utils.filters import check_plan, compile_filters, compile_query, evaluate_plan, plan_columns, scan_plan
+
+
+# ------------------------ CONFIGURATION ------------------------
+# Rows per block (CSV blocks are sized from the average line length)
+CHUNK_ROWS = 1_000_000
+
+# Blocks submitted ahead of the results, per worker
+MAX_PENDING = 2
+
+# CSV rows read up front to infer the column types and the line length
+SAMPLE_ROWS = 1_000
+
+COLUMNAR_SUFFIXES = ('.feather', '.npcols')
+
+# How workers read a block of each kind of source: (start, stop) are byte
+# offsets for CSV files and row positions otherwise. Shared buffers are
+# (column, shared memory name, dtype, length, categories) tuples.
+CsvSource = namedtuple("CsvSource", ["path", "names", "dtypes", "options"])
+ColumnarSource = namedtuple("ColumnarSource", ["target"])
+SharedSource = namedtuple("SharedSource", ["buffers"])
+
+_state = {}     # per-process scan state: source, plan, columns, attached shared memory
+
+
+
+
+# ------------------------ SOURCES ------------------------
+def _csv_source(path, chunk_rows):
+    options = READ_OPTIONS.get(path.name, DEFAULT_READ_OPTIONS)
+    sample = pd.read_csv(path, nrows=SAMPLE_ROWS, **options)
+    sample.columns = sample.columns.str.strip()
+    # Text columns are read as text in every block, even where they are empty
+    dtypes = {c: str for c in sample.columns if not pd.api.types.is_numeric_dtype(sample[c])}
+
+    comment = options.get('comment', '').encode(options.get('encoding', 'utf-8'))
+    with open(path, 'rb') as f:
+        line = f.readline()
+        while line and (not line.strip() or (comment and line.lstrip().startswith(comment))):
+            line = f.readline()
+        start = f.tell()
+        sample_bytes = sum(len(f.readline()) for _ in range(len(sample)))
+
+    block_bytes = max(1, int(chunk_rows * sample_bytes / max(len(sample), 1)))
+    size, bounds = path.stat().st_size, [start]
+    with open(path, 'rb') as f:
+        while bounds[-1] < size:
+            # End each block at the end of a line
+            f.seek(bounds[-1] + block_bytes - 1)
+            f.readline()
+            bounds.append(min(f.tell(), size))
+
+    source = CsvSource(str(path), list(sample.columns), dtypes, options)
+    return source, dict(sample.dtypes), list(zip(bounds[:-1], bounds[1:]))
+
+
+def _columnar_source(target, chunk_rows):
+    schema, n_rows = columnar_schema(target)
+    blocks = [(start, min(start + chunk_rows, n_rows)) for start in range(0, n_rows, chunk_rows)]
+    return ColumnarSource(str(target)), schema, blocks
+
+
+def _share_frame(df, columns):
+    # Copy columns into shared memory: numbers as arrays, text as categorical codes
+    buffers, memories = [], []
+    for column in columns:
+        values, categories = df[column], None
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biuf':
+            array = values.to_numpy()
+        elif pd.api.types.is_numeric_dtype(values):
+            array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+            array, categories = values.cat.codes.to_numpy(), values.cat.categories
+
+        memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        memories.append(memory)
+        np.ndarray(array.shape, array.dtype, buffer=memory.buf)[:] = array
+        buffers.append((column, memory.name, array.dtype.str, len(array), categories))
+    return SharedSource(tuple(buffers)), memories
+
+
+def _read_block(source, columns, start, stop):
+    if isinstance(source, CsvSource):
+        with open(source.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        return pd.read_csv(io.BytesIO(data), header=None, names=source.names, usecols=columns,
+                           dtype={c: source.dtypes[c] for c in columns if c in source.dtypes}, **source.options)
+
+    if isinstance(source, ColumnarSource):
+        return read_columnar(Path(source.target), columns, slice(start, stop))
+
+    data = {}
+    for column, name, dtype, length, categories in source.buffers:
+        if column in columns:
+            array = np.ndarray((length,), np.dtype(dtype), buffer=_state['memory'][name].buf)[start:stop]
+            data[column] = array if categories is None else pd.Categorical.from_codes(array, categories)
+    return pd.DataFrame(data, copy=False)
+
+
+
+
+# ------------------------ SCAN ------------------------
+def _init_scan(source, plan, columns):
+    _state.clear()
+    _state.update(source=source, plan=plan, columns=columns,
+                  read=list(dict.fromkeys([*plan_columns(plan), *(columns or ())])))
+    if isinstance(source, SharedSource):
+        _state['memory'] = {name: shared_memory.SharedMemory(name=name) for _, name, *_ in source.buffers}
+
+
+def _scan_block(block):
+    # -> (rows in the block, selected positions in the block, selected rows or None)
+    frame = _read_block(_state['source'], _state['read'], *block)
+    rows = np.flatnonzero(scan_plan(frame, _state['plan']))
+    columns = _state['columns']
+    return len(frame), rows, frame[columns].take(rows) if columns is not None else None
+
+
+def _bounded_map(pool, blocks, limit):
+    # Results in block order, with at most `limit` blocks submitted ahead
+    pending = deque()
+    for block in blocks:
+        pending.append(pool.submit(_scan_block, block))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _collect(results):
+    offset, rows, parts = 0, [], []
+    for n_rows, block_rows, subset in results:
+        block_rows = block_rows + offset
+        rows.append(block_rows)
+        if subset is not None:
+            subset.index = block_rows
+            parts.append(subset)
+        offset += n_rows
+    return (np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)), parts
+
+
+def _scan(source, plan, columns, blocks, workers):
+    if workers == 1 or len(blocks) <= 1:
+        _init_scan(source, plan, columns)
+        try:
+            return _collect(map(_scan_block, blocks))
+        finally:
+            _state.clear()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_scan,
+                             initargs=(source, plan, columns)) as pool:
+        return _collect(_bounded_map(pool, blocks, workers * MAX_PENDING))
+
+
+
+
+# ------------------------ ENTRY POINTS ------------------------
+def execute_plan(source, plan, columns=None, as_index=False, workers=None, chunk_rows=CHUNK_ROWS):
+    """
+    Evaluate a predicate plan over `source` (a catalog path, or a DataFrame)
+    in blocks of about `chunk_rows` rows spread across `workers` processes.
+    Returns the positional indices of the selected rows when `as_index` is
+    True, else the selected rows restricted to `columns` (default: all).
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if isinstance(source, pd.DataFrame):
+        df = source
+        check_plan(plan, df)
+        if workers == 1 or len(df) <= chunk_rows:
+            rows = np.flatnonzero(evaluate_plan(df, plan))
+        else:
+            shared, memories = _share_frame(df, plan_columns(plan))
+            blocks = [(start, min(start + chunk_rows, len(df))) for start in range(0, len(df), chunk_rows)]
+            try:
+                rows, _ = _scan(shared, plan, None, blocks, workers)
+            finally:
+                for memory in memories:
+                    memory.close()
+                    memory.unlink()
+        if as_index:
+            return rows
+        return df.take(rows) if columns is None else df[list(columns)].take(rows)
+
+    path = resolve_dataset_path(source)
+    if path.suffix.lower() in COLUMNAR_SUFFIXES:
+        reader, schema, blocks = _columnar_source(path, chunk_rows)
+    elif path.suffix.lower() == '.csv':
+        reader, schema, blocks = _csv_source(path, chunk_rows)
+    else:
+        raise ValueError(f"Unsupported catalog format for chunked filtering: {path.name}")
+    check_plan(plan, schema)
+
+    columns = None if as_index else list(columns if columns is not None else schema)
+    rows, parts = _scan(reader, plan, columns, blocks, workers)
+    if as_index:
+        return rows
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts)
+
+
+def chunked_filters(source, columns=None, as_index=False, workers=None, chunk_rows=CHUNK_ROWS, **filters):
+    """`apply_filters()` over a large catalog, in parallel blocks (see `execute_plan()`)."""
+    return execute_plan(source, compile_filters(**filters), columns, as_index, workers, chunk_rows)
+
+
+def chunked_query(source, query, columns=None, as_index=False, workers=None, chunk_rows=CHUNK_ROWS):
+    """`apply_query()` over a large catalog, in parallel blocks (see `execute_plan()`)."""
+    return execute_plan(source, compile_query(query), columns, as_index, workers, chunk_rows)
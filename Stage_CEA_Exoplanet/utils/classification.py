@@ -0,0 +1,100 @@
+"""
+Planet Classification Module
+------------------------------------------------
+This module provides a vectorised version of the density/mass planet
+classification used by the M-dwarf plots:
+
+    - Earth-like  : density ratio above the midpoint between an Earth-like
+                    and a 50% H2O composition,
+    - Water World : lower density and mass <= 6 Earth masses,
+    - Sub-Neptune : lower density and a larger mass.
+
+`classify_planets()` works on whole arrays at once with `np.select` and
+returns compact int8 labels, so it can be used on full catalogs or on
+Monte-Carlo resampled ones outside of any plot.
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------ REFERENCE VALUES ------------------------
+EARTH_DENSITY = 4.79        # Reference density used for rho / rho_Earth (g/cm^3)
+H2O_50_DENSITY = 2.11       # 50% H2O composition density (g/cm^3)
+EARTH_BULK_DENSITY = 5.514  # Mean density of the Earth, to convert M / R^3 to g/cm^3
+
+# Density ratio separating Earth-like planets from lower-density ones
+ROCKY_DENSITY_RATIO = (1 + H2O_50_DENSITY / EARTH_DENSITY) / 2
+
+# Mass (Earth masses) separating water worlds from sub-Neptunes
+WATER_WORLD_MAX_MASS = 6
+
+# Integer labels, with their display names and plot colors
+EARTH_LIKE, WATER_WORLD, SUB_NEPTUNE = 0, 1, 2
+CATEGORY_LABELS = ('Earth-like', 'Water World', 'Sub-Neptune')
+CATEGORY_COLORS = ('saddlebrown', 'lightskyblue', 'darkblue')
+
+
+
+
+# ------------------------ CLASSIFICATION ------------------------
+def _as_float(values):
+    # Keep float32 inputs (e.g. Monte-Carlo samples) in float32
+    values = np.asarray(values)
+    return values if values.dtype.kind == 'f' else values.astype(float)
+
+
+def density_ratio(density):
+    """Planet density relative to `EARTH_DENSITY`."""
+    return _as_float(density) / EARTH_DENSITY
+
+
+def density_ratio_from_mass_radius(mass, radius):
+    """Density ratio of planets given in Earth masses and Earth radii."""
+    mass, radius = _as_float(mass), _as_float(radius)
+    return mass / radius ** 3 * (EARTH_BULK_DENSITY / EARTH_DENSITY)
+
+
+def catalog_density_ratio(df):
+    """
+    Density ratio of the planets of a catalog: from its `pl_dens` column, or
+    from mass and radius for catalogs without densities (e.g. the NEA
+    composite table).
+    """
+    if 'pl_dens' in df:
+        return density_ratio(df['pl_dens'].to_numpy(dtype=float, na_value=np.nan))
+    return density_ratio_from_mass_radius(df['pl_bmasse'].to_numpy(dtype=float, na_value=np.nan),
+                                          df['pl_rade'].to_numpy(dtype=float, na_value=np.nan))
+
+
+def classify_planets(mass, density_ratio,
+                     rocky_density_ratio=ROCKY_DENSITY_RATIO,
+                     water_world_max_mass=WATER_WORLD_MAX_MASS):
+    """Classify planets from mass and density-ratio arrays into int8 labels."""
+    mass = _as_float(mass)
+    density_ratio = _as_float(density_ratio)
+
+    labels = np.select(
+        [density_ratio >= rocky_density_ratio, mass <= water_world_max_mass],
+        [EARTH_LIKE, WATER_WORLD],
+        default=SUB_NEPTUNE
+    )
+    return labels.astype(np.int8)
+
+
+def category_colors(labels):
+    """Plot color of each label."""
+    return np.asarray(CATEGORY_COLORS)[labels]
+
+
+def as_categorical(labels):
+    """Labels as a pandas Categorical with readable category names."""
+    return pd.Categorical.from_codes(labels, categories=CATEGORY_LABELS)
+
+
+def classify_planet(mass, density_ratio):
+    """Scalar classification returning the plot color (kept for the notebooks)."""
+    return CATEGORY_COLORS[classify_planets(mass, density_ratio).item()]
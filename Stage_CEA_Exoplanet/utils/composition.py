@@ -0,0 +1,132 @@
+"""
+Mass-Radius Composition Models Module
+------------------------------------------------
+This module holds the theoretical mass-radius relations drawn on the
+M-dwarf plots (Earth-like composition and 50% H2O at several equilibrium
+temperatures) in a single registry.
+
+Each table is fitted with a `CubicSpline` once, and evaluation grids are
+memoized, so plots and per-planet scoring reuse the same precomputed
+curves. `radius()` evaluates a model on arbitrary mass arrays and
+interpolates linearly in temperature between the tabulated curves.
+
+Usage:
+    x, y = model_curve("H2O_50", 700)
+    r = radius(masses, "H2O_50", T=planet_teq)
+    offset = radius_residual(masses, radii, "earth_like")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+
+# ------------------------ MODEL TABLES ------------------------
+# model -> {temperature (K) or None: (masses in M_earth, radii in R_earth)}
+COMPOSITION_MODELS = {
+    "earth_like": {
+        None: (
+            [2.2233, 2.7682, 3.4297, 4.2296, 5.1932, 6.3505,
+             7.7363, 9.3912, 11.3628, 13.7066, 16.4870],
+            [1.2485, 1.3245, 1.4019, 1.4806, 1.5604, 1.6412,
+             1.7228, 1.8052, 1.8883, 1.9719, 2.0559],
+        ),
+    },
+    "H2O_50": {
+        300: (
+            [0.5, 0.595, 0.707, 0.841, 1.0, 1.189, 1.414, 1.682, 2.0, 4.0, 8.0, 16.0],
+            [1.018, 1.07, 1.125, 1.182, 1.241, 1.302, 1.366, 1.432, 1.502, 1.805, 2.152, 2.553],
+        ),
+        500: (
+            [0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0, 10.0, 12.0, 16.0],
+            [1.118, 1.207, 1.314, 1.448, 1.553, 1.717, 1.842, 1.946, 2.178, 2.294, 2.393, 2.553],
+        ),
+        700: (
+            [0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0, 10.0, 12.0, 16.0],
+            [1.232, 1.302, 1.392, 1.512, 1.609, 1.762, 1.881, 1.981, 2.205, 2.319, 2.415, 2.571],
+        ),
+        1000: (
+            [0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0, 10.0, 12.0, 16.0],
+            [1.397, 1.438, 1.511, 1.612, 1.696, 1.832, 1.942, 2.034, 2.247, 2.356, 2.448, 2.6],
+        ),
+    },
+}
+
+# Default mass grid of the plotted curves (M_earth)
+CURVE_MASS_MIN = 0.6
+CURVE_MASS_MAX = 16
+CURVE_POINTS = 200
+
+
+
+
+# ------------------------ SPLINES AND CURVES ------------------------
+def model_temperatures(model):
+    """Tabulated temperatures of a model, sorted (empty for temperature-free models)."""
+    return tuple(sorted(T for T in COMPOSITION_MODELS[model] if T is not None))
+
+
+@lru_cache(maxsize=None)
+def composition_spline(model, T=None):
+    """Cubic spline through one tabulated mass-radius relation (fitted once)."""
+    try:
+        masses, radii = COMPOSITION_MODELS[model][T]
+    except KeyError:
+        raise KeyError(f"No composition table for model={model!r}, T={T!r}") from None
+    return CubicSpline(masses, radii, extrapolate=True)
+
+
+@lru_cache(maxsize=None)
+def model_curve(model, T=None, mass_min=CURVE_MASS_MIN, mass_max=CURVE_MASS_MAX, n=CURVE_POINTS):
+    """Memoized (mass, radius) curve of a model on a log-spaced mass grid."""
+    mass = np.logspace(np.log10(mass_min), np.log10(mass_max), n)
+    curve = composition_spline(model, T)(mass)
+    mass.setflags(write=False)
+    curve.setflags(write=False)
+    return mass, curve
+
+
+
+
+# ------------------------ VECTORISED EVALUATION ------------------------
+def radius(mass, model, T=None):
+    """
+    Model radius (R_earth) at each mass (M_earth).
+
+    For temperature-dependent models `T` may be a scalar or an array
+    broadcastable to `mass`; values between tabulated temperatures are
+    linearly interpolated and values outside the table are clipped to it.
+    """
+    mass = np.asarray(mass, dtype=float)
+    temperatures = model_temperatures(model)
+    if not temperatures:
+        return composition_spline(model)(mass)
+
+    if T is None:
+        raise ValueError(f"Model {model!r} needs a temperature (tabulated: {temperatures})")
+
+    if np.isscalar(T) and T in temperatures:
+        return composition_spline(model, T)(mass)
+
+    grid = np.asarray(temperatures, dtype=float)
+    mass, T = np.broadcast_arrays(mass, np.clip(np.asarray(T, dtype=float), grid[0], grid[-1]))
+
+    # Radius of every tabulated curve at every mass: shape (n_T, *mass.shape)
+    table = np.stack([composition_spline(model, t)(mass) for t in temperatures])
+
+    upper = np.clip(np.searchsorted(grid, T, side='right'), 1, len(grid) - 1)
+    lower = upper - 1
+    weight = (T - grid[lower]) / (grid[upper] - grid[lower])
+
+    r_low = np.take_along_axis(table, lower[None], axis=0)[0]
+    r_high = np.take_along_axis(table, upper[None], axis=0)[0]
+    return r_low + weight * (r_high - r_low)
+
+
+def radius_residual(mass, planet_radius, model, T=None):
+    """Distance of each planet to a composition line: observed minus model radius."""
+    return np.asarray(planet_radius, dtype=float) - radius(mass, model, T)
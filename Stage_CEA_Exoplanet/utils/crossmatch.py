@@ -0,0 +1,220 @@
+"""
+NEA / JWST Cross-Match Module
+------------------------------------------------
+This module matches planets of an NEA-like table (`pl_name`, `ra`, `dec`)
+with the targets of the JWST program list (`Planet`, `RA (deg)`,
+`Dec (deg)`) and attaches the program, cycle and observation type of every
+JWST observation to the matched planets.
+
+Planets are first matched on normalised names (case, spaces, hyphens,
+underscores and dots are ignored, so "GJ 436b" matches "GJ 436 b") through
+a hash index. Planets left unmatched fall back, when the table has `ra` and
+`dec` columns, to a positional match: a KD-tree on the JWST coordinates
+finds targets within `tolerance_arcsec`, and the planet letter (or, without
+one, the orbital period) decides which planet of the system it is.
+
+The JWST index is built once per JWST table and join tables are cached per
+pair of tables (keyed by their content fingerprints).
+
+Usage:
+    join = jwst_observations(df, df_JWST)
+    is_jwst = observed_by_jwst(df_filtered, df_JWST)
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils.cache import dataset_fingerprint
+
+
+# ------------------------ CONFIGURATION ------------------------
+DEFAULT_TOLERANCE_ARCSEC = 5.0
+
+# Relative period difference accepted when a positional match has no planet letter
+PERIOD_TOLERANCE = 0.02
+
+# JWST columns attached to each matched planet
+JWST_COLUMNS = ['Planet', 'prog_no', 'Cycle', 'Prog Type', 'Obs type']
+
+# Planet table columns read by the match
+PLANET_COLUMNS = ('pl_name', 'ra', 'dec', 'pl_orbper')
+
+_CACHE_SIZE = 16
+_indexes = {}   # JWST fingerprint -> JWSTIndex
+_joins = {}     # (planets fingerprint, JWST fingerprint, tolerance) -> join table
+
+JWSTIndex = namedtuple("JWSTIndex", ["names", "letters", "periods", "tree", "tree_rows"])
+
+
+
+
+# ------------------------ NORMALISATION ------------------------
+def normalize_names(names):
+    """Lower-case planet names without spaces, hyphens, underscores or dots (missing stay NaN)."""
+    names = pd.Series(names, dtype=object).reset_index(drop=True)
+    return names.str.lower().str.replace(r'[\s\-_.]', '', regex=True)
+
+
+def planet_letters(normalized):
+    """Trailing planet letter of normalised names ("gj436b" -> "b"), '' if none."""
+    return normalized.str.extract(r'\d([a-z])$', expand=False).fillna('')
+
+
+def parse_degrees(values):
+    """Coordinates in degrees as floats; a mis-encoded leading minus sign is restored."""
+    text = pd.Series(values).astype(str).str.strip()
+    text = text.str.replace(r'^[^\d.+\-]+(?=\d)', '-', regex=True)
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+
+
+def unit_vectors(ra, dec):
+    """Cartesian unit vectors of equatorial coordinates in degrees."""
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def _chord(arcsec):
+    # Straight-line distance between unit vectors separated by `arcsec`
+    return 2 * np.sin(np.radians(arcsec / 3600) / 2)
+
+
+def match_positions(tree, ra, dec, tolerance_arcsec):
+    """
+    Pairs (i, j) of coordinates `ra[i]`, `dec[i]` lying within
+    `tolerance_arcsec` of point j of a KD-tree built with `unit_vectors()`.
+    Rows with missing coordinates never match.
+    """
+    located = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+    if located.size == 0 or tree.n == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    pairs = cKDTree(unit_vectors(ra[located], dec[located])).sparse_distance_matrix(
+        tree, _chord(tolerance_arcsec), output_type='ndarray')
+    return located[pairs['i']], pairs['j'].astype(np.intp)
+
+
+def same_planet(letters, other_letters, periods, other_periods):
+    """
+    Whether pairs of planets of the same system are the same planet: the
+    planet letters must agree, or the orbital periods (within
+    `PERIOD_TOLERANCE`) when either letter is missing.
+    """
+    same_letter = (letters != '') & (letters == other_letters)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period_gap = np.abs(periods - other_periods) / other_periods
+    no_letter = (letters == '') | (other_letters == '')
+    return same_letter | (no_letter & (period_gap < PERIOD_TOLERANCE))
+
+
+def _remember(cache, key, value):
+    cache[key] = value
+    while len(cache) > _CACHE_SIZE:
+        del cache[next(iter(cache))]
+    return value
+
+
+
+
+# ------------------------ INDEX ------------------------
+def jwst_index(jwst):
+    """Name hash index and positional KD-tree of a JWST program table (built once)."""
+    key = dataset_fingerprint(jwst)
+    if key in _indexes:
+        return _indexes[key]
+
+    names = normalize_names(jwst['Planet'])
+    ra = parse_degrees(jwst['RA (deg)'])
+    dec = parse_degrees(jwst['Dec (deg)'])
+    located = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+
+    index = JWSTIndex(
+        names=pd.DataFrame({'name': names, 'jwst_row': np.arange(len(jwst))}).dropna(),
+        letters=planet_letters(names).to_numpy(),
+        periods=pd.to_numeric(jwst['Period (d)'], errors='coerce').to_numpy(dtype=float),
+        tree=cKDTree(unit_vectors(ra[located], dec[located])),
+        tree_rows=located,
+    )
+    return _remember(_indexes, key, index)
+
+
+
+
+# ------------------------ MATCHING ------------------------
+def _name_pairs(normalized, index):
+    planets = pd.DataFrame({'name': normalized, 'row': np.arange(len(normalized))}).dropna()
+    pairs = planets.merge(index.names, on='name', how='inner')
+    return pairs['row'].to_numpy(dtype=np.intp), pairs['jwst_row'].to_numpy(dtype=np.intp)
+
+
+def _position_pairs(planets, normalized, candidates, index, tolerance_arcsec):
+    if 'ra' not in planets or 'dec' not in planets:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    ra = pd.to_numeric(planets['ra'], errors='coerce').to_numpy(dtype=float)[candidates]
+    dec = pd.to_numeric(planets['dec'], errors='coerce').to_numpy(dtype=float)[candidates]
+    i, j = match_positions(index.tree, ra, dec, tolerance_arcsec)
+    rows = candidates[i]
+    matches = index.tree_rows[j]
+
+    letters = planet_letters(normalized).to_numpy()
+    periods = pd.to_numeric(planets['pl_orbper'], errors='coerce').to_numpy(dtype=float) \
+        if 'pl_orbper' in planets else np.full(len(planets), np.nan)
+    keep = same_planet(letters[rows], index.letters[matches], periods[rows], index.periods[matches])
+    return rows[keep], matches[keep]
+
+
+def _planets_fingerprint(planets):
+    # Only the columns the match reads are checked for edits
+    return dataset_fingerprint(planets, [c for c in PLANET_COLUMNS if c in planets])
+
+
+def jwst_observations(planets, jwst, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """
+    Join table with one row per (planet, JWST observation): the planet row
+    position and name, the JWST program columns and how the match was made
+    ('name' or 'position'). Cached per pair of tables.
+    """
+    key = (_planets_fingerprint(planets), dataset_fingerprint(jwst), tolerance_arcsec)
+    if key in _joins:
+        return _joins[key]
+
+    index = jwst_index(jwst)
+    normalized = normalize_names(planets['pl_name'])
+
+    name_rows, name_matches = _name_pairs(normalized, index)
+    unmatched = np.setdiff1d(np.arange(len(planets)), name_rows)
+    position_rows, position_matches = _position_pairs(planets, normalized, unmatched, index, tolerance_arcsec)
+
+    rows = np.concatenate([name_rows, position_rows])
+    matches = np.concatenate([name_matches, position_matches])
+    join = jwst.iloc[matches][[c for c in JWST_COLUMNS if c in jwst]].reset_index(drop=True)
+    join.insert(0, 'row', rows)
+    join.insert(1, 'pl_name', planets['pl_name'].to_numpy()[rows])
+    join['match'] = ['name'] * len(name_rows) + ['position'] * len(position_rows)
+    join = join.sort_values(['row', 'match'], kind='stable').reset_index(drop=True)
+
+    return _remember(_joins, key, join)
+
+
+def store_observations(planets, jwst, join, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """Record the join table of a pair of tables (e.g. updated incrementally from an older catalog version)."""
+    key = (_planets_fingerprint(planets), dataset_fingerprint(jwst), tolerance_arcsec)
+    return _remember(_joins, key, join)
+
+
+def forget_joins():
+    """Drop every memoized join table."""
+    _joins.clear()
+
+
+def observed_by_jwst(planets, jwst, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """Boolean array: whether each planet of `planets` has at least one JWST observation."""
+    observed = np.zeros(len(planets), dtype=bool)
+    observed[jwst_observations(planets, jwst, tolerance_arcsec)['row'].to_numpy()] = True
+    return observed
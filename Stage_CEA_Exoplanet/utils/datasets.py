@@ -0,0 +1,463 @@
+"""
+Dataset Loading Module
+------------------------------------------------
+This module provides lazily initialised, memoized access to the catalogs
+stored in the repository `Dataset/` folder.
+
+Nothing is read at import time: `load_dataset()` parses a catalog on first
+use and keeps it in memory, keyed by its resolved path and modification
+time, so that a catalog rewritten on disk is picked up automatically.
+`invalidate_dataset()` drops cached tables explicitly.
+
+The memoized table is never handed out for writing: `load_dataset()`
+returns a copy-on-write view of it (a deep copy without pandas
+copy-on-write), which callers may modify freely. Library code that only
+reads the catalog uses `shared_dataset()`, the memoized table itself, so
+that the caches keyed on the table object (selections, column statistics,
+plot arrays) are shared by every caller; it must not be modified.
+
+The first parse of a catalog also writes a typed columnar copy of it in a
+`.catalog_cache/` folder next to the source, keyed by the source content
+hash. Later loads (including in new sessions) read that copy instead of
+the text file, memory-mapped and restricted to the requested columns:
+Feather when pyarrow is installed, one `.npy` file per column otherwise.
+
+Catalogs are CSV files or VOTables (`.vot`, read by `utils.votable`).
+Tables derived from them, such as the merged catalog of `utils.harmonize`,
+are persisted in the same cache with `store_table()` / `load_table()`; the
+columnar format itself is exposed by `write_columnar()` / `read_columnar()`
+for other on-disk stores (see `utils.snapshots`).
+
+`compact=True` additionally stores the loaded columns with compact dtypes
+(see `compact_dtypes()`), which together with a column projection cuts the
+memory and copy cost of wide catalogs by an order of magnitude.
+
+Usage:
+    df = load_dataset()                   # default NEA composite table
+    jwst = load_dataset("JWST.csv")
+    small = load_dataset(columns=["pl_name", "pl_rade", "pl_bmasse"])
+    lean = load_dataset(columns=required_columns(st_type="M"), compact=True)
+    set_default_dataset("path/to/other_export.csv")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.statistics import tracks_edits
+from utils.votable import read_votable
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+# ------------------------ DATASET PATHS ------------------------
+DATASET_DIR = Path(__file__).resolve().parents[2] / "Dataset"
+
+DEFAULT_DATASET = "NEA_planetary_systems_composite.csv"
+
+# `pd.read_csv` options for each known catalog; unknown files use NEA defaults.
+READ_OPTIONS = {
+    "NEA_planetary_systems_composite.csv": dict(comment='#'),
+    "Exoplaneteu.csv":                     dict(),
+    "JWST.csv":                            dict(sep=';', encoding='latin1'),
+    "JWSTRP.csv":                          dict(sep=';'),
+}
+DEFAULT_READ_OPTIONS = dict(comment='#')
+
+VOTABLE_SUFFIXES = ('.vot', '.xml')
+
+CACHE_DIRNAME = ".catalog_cache"
+
+# Low-cardinality text columns stored as pandas categoricals by `compact_dtypes()`.
+CATEGORICAL_COLUMNS = ('disc_facility', 'discoverymethod', 'st_spectype')
+
+# Float columns whose values are all quoted with at most this many significant
+# digits are exactly representable at float32 precision.
+FLOAT32_DIGITS = 7
+
+_default_path = None
+_cache = {}     # (resolved path, columns, compact) -> (mtime_ns, DataFrame)
+
+
+
+
+# ------------------------ PATH RESOLUTION ------------------------
+def resolve_dataset_path(path=None):
+    """Resolve a catalog path; bare file names are looked up in `Dataset/`."""
+    if path is None:
+        path = _default_path if _default_path is not None else DEFAULT_DATASET
+
+    path = Path(path)
+    if not path.is_absolute() and not path.exists():
+        path = DATASET_DIR / path
+    return path.resolve()
+
+
+def set_default_dataset(path):
+    """Point the presets (and every `load_dataset()` call without a path) at another catalog."""
+    global _default_path
+    _default_path = path
+
+
+
+
+# ------------------------ SOURCE FINGERPRINT ------------------------
+def _hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_path(path):
+    return path.parent / CACHE_DIRNAME / f"{path.name}.json"
+
+
+def _read_manifest(path):
+    try:
+        with open(_manifest_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def catalog_fingerprint(path):
+    """SHA-1 of a catalog file, re-hashed only when its size or mtime changed."""
+    path = Path(path)
+    stat = path.stat()
+    manifest = _read_manifest(path)
+    if manifest.get('size') == stat.st_size and manifest.get('mtime_ns') == stat.st_mtime_ns:
+        return manifest['sha1']
+    return _hash_file(path)
+
+
+
+
+# ------------------------ COLUMNAR CACHE ------------------------
+def _write_feather(df, target):
+    df.reset_index(drop=True).to_feather(target, compression='uncompressed')
+
+
+def _read_feather(target, columns, rows=None):
+    table = feather.read_table(target, columns=columns, memory_map=True)
+    if rows is not None:
+        table = table.slice(rows.start, rows.stop - rows.start)
+    return table.to_pandas()
+
+
+def _write_npy(df, target):
+    # One memory-mappable .npy per column; text columns are stored as
+    # fixed-width unicode plus a missing-value mask.
+    target.mkdir()
+    schema = []
+    for i, (name, series) in enumerate(df.items()):
+        entry = dict(name=name, file=f"{i}.npy", dtype=str(series.dtype))
+        if series.dtype.kind in 'biuf':
+            np.save(target / entry['file'], series.to_numpy())
+        else:
+            missing = series.isna().to_numpy()
+            text = series.astype(object).where(~missing, '').astype(str)
+            np.save(target / entry['file'], text.to_numpy(dtype=str))
+            entry['mask'] = f"{i}.mask.npy"
+            np.save(target / entry['mask'], missing)
+        schema.append(entry)
+
+    with open(target / "schema.json", 'w') as f:
+        json.dump(schema, f)
+
+
+def _read_npy(target, columns, rows=None):
+    with open(target / "schema.json") as f:
+        schema = {entry['name']: entry for entry in json.load(f)}
+
+    data = {}
+    for name in (columns if columns is not None else schema):
+        entry = schema[name]
+        values = np.load(target / entry['file'], mmap_mode='r').view(np.ndarray)
+        if rows is not None:
+            values = values[rows]
+        if 'mask' in entry:
+            values = values.astype(object)
+            missing = np.load(target / entry['mask'], mmap_mode='r')
+            values[missing if rows is None else missing[rows]] = np.nan
+        data[name] = pd.Series(values, dtype=entry['dtype'], name=name, copy=False)
+
+    return pd.DataFrame(data, copy=False)
+
+
+def write_columnar(df, target):
+    """
+    Write a DataFrame as a columnar file `target`: Feather for a `.feather`
+    suffix, a folder of `.npy` columns otherwise. The file is built in a
+    temporary location, then moved into place atomically.
+    """
+    tmp = Path(tempfile.mkdtemp(dir=target.parent)) / target.name
+    try:
+        if target.suffix == '.feather':
+            _write_feather(df, tmp)
+        else:
+            _write_npy(df, tmp)
+        os.replace(tmp, target)
+    finally:
+        shutil.rmtree(tmp.parent, ignore_errors=True)
+
+
+def read_columnar(target, columns=None, rows=None):
+    """
+    Read `columns` (default: all) of a file written by `write_columnar()`,
+    memory-mapped; `rows` is a slice(start, stop) of rows, read alone.
+    """
+    if target.suffix == '.feather':
+        return _read_feather(target, columns, rows)
+    return _read_npy(target, columns, rows)
+
+
+def columnar_schema(target):
+    """{column: dtype} and row count of a columnar file, without reading its data."""
+    if target.suffix == '.feather':
+        table = feather.read_table(target, memory_map=True)
+        return dict(table.slice(0, 0).to_pandas().dtypes), table.num_rows
+    with open(target / "schema.json") as f:
+        schema = json.load(f)
+    n_rows = len(np.load(target / schema[0]['file'], mmap_mode='r')) if schema else 0
+    return {entry['name']: np.dtype(object) if 'mask' in entry else np.dtype(entry['dtype'])
+            for entry in schema}, n_rows
+
+
+def remove_columnar(target):
+    """Delete a columnar file (or `.npy` columns folder)."""
+    if target.is_dir():
+        shutil.rmtree(target)
+    else:
+        target.unlink()
+
+
+def _cache_target(path, sha1):
+    suffix = '.feather' if feather is not None else '.npcols'
+    return path.parent / CACHE_DIRNAME / f"{path.name}.{sha1[:16]}{suffix}"
+
+
+def _read_cached(path, columns):
+    """Read a catalog from its columnar cache, or return None if there is no valid cache."""
+    stat = path.stat()
+    manifest = _read_manifest(path)
+    sha1 = catalog_fingerprint(path)
+    target = _cache_target(path, sha1)
+    if manifest.get('sha1') != sha1 or manifest.get('file') != target.name or not target.exists():
+        return None
+
+    if manifest.get('mtime_ns') != stat.st_mtime_ns:
+        # Touched but unchanged: refresh the manifest so it is not re-hashed next time
+        _write_manifest(path, stat, sha1, target)
+
+    try:
+        schema, _ = columnar_schema(target)
+    except (OSError, ValueError, KeyError):
+        return None
+    _require_columns(path, columns, schema)
+    try:
+        return read_columnar(target, columns)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_manifest(path, stat, sha1, target):
+    manifest = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=sha1, file=target.name)
+    with open(_manifest_path(path), 'w') as f:
+        json.dump(manifest, f)
+
+
+def _write_cache(path, df):
+    """Write the columnar copy of a freshly parsed catalog (best effort)."""
+    stat = path.stat()
+    sha1 = _hash_file(path)
+    target = _cache_target(path, sha1)
+    cache_dir = target.parent
+
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        for stale in cache_dir.glob(f"{glob.escape(path.name)}.*"):
+            if stale.suffix in ('.feather', '.npcols'):
+                remove_columnar(stale)
+
+        write_columnar(df, target)
+        _write_manifest(path, stat, sha1, target)
+    except (OSError, ValueError, TypeError):
+        # Read-only folder or a column type the cache cannot hold: keep the CSV path
+        pass
+
+
+def clear_catalog_cache(path=None):
+    """Delete the on-disk columnar cache of one catalog, or of the whole `Dataset/` folder."""
+    if path is None:
+        shutil.rmtree(DATASET_DIR / CACHE_DIRNAME, ignore_errors=True)
+        return
+
+    path = resolve_dataset_path(path)
+    for cached in (path.parent / CACHE_DIRNAME).glob(f"{glob.escape(path.name)}.*"):
+        remove_columnar(cached)
+
+
+
+
+# ------------------------ DERIVED TABLES ------------------------
+def _derived_target(name, key):
+    suffix = '.feather' if feather is not None else '.npcols'
+    return DATASET_DIR / CACHE_DIRNAME / f"{name}.{key[:16]}{suffix}"
+
+
+def store_table(name, key, df):
+    """
+    Persist a table derived from the catalogs (e.g. a merged catalog) in the
+    columnar cache under `name`, replacing older versions; `key` identifies
+    its inputs. Best effort: returns False if it could not be written.
+    """
+    target = _derived_target(name, key)
+    try:
+        target.parent.mkdir(exist_ok=True)
+        for stale in target.parent.glob(f"{glob.escape(name)}.*"):
+            if stale.suffix in ('.feather', '.npcols') and stale.name != target.name:
+                remove_columnar(stale)
+        if not target.exists():
+            write_columnar(df, target)
+        return True
+    except (OSError, ValueError, TypeError):
+        return False
+
+
+def load_table(name, key, columns=None):
+    """Read a table stored by `store_table()`, or return None if there is none for `key`."""
+    target = _derived_target(name, key)
+    if not target.exists():
+        return None
+    try:
+        return read_columnar(target, list(dict.fromkeys(columns)) if columns is not None else None)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+
+
+# ------------------------ COMPACT DTYPES ------------------------
+def _fits_float32(values):
+    finite = values[np.isfinite(values) & (values != 0)]
+    if finite.size == 0:
+        return True
+
+    exponent = np.floor(np.log10(np.abs(finite)))
+    scale = 10.0 ** (FLOAT32_DIGITS - 1 - exponent)
+    return np.allclose(np.round(finite * scale) / scale, finite, rtol=1e-12, atol=0)
+
+
+def compact_dtypes(df, categorical=CATEGORICAL_COLUMNS):
+    """
+    Return `df` with compact column dtypes: categoricals for `categorical`,
+    float32 for float columns quoted with at most `FLOAT32_DIGITS`
+    significant digits, and the smallest integer type for integer columns.
+    """
+    compact = {}
+    for name, series in df.items():
+        kind = series.dtype.kind
+        if name in categorical:
+            series = series.astype('category')
+        elif kind == 'f' and series.dtype.itemsize > 4 and _fits_float32(series.to_numpy()):
+            series = series.astype(np.float32)
+        elif kind in 'iu':
+            series = pd.to_numeric(series, downcast='integer')
+        compact[name] = series
+
+    return pd.DataFrame(compact, index=df.index)
+
+
+
+
+# ------------------------ LOADING ------------------------
+def _require_columns(path, columns, available):
+    missing = [column for column in columns or () if column not in available]
+    if missing:
+        raise KeyError(f"Column(s) missing from {Path(path).name}: {', '.join(missing)}")
+
+
+def parse_catalog(path):
+    """Parse a catalog file (CSV or VOTable), without any caching."""
+    path = Path(path)
+    if path.suffix.lower() in VOTABLE_SUFFIXES:
+        return read_votable(path)
+    if path.suffix.lower() != '.csv':
+        raise ValueError(f"Unsupported catalog format: {path.name}")
+
+    df = pd.read_csv(path, **READ_OPTIONS.get(path.name, DEFAULT_READ_OPTIONS))
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def read_catalog(path, columns=None, use_cache=True):
+    """Read a catalog from its columnar cache, parsing (and caching) the source if needed."""
+    path = Path(path)
+    columns = list(dict.fromkeys(columns)) if columns is not None else None
+
+    if use_cache:
+        df = _read_cached(path, columns)
+        if df is not None:
+            return df
+
+    df = parse_catalog(path)
+    if use_cache:
+        _write_cache(path, df)
+    _require_columns(path, columns, df.columns)
+    return df[columns] if columns is not None else df
+
+
+def shared_dataset(path=None, columns=None, compact=False, reload=False):
+    """
+    Return the memoized catalog itself (see `load_dataset()` for the
+    arguments), the same object on every call until the file changes.
+    Read-only: modify the table returned by `load_dataset()` instead.
+    """
+    path = resolve_dataset_path(path)
+    mtime = path.stat().st_mtime_ns
+    key = (path, tuple(columns) if columns is not None else None, compact)
+
+    cached = _cache.get(key)
+    if reload or cached is None or cached[0] != mtime:
+        df = read_catalog(path, columns)
+        _cache[key] = (mtime, compact_dtypes(df) if compact else df)
+
+    return _cache[key][1]
+
+
+def load_dataset(path=None, columns=None, compact=False, reload=False):
+    """
+    Return a catalog as a DataFrame, reading it only on first use or after it changed.
+
+    `columns` restricts the table to the columns a filter or plot needs
+    (see `filters.required_columns()` and `plots.plot_columns()`), and
+    `compact` converts them with `compact_dtypes()`. The table is a view of
+    the memoized one that can be modified without affecting it or later calls.
+    """
+    return shared_dataset(path, columns, compact, reload).copy(deep=not tracks_edits())
+
+
+def invalidate_dataset(path=None):
+    """Forget a cached catalog, or every cached catalog when `path` is None."""
+    if path is None:
+        _cache.clear()
+        return
+
+    path = resolve_dataset_path(path)
+    for key in [key for key in _cache if key[0] == path]:
+        del _cache[key]
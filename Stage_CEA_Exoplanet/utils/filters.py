@@ -5,173 +5,709 @@ This module provides a single entry-point function `apply_filters()`
 for filtering confirmed exoplanet from NEA data using a range of stellar,
 planetary, and system parameters.
 
+Selections can also be written as query strings (`apply_query()`), e.g.
+"st_teff between 4700 6500 and pl_rade / pl_radeerr1 > 12", for cuts that
+have no keyword. A query is parsed once into a flat plan of atomic
+predicates (`compile_query()`) and checked against the table schema; the
+keyword arguments are a thin front end that writes such a query
+(`keyword_query()`). Every predicate is evaluated as a NumPy boolean mask on
+the original column arrays (arithmetic through numexpr on large tables when
+it is installed), the masks are combined, and the table is sliced a single
+time at the end.
+
+Plans are ordered with per-column statistics (`utils.statistics`): the
+predicates that are cheap and reject the most rows run first, costly
+derived ones (arithmetic, prefix matches) only on the surviving rows, and a
+range cut that the column min/max proves unsatisfiable returns an empty
+selection without reading any data. Range cuts on the columns scanned most
+often are slices of sorted indexes (`utils.indexes`). Both are cached per
+frame and need pandas copy-on-write to notice in-place edits cheaply; without
+it (`statistics.tracks_edits()` is False) plans are scanned as by
+`scan_plan()`.
+
 Usage:
     See sample
+    apply_query(df, "st_spectype startswith 'M' and pl_rade < 4 and pl_orbsmax <= 0.1")
 
 Author: S.WITTMANN & V.REGNARD
 Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
 """
 
+import ast
+import operator
+import re
+from collections import namedtuple
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 
-def apply_filters(
-    df,
-
-    # Discovery filters
-    mission=None, date_min=None, date_max=None,
-    kp=None, discovery_method=None,
-
-    # Stellar filters
-    st_type=None,
-    Teff_min=None, Teff_max=None,
-    metallicity_min=None, metallicity_max=None,
-    age_min=None, age_max=None,
-    stellar_radius_err_max=None,
-    Fulton_2017=False,
-
-    # Planetary filters
-    rade_min=None, rade_max=None, rade_err=None,
-    mass_min=None, mass_max=None, mass_err=None,
-    density_min=None, density_max=None,
-    eccentricity_max=None,
-    transit_depth_min=None, transit_depth_max=None,
-    eqt_min=None, eqt_max=None,
-    P=None, b=None,
-
-    # System filters
-    multiplicity_min=None, multiplicity_max=None
-    ):
-
-
-    """Apply a combination of filters to an exoplanet dataset."""
-    df_filtered = df.copy()
-
+from utils.indexes import is_indexable, range_rows
+from utils.statistics import estimate_selectivity, is_unsatisfiable, tracks_edits
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
 
-    # ------------------------ Discovery filters ------------------------
-    if mission is not None:
-        df_filtered = df_filtered[
-            df_filtered['disc_facility'].notna() &
-            (df_filtered['disc_facility'] == mission)
-        ]
 
-    if discovery_method is not None:
-        df_filtered = df_filtered[
-            df_filtered['discoverymethod'].notna() &
-            (df_filtered['discoverymethod'] == discovery_method)
-        ]
+# Bumped whenever the meaning of a filter changes, to invalidate cached selections.
+FILTER_VERSION = 2
 
-    if date_min is not None:
-        df_filtered = df_filtered[df_filtered['disc_year'] > date_min]
 
-    if date_max is not None:
-        df_filtered = df_filtered[df_filtered['disc_year'] < date_max]
+# ------------------------ Predicate plan ------------------------
+# An atomic condition: `op` names a kernel in `_KERNELS`, `columns` are the
+# columns it reads and `value` is its threshold (None for flag filters).
+# Arithmetic conditions use op 'expr' with value (left, comparison, right),
+# both sides being canonical expression strings.
+Predicate = namedtuple("Predicate", ["op", "columns", "value"])
 
-    if kp is not None:
-        df_filtered = df_filtered[df_filtered['sy_kepmag'] < kp]
-
-
-
-
-    # ------------------------ Stellar filters ------------------------
-    if st_type is not None:
-        df_filtered = df_filtered[df_filtered['st_spectype'].fillna('').str.startswith(st_type)]
-
-    if Teff_min is not None:
-        df_filtered = df_filtered[df_filtered['st_teff'] > Teff_min]
+# Keyword argument -> query template, in the order of `apply_filters()`.
+# `{}` receives the keyword value; flag filters have no placeholder.
+FILTER_KEYWORDS = {
+    # Discovery filters
+    'mission':                "disc_facility == {}",
+    'discovery_method':       "discoverymethod == {}",
+    'date_min':               "disc_year > {}",
+    'date_max':               "disc_year < {}",
+    'kp':                     "sy_kepmag < {}",
 
-    if Teff_max is not None:
-        df_filtered = df_filtered[df_filtered['st_teff'] < Teff_max]
+    # Stellar filters
+    'st_type':                "st_spectype startswith {}",
+    'Teff_min':               "st_teff > {}",
+    'Teff_max':               "st_teff < {}",
+    'metallicity_min':        "st_met > {}",
+    'metallicity_max':        "st_met < {}",
+    'age_min':                "st_age > {}",
+    'age_max':                "st_age < {}",
+    'stellar_radius_err_max': "maximum(st_raderr1, st_raderr2) / st_rad < {}",
+    'Fulton_2017':            "st_rad > 10 ** (0.00025 * (st_teff / (1 - 5500) + 0.20))",
 
-    if metallicity_min is not None:
-        df_filtered = df_filtered[df_filtered['st_met'] > metallicity_min]
+    # Planetary filters
+    'rade_min':               "pl_rade > {}",
+    'rade_max':               "pl_rade < {}",
+    'rade_err':               "maximum(pl_radeerr1, pl_radeerr2) / pl_rade < {}",
+    'mass_min':               "pl_bmasse > {}",
+    'mass_max':               "pl_bmasse < {}",
+    'mass_err':               "maximum(pl_bmasseerr1, pl_bmasseerr2) / pl_bmasse < {}",
+    'density_min':            "pl_dens > {}",
+    'density_max':            "pl_dens < {}",
+    'eccentricity_max':       "pl_orbeccen < {}",
+    'transit_depth_min':      "pl_trandep > {}",
+    'transit_depth_max':      "pl_trandep < {}",
+    'eqt_min':                "pl_eqt > {}",
+    'eqt_max':                "pl_eqt < {}",
+    'P':                      "pl_orbper < {}",
+    'b':                      "pl_imppar < {}",
 
-    if metallicity_max is not None:
-        df_filtered = df_filtered[df_filtered['st_met'] < metallicity_max]
+    # System filters
+    'multiplicity_min':       "sy_pnum >= {}",
+    'multiplicity_max':       "sy_pnum <= {}",
+}
 
-    if age_min is not None:
-        df_filtered = df_filtered[df_filtered['st_age'] > age_min]
+# Filters that are switched on by a boolean flag rather than a threshold.
+FLAG_FILTERS = ('Fulton_2017',)
 
-    if age_max is not None:
-        df_filtered = df_filtered[df_filtered['st_age'] < age_max]
 
-    if stellar_radius_err_max is not None:
-        mask = df_filtered['st_rad'].notna() & df_filtered['st_raderr1'].notna() & df_filtered['st_raderr2'].notna()
-        err = df_filtered[['st_raderr1', 'st_raderr2']].max(axis=1)
-        snr = err / df_filtered['st_rad']
-        df_filtered = df_filtered[mask & (snr < stellar_radius_err_max)]
+def _literal(value):
+    # Keyword value -> query literal that parses back to the same value
+    if isinstance(value, str):
+        return repr(value)
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return str(int(value))
+    return repr(float(value))
 
-    if Fulton_2017:
-        mask = df_filtered['st_teff'].notna() & df_filtered['st_rad'].notna()
-        teff = df_filtered.loc[mask, 'st_teff']
-        threshold = 10 ** (0.00025 * ( teff / ( 1 - 5500) + 0.20) )
-        valid = df_filtered.loc[mask, 'st_rad'] > threshold
-        df_filtered = df_filtered.loc[mask].loc[valid]
 
+def keyword_query(**filters):
+    """Query string equivalent to `apply_filters()` keyword arguments ('' selects everything)."""
+    unknown = set(filters) - set(FILTER_KEYWORDS)
+    if unknown:
+        raise TypeError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+    conditions = []
+    for keyword, template in FILTER_KEYWORDS.items():
+        value = filters.get(keyword)
+        if keyword in FLAG_FILTERS:
+            if value:
+                conditions.append(template)
+        elif value is not None:
+            conditions.append(template.format(_literal(value)))
+
+    return " and ".join(conditions)
+
+
+def compile_filters(**filters):
+    """Translate `apply_filters()` keyword arguments into a tuple of predicates."""
+    return compile_query(keyword_query(**filters))
 
 
-    # ------------------------ Planetary filters ------------------------
-    if rade_min is not None:
-        df_filtered = df_filtered[df_filtered['pl_rade'] > rade_min]
+def required_columns(**filters):
+    """Columns read by a filter configuration, in plan order and without duplicates."""
+    return plan_columns(compile_filters(**filters))
+
+
+def plan_columns(plan):
+    """Columns read by a plan, in plan order and without duplicates."""
+    columns = {}
+    for predicate in plan:
+        columns.update(dict.fromkeys(predicate.columns))
+    return tuple(columns)
+
+
+def missing_columns(df, plan):
+    """Columns read by a plan that `df` does not have (e.g. `sy_kepmag` in the NEA composite table)."""
+    return [column for column in plan_columns(plan) if column not in df.columns]
+
+
+def _require_columns(df, plan):
+    missing = missing_columns(df, plan)
+    if missing:
+        raise KeyError(f"Filter needs column(s) missing from the catalog: {', '.join(missing)}")
+
+
+
+
+# ------------------------ Query parsing ------------------------
+# A query is a conjunction of conditions joined by `and`:
+#     <expr> <op> <expr> [<op> <expr>]     op: < <= > >= == !=
+#     <expr> between <low> [and] <high>    (inclusive bounds)
+#     <column> in (<literal>, ...)
+#     <column> startswith '<prefix>'
+# Expressions combine columns, numbers, + - * / **, parentheses and the
+# functions of `QUERY_FUNCTIONS`. Column names that are not identifiers
+# are written between backticks.
+
+QUERY_FUNCTIONS = {
+    'abs':     np.abs,
+    'sqrt':    np.sqrt,
+    'exp':     np.exp,
+    'log':     np.log,
+    'log10':   np.log10,
+    'maximum': np.maximum,
+    'minimum': np.minimum,
+}
+
+# Functions numexpr evaluates with the same NaN semantics as NumPy
+NUMEXPR_FUNCTIONS = ('abs', 'sqrt', 'exp', 'log', 'log10')
+
+# Below this many rows the NumPy evaluation is faster than numexpr.
+NUMEXPR_MIN_ROWS = 1_000_000
+
+_CONSTANTS = {'inf': np.inf, 'nan': np.nan}
+_KEYWORDS = ('and', 'between', 'in', 'startswith')
+
+_COMPARISONS = {'>': 'gt', '<': 'lt', '>=': 'ge', '<=': 'le', '==': 'eq', '!=': 'ne'}
+_FLIPPED = {'>': '<', '<': '>', '>=': '<=', '<=': '>=', '==': '==', '!=': '!='}
+_COMPARE = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le,
+            '==': operator.eq, '!=': operator.ne}
+_ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '**': operator.pow}
+
+_TOKEN = re.compile(r"""\s*(?:
+      (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<column>`[^`]+`)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<op>\*\*|<=|>=|==|!=|[-+*/()<>,])
+    )""", re.VERBOSE)
+
+
+def _tokenize(query):
+    tokens, position = [], 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid query syntax at {query[position:]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'name' and text in _KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # Recursive-descent parser; expression nodes are tuples:
+    # ('col', name), ('num', value), ('str', text), ('neg', node),
+    # ('bin', op, left, right), ('call', function, args)
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if token[0] is None or (kind is not None and token[0] != kind) or (text is not None and token[1] != text):
+            expected = text or kind or 'more input'
+            raise ValueError(f"Invalid query {self.query!r}: expected {expected}, got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token = self.peek()
+        if token[0] == kind and (text is None or token[1] == text):
+            self.position += 1
+            return True
+        return False
+
+    def conditions(self):
+        conditions = [self.condition()]
+        while self.accept('keyword', 'and'):
+            conditions.append(self.condition())
+        if self.peek()[0] is not None:
+            raise ValueError(f"Invalid query {self.query!r}: unexpected {self.peek()[1]!r}")
+        return conditions
+
+    def condition(self):
+        left = self.sum()
+        if self.accept('keyword', 'between'):
+            low = self.sum()
+            self.accept('keyword', 'and')
+            return [('>=', left, low), ('<=', left, self.sum())]
+        if self.accept('keyword', 'in'):
+            self.take('op', '(')
+            values = [self.literal()]
+            while self.accept('op', ','):
+                values.append(self.literal())
+            self.take('op', ')')
+            return [('in', left, tuple(values))]
+        if self.accept('keyword', 'startswith'):
+            return [('startswith', left, self.literal())]
+
+        comparisons = []
+        while self.peek()[1] in _COMPARISONS:
+            op = self.take()[1]
+            right = self.sum()
+            comparisons.append((op, left, right))
+            left = right
+        if not comparisons:
+            raise ValueError(f"Invalid query {self.query!r}: condition without comparison")
+        return comparisons
+
+    def literal(self):
+        node = self.unary()
+        if node[0] not in ('num', 'str'):
+            raise ValueError(f"Invalid query {self.query!r}: expected a literal")
+        return node[1]
+
+    def sum(self):
+        node = self.product()
+        while self.peek()[1] in ('+', '-'):
+            node = _binary(self.take()[1], node, self.product())
+        return node
+
+    def product(self):
+        node = self.unary()
+        while self.peek()[1] in ('*', '/'):
+            node = _binary(self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.accept('op', '-'):
+            node = self.unary()
+            return ('num', -node[1]) if node[0] == 'num' else ('neg', node)
+        if self.accept('op', '+'):
+            return self.unary()
+        node = self.atom()
+        if self.accept('op', '**'):
+            node = _binary('**', node, self.unary())
+        return node
+
+    def atom(self):
+        kind, text = self.take()
+        if kind == 'number':
+            return ('num', int(text) if text.isdigit() else float(text))
+        if kind == 'string':
+            return ('str', ast.literal_eval(text))
+        if kind == 'column':
+            return ('col', text[1:-1])
+        if kind == 'name':
+            if self.accept('op', '('):
+                if text not in QUERY_FUNCTIONS:
+                    raise ValueError(f"Unknown query function: {text}")
+                args = [self.sum()]
+                while self.accept('op', ','):
+                    args.append(self.sum())
+                self.take('op', ')')
+                return ('call', text, tuple(args))
+            if text in _CONSTANTS:
+                return ('num', _CONSTANTS[text])
+            return ('col', text)
+        if text == '(':
+            node = self.sum()
+            self.take('op', ')')
+            return node
+        raise ValueError(f"Invalid query {self.query!r}: unexpected {text!r}")
+
+
+def _binary(op, left, right):
+    if left[0] == 'str' or right[0] == 'str':
+        raise ValueError("Text literals cannot be used in arithmetic")
+    return ('bin', op, left, right)
+
+
+def _render(node, column=None):
+    """Canonical text of an expression node (`column` renames columns, e.g. for numexpr)."""
+    kind = node[0]
+    if kind == 'col':
+        if column is not None:
+            return column(node[1])
+        return node[1] if node[1].isidentifier() else f"`{node[1]}`"
+    if kind == 'num':
+        return repr(node[1])
+    if kind == 'str':
+        return repr(node[1])
+    if kind == 'neg':
+        return f"-{_render(node[1], column)}"
+    if kind == 'bin':
+        return f"({_render(node[2], column)} {node[1]} {_render(node[3], column)})"
+    return f"{node[1]}({', '.join(_render(arg, column) for arg in node[2])})"
+
+
+def _node_columns(node):
+    if node[0] == 'col':
+        return (node[1],)
+    if node[0] in ('num', 'str'):
+        return ()
+    children = node[2] if node[0] == 'call' else node[1:] if node[0] == 'neg' else node[2:]
+    return tuple(dict.fromkeys(column for child in children for column in _node_columns(child)))
+
+
+def _predicate(op, left, right):
+    if op in ('in', 'startswith'):
+        if left[0] != 'col':
+            raise ValueError(f"'{op}' applies to a column")
+        return Predicate('isin' if op == 'in' else 'startswith', (left[1],), right)
+
+    constant = ('num', 'str')
+    if left[0] == 'col' and right[0] in constant:
+        return Predicate(_COMPARISONS[op], (left[1],), right[1])
+    if right[0] == 'col' and left[0] in constant:
+        return Predicate(_COMPARISONS[_FLIPPED[op]], (right[1],), left[1])
+    if left[0] in constant and right[0] in constant:
+        raise ValueError("A condition must involve at least one column")
+    if 'str' in (left[0], right[0]):
+        raise ValueError("Text literals can only be compared with a column")
+
+    columns = tuple(dict.fromkeys(_node_columns(left) + _node_columns(right)))
+    return Predicate('expr', columns, (_render(left), op, _render(right)))
+
+
+@lru_cache(maxsize=1024)
+def _parse_query(query):
+    plan = []
+    for condition in _Parser(query).conditions():
+        plan.extend(_predicate(*comparison) for comparison in condition)
+    return tuple(plan)
+
+
+@lru_cache(maxsize=1024)
+def _parse_expression(text):
+    parser = _Parser(text)
+    node = parser.sum()
+    if parser.peek()[0] is not None:
+        raise ValueError(f"Invalid expression {text!r}")
+    return node
+
+
+def check_plan(plan, schema):
+    """
+    Check a plan against a table schema (a DataFrame, or a mapping of column
+    name -> dtype): every column must exist, numeric conditions need numeric
+    columns and `startswith` a text column.
+    """
+    dtypes = schema.dtypes if isinstance(schema, pd.DataFrame) else schema
+    missing = [c for c in plan_columns(plan) if c not in dtypes]
+    if missing:
+        raise KeyError(f"Unknown column(s) in filter: {', '.join(missing)}")
+
+    for predicate in plan:
+        numeric = [pd.api.types.is_numeric_dtype(dtypes[c]) or pd.api.types.is_bool_dtype(dtypes[c])
+                   for c in predicate.columns]
+        if predicate.op in ('gt', 'lt', 'ge', 'le', 'expr') and not all(numeric):
+            raise TypeError(f"Numeric condition on a text column: {predicate.columns}")
+        if predicate.op == 'startswith' and all(numeric):
+            raise TypeError(f"'startswith' on a numeric column: {predicate.columns[0]}")
+
+
+def compile_query(query, schema=None):
+    """
+    Parse a query string (see the grammar above) into a tuple of predicates,
+    checked against `schema` (see `check_plan()`) when given. Parsed plans
+    are cached, so a query is only parsed once.
+    """
+    plan = _parse_query(query.strip()) if query.strip() else ()
+    if schema is not None:
+        check_plan(plan, schema)
+    return plan
+
+
+
+
+# ------------------------ Mask kernels ------------------------
+def _column(df, column):
+    """Return a column as a NumPy array, without copying numeric data."""
+    values = df[column]
+    if values.dtype.kind in 'biuf':
+        return values.to_numpy()
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _eq(df, columns, value):
+    return (df[columns[0]] == value).to_numpy(dtype=bool, na_value=False)
+
+
+def _ne(df, columns, value):
+    # Missing values satisfy no condition, not even an inequality
+    values = df[columns[0]]
+    return (values.notna() & (values != value)).to_numpy(dtype=bool, na_value=False)
+
+
+def _isin(df, columns, value):
+    return df[columns[0]].isin(value).to_numpy(dtype=bool, na_value=False)
+
+
+def _startswith(df, columns, value):
+    values = df[columns[0]]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Test each category once; missing values (code -1) map to the trailing False
+        hits = values.cat.categories.astype(str).str.startswith(value)
+        return np.append(np.asarray(hits, dtype=bool), False)[values.cat.codes.to_numpy()]
+
+    hits = values.fillna('').str.startswith(value)
+    return hits.to_numpy(dtype=bool, na_value=False)
+
+
+def evaluate_expression(node, arrays):
+    """Evaluate an expression node on a dict of column arrays with NumPy."""
+    kind = node[0]
+    if kind == 'col':
+        return arrays[node[1]]
+    if kind == 'num':
+        return node[1]
+    if kind == 'neg':
+        return -evaluate_expression(node[1], arrays)
+    if kind == 'bin':
+        return _ARITHMETIC[node[1]](evaluate_expression(node[2], arrays), evaluate_expression(node[3], arrays))
+    return QUERY_FUNCTIONS[node[1]](*(evaluate_expression(arg, arrays) for arg in node[2]))
+
+
+def _numexpr_ready(*nodes):
+    # Only plain arithmetic and NaN-preserving functions go to numexpr
+    # (its `**` is slower than NumPy's)
+    def supported(node):
+        if node[0] == 'call':
+            return node[1] in NUMEXPR_FUNCTIONS and all(supported(arg) for arg in node[2])
+        if node[0] == 'bin':
+            return node[1] != '**' and supported(node[2]) and supported(node[3])
+        if node[0] == 'neg':
+            return supported(node[1])
+        return True
+    return numexpr is not None and all(supported(node) for node in nodes)
+
+
+def _expression(df, columns, value):
+    left, op, right = value
+    left, right = _parse_expression(left), _parse_expression(right)
+    arrays = {column: _column(df, column) for column in columns}
+
+    if len(df) >= NUMEXPR_MIN_ROWS and _numexpr_ready(left, right):
+        names = {column: f"c{i}" for i, column in enumerate(columns)}
+        source = f"{_render(left, names.get)} {op} {_render(right, names.get)}"
+        return numexpr.evaluate(source, local_dict={names[c]: a for c, a in arrays.items()})
+
+    with np.errstate(all='ignore'):
+        return _COMPARE[op](evaluate_expression(left, arrays), evaluate_expression(right, arrays))
+
+
+_KERNELS = {
+    'eq':         _eq,
+    'ne':         _ne,
+    'isin':       _isin,
+    'startswith': _startswith,
+    'gt':         lambda df, columns, value: _column(df, columns[0]) > value,
+    'lt':         lambda df, columns, value: _column(df, columns[0]) < value,
+    'ge':         lambda df, columns, value: _column(df, columns[0]) >= value,
+    'le':         lambda df, columns, value: _column(df, columns[0]) <= value,
+    'expr':       _expression,
+}
+
+# Relative cost of each kernel, used to evaluate cheap predicates first
+_COSTS = {'gt': 1, 'lt': 1, 'ge': 1, 'le': 1, 'eq': 2, 'ne': 2, 'isin': 3, 'startswith': 4, 'expr': 5}
+
+# Costly kernels, evaluated only on the rows left by the other predicates
+DERIVED_OPS = ('startswith', 'expr')
+
+# Derived predicates run on the surviving rows only below this fraction of the table
+SUBSET_FRACTION = 0.5
 
-    if rade_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_rade'] < rade_max]
 
-    if rade_err is not None:
-        mask = df_filtered['pl_rade'].notna() & df_filtered['pl_radeerr1'].notna() & df_filtered['pl_radeerr2'].notna()
-        err = df_filtered[['pl_radeerr1', 'pl_radeerr2']].max(axis=1)
-        snr = err / df_filtered['pl_rade']
-        df_filtered = df_filtered[mask & (snr < rade_err)]
+def order_plan(plan, df=None):
+    """
+    Plan in evaluation order. Without `df`, by increasing kernel cost; with
+    it, by cost / (1 - estimated selectivity) from the column statistics of
+    `df`, so cheap predicates that reject many rows run first.
+    """
+    if df is None:
+        return tuple(sorted(plan, key=lambda predicate: _COSTS[predicate.op]))
+
+    def rank(predicate):
+        rejected = 1 - estimate_selectivity(df, predicate)
+        return _COSTS[predicate.op] / rejected if rejected > 0 else np.inf
+
+    return tuple(sorted(plan, key=rank))
+
+
+def evaluate_predicate(df, predicate):
+    """Evaluate a single predicate as a boolean NumPy array aligned with `df`."""
+    return np.asarray(_KERNELS[predicate.op](df, predicate.columns, predicate.value), dtype=bool)
+
+
+def evaluate_plan(df, plan):
+    """
+    Combine the masks of every predicate in `plan` into one boolean array.
+
+    Range cuts on the columns of `indexes.INDEXED_COLUMNS` are answered by
+    sorted indexes. The other predicates run in the order of
+    `order_plan(plan, df)`, costly derived
+    ones only on the rows still selected, and evaluation stops as soon as no
+    row is left, or before starting when the column statistics prove that a
+    predicate keeps nothing. Without copy-on-write, as `scan_plan()`.
+    """
+    _require_columns(df, plan)
+    if not tracks_edits():
+        return scan_plan(df, plan)
+    mask = np.ones(len(df), dtype=bool)
+    if not plan:
+        return mask
+    if any(is_unsatisfiable(df, predicate) for predicate in plan):
+        return np.zeros(len(df), dtype=bool)
+
+    # Range cuts on indexed columns: slices of the sorted indexes
+    indexed = [predicate for predicate in plan if is_indexable(predicate)]
+    if indexed:
+        mask[:] = False
+        mask[range_rows(df, indexed)] = True
+        plan = [predicate for predicate in plan if predicate not in indexed]
+
+    return _combine_masks(df, order_plan(plan, df), mask)
+
+
+def _combine_masks(df, ordered, mask):
+    # AND the predicate masks into `mask`, derived predicates on the surviving rows only
+    for predicate in ordered:
+        if predicate.op in DERIVED_OPS:
+            rows = np.flatnonzero(mask)
+            if rows.size < SUBSET_FRACTION * len(df):
+                subset = df[list(predicate.columns)].take(rows)
+                mask[rows] = evaluate_predicate(subset, predicate)
+            else:
+                mask &= evaluate_predicate(df, predicate)
+        else:
+            mask &= evaluate_predicate(df, predicate)
+        if not mask.any():
+            break
+    return mask
+
 
-    if mass_min is not None:
-        df_filtered = df_filtered[df_filtered['pl_bmasse'] > mass_min]
+def scan_plan(df, plan):
+    """
+    `evaluate_plan()` without column statistics or sorted indexes, for frames
+    scanned only once (e.g. the row blocks of `utils.chunked`), where
+    building them would cost more than they save. Predicates run by kernel
+    cost.
+    """
+    return _combine_masks(df, order_plan(plan), np.ones(len(df), dtype=bool))
 
-    if mass_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_bmasse'] < mass_max]
 
-    if mass_err is not None:
-        mask = df_filtered['pl_bmasse'].notna() & df_filtered['pl_bmasseerr1'].notna() & df_filtered['pl_bmasseerr2'].notna()
-        err = df_filtered[['pl_bmasseerr1', 'pl_bmasseerr2']].max(axis=1)
-        snr = err / df_filtered['pl_bmasse']
-        df_filtered = df_filtered[mask & (snr < mass_err)]
+def filter_mask(df, **filters):
+    """Boolean row mask selected by `apply_filters()` keyword arguments."""
+    return evaluate_plan(df, compile_filters(**filters))
+
+
+def filter_index(df, **filters):
+    """Positional row indices selected by `apply_filters()` keyword arguments."""
+    return np.flatnonzero(filter_mask(df, **filters))
+
 
-    if density_min is not None:
-        df_filtered = df_filtered[df_filtered['pl_dens'] > density_min]
+def query_mask(df, query):
+    """Boolean row mask selected by a query string, checked against the columns of `df`."""
+    return evaluate_plan(df, compile_query(query, df))
 
-    if density_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_dens'] < density_max]
 
-    if eccentricity_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_orbeccen'] < eccentricity_max]
 
-    if transit_depth_min is not None:
-        df_filtered = df_filtered[df_filtered['pl_trandep'] > transit_depth_min]
 
-    if transit_depth_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_trandep'] < transit_depth_max]
+# ------------------------ Batch evaluation ------------------------
+def batch_filter_masks(df, configurations, as_index=False):
+    """
+    Evaluate many named filter configurations in one pass over `df`.
 
-    if eqt_min is not None:
-        df_filtered = df_filtered[df_filtered['pl_eqt'] > eqt_min]
+    `configurations` maps a name to a dict of `apply_filters()` keyword
+    arguments. Each distinct predicate is evaluated once and shared by every
+    configuration using it. Returns a DataFrame of boolean columns aligned
+    with `df`, or a dict of positional index arrays when `as_index` is True.
+    """
+    predicate_masks = {}
+    results = {}
 
-    if eqt_max is not None:
-        df_filtered = df_filtered[df_filtered['pl_eqt'] < eqt_max]
+    for name, filters in configurations.items():
+        plan = compile_filters(**filters)
+        _require_columns(df, plan)
+        mask = np.ones(len(df), dtype=bool)
+        for predicate in plan:
+            if predicate not in predicate_masks:
+                predicate_masks[predicate] = evaluate_predicate(df, predicate)
+            mask &= predicate_masks[predicate]
+        results[name] = np.flatnonzero(mask) if as_index else mask
+
+    if as_index:
+        return results
+    return pd.DataFrame(results, index=df.index)
+
+
+
+
+# ------------------------ Entry point ------------------------
+def apply_filters(
+    df,
 
-    if P is not None:
-        df_filtered = df_filtered[df_filtered['pl_orbper'] < P]
+    # Discovery filters
+    mission=None, date_min=None, date_max=None,
+    kp=None, discovery_method=None,
 
-    if b is not None:
-        df_filtered = df_filtered[df_filtered['pl_imppar'] < b]
+    # Stellar filters
+    st_type=None,
+    Teff_min=None, Teff_max=None,
+    metallicity_min=None, metallicity_max=None,
+    age_min=None, age_max=None,
+    stellar_radius_err_max=None,
+    Fulton_2017=False,
 
+    # Planetary filters
+    rade_min=None, rade_max=None, rade_err=None,
+    mass_min=None, mass_max=None, mass_err=None,
+    density_min=None, density_max=None,
+    eccentricity_max=None,
+    transit_depth_min=None, transit_depth_max=None,
+    eqt_min=None, eqt_max=None,
+    P=None, b=None,
 
+    # System filters
+    multiplicity_min=None, multiplicity_max=None
+    ):
 
-    # ------------------------ System filters ------------------------
-    if multiplicity_min is not None:
-        df_filtered = df_filtered[df_filtered['sy_pnum'] >= multiplicity_min]
 
-    if multiplicity_max is not None:
-        df_filtered = df_filtered[df_filtered['sy_pnum'] <= multiplicity_max]
+    """Apply a combination of filters to an exoplanet dataset."""
+    filters = {key: value for key, value in locals().items() if key != 'df'}
 
-    return df_filtered
+    return df[filter_mask(df, **filters)]
 
 
+def apply_query(df, query):
+    """Select the rows of `df` matching a query string, e.g. "st_teff between 4700 6500 and pl_rade < 4"."""
+    return df[query_mask(df, query)]
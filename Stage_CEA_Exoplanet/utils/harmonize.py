@@ -0,0 +1,305 @@
+"""
+Catalog Harmonisation Module
+------------------------------------------------
+This module maps the planet catalogs of `Dataset/` (the NEA composite table,
+exoplanet.eu and the `planets.vot` VOTable) onto one canonical schema, so
+that `filters.apply_filters` and the presets run on any of them, or on
+their union, without per-catalog code.
+
+The canonical schema uses the NEA column names and units: masses and radii
+in Earth units (exoplanet.eu and the VOTable quote Jupiter units), upper
+errors positive and lower errors negative (`*err1` / `*err2`). Columns a
+source does not provide are present and empty. A `catalog` column records
+the source of each row.
+
+Sources are read in chunks (`iter_source()`), projected on the columns the
+schema needs. `load_harmonized()` merges them in priority order (NEA first):
+a planet already present in a higher priority catalog, by normalised name or
+by host position within `tolerance_arcsec` plus planet letter or period
+(see `utils.crossmatch`), is dropped. The merged table is persisted in the
+columnar catalog cache, keyed by the content of its sources, and is only
+rebuilt when one of them changes. The last `MERGED_CACHE_SIZE` merged tables
+are also kept in memory, each checked against the size and modification
+time of its sources (and their content hash when those changed).
+
+Usage:
+    union = load_harmonized()
+    eu = load_source("exoplanet_eu")
+    m_dwarfs = presets.M_type(union)
+    sample = apply_filters(load_harmonized(columns=required_columns(st_type="M")), st_type="M")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils.crossmatch import DEFAULT_TOLERANCE_ARCSEC, match_positions, normalize_names, planet_letters, same_planet, unit_vectors
+from utils.datasets import READ_OPTIONS, DEFAULT_READ_OPTIONS, VOTABLE_SUFFIXES, catalog_fingerprint, load_table, resolve_dataset_path, store_table
+from utils.votable import iter_votable
+
+
+# ------------------------ CONFIGURATION ------------------------
+HARMONIZE_VERSION = 1
+
+MJUP_TO_MEARTH = 317.828
+RJUP_TO_REARTH = 11.209
+
+CHUNK_ROWS = 50_000
+
+TEXT_COLUMNS = ('pl_name', 'hostname', 'discoverymethod', 'disc_facility', 'st_spectype')
+
+CANONICAL_COLUMNS = (
+    'pl_name', 'hostname', 'sy_snum', 'sy_pnum', 'discoverymethod', 'disc_year', 'disc_facility',
+    'pl_orbper', 'pl_orbpererr1', 'pl_orbpererr2',
+    'pl_orbsmax', 'pl_orbsmaxerr1', 'pl_orbsmaxerr2',
+    'pl_rade', 'pl_radeerr1', 'pl_radeerr2',
+    'pl_bmasse', 'pl_bmasseerr1', 'pl_bmasseerr2',
+    'pl_dens', 'pl_denserr1', 'pl_denserr2',
+    'pl_orbeccen', 'pl_orbeccenerr1', 'pl_orbeccenerr2',
+    'pl_insol', 'pl_eqt', 'pl_eqterr1', 'pl_eqterr2',
+    'pl_imppar', 'pl_trandep',
+    'st_spectype', 'st_teff', 'st_tefferr1', 'st_tefferr2',
+    'st_rad', 'st_raderr1', 'st_raderr2',
+    'st_mass', 'st_masserr1', 'st_masserr2',
+    'st_met', 'st_meterr1', 'st_meterr2',
+    'st_logg', 'st_age',
+    'ra', 'dec', 'sy_dist', 'sy_vmag', 'sy_kmag', 'sy_kepmag',
+)
+
+
+
+
+# ------------------------ SOURCE SCHEMAS ------------------------
+def _eu(canonical, column, scale=1.0):
+    # exoplanet.eu: `x`, `x_error_max`, `x_error_min` (both errors positive)
+    return {canonical: (column, scale),
+            f"{canonical}err1": (f"{column}_error_max", scale),
+            f"{canonical}err2": (f"{column}_error_min", scale)}
+
+
+def _vot(canonical, label, unit='', scale=1.0):
+    # VOTable: "Label [unit]", "Label - Upper Unc [unit]", "Label - Lower Unc [unit]"
+    unit = f" [{unit}]" if unit else ''
+    return {canonical: (f"{label}{unit}", scale),
+            f"{canonical}err1": (f"{label} - Upper Unc{unit}", scale),
+            f"{canonical}err2": (f"{label} - Lower Unc{unit}", scale)}
+
+
+EU_COLUMNS = {
+    'pl_name': ('name', None), 'hostname': ('star_name', None),
+    'discoverymethod': ('detection_type', None), 'disc_year': ('discovered', 1.0),
+    **_eu('pl_orbper', 'orbital_period'), **_eu('pl_orbsmax', 'semi_major_axis'),
+    **_eu('pl_rade', 'radius', RJUP_TO_REARTH), **_eu('pl_bmasse', 'mass', MJUP_TO_MEARTH),
+    **_eu('pl_orbeccen', 'eccentricity'), **_eu('pl_eqt', 'temp_calculated'),
+    'pl_imppar': ('impact_parameter', 1.0),
+    'st_spectype': ('star_sp_type', None),
+    **_eu('st_teff', 'star_teff'), **_eu('st_rad', 'star_radius'),
+    **_eu('st_mass', 'star_mass'), **_eu('st_met', 'star_metallicity'),
+    'st_age': ('star_age', 1.0),
+    'ra': ('ra', 1.0), 'dec': ('dec', 1.0), 'sy_dist': ('star_distance', 1.0),
+    'sy_vmag': ('mag_v', 1.0), 'sy_kmag': ('mag_k', 1.0),
+}
+
+VOT_COLUMNS = {
+    'pl_name': ('Planet Name', None), 'hostname': ('Host Name', None),
+    'sy_snum': ('Number of stars', 1.0), 'sy_pnum': ('Number of planets', 1.0),
+    'discoverymethod': ('Discovery Method', None), 'disc_year': ('Discovery Year', 1.0),
+    'disc_facility': ('Discovery Facility', None),
+    **_vot('pl_orbper', 'Orbital Period', 'days'), **_vot('pl_orbsmax', 'Orbit Semi-Major axis', 'au'),
+    **_vot('pl_rade', 'Planet Radius', 'Rjup', RJUP_TO_REARTH),
+    **_vot('pl_bmasse', 'Planet Mass', 'Mjup', MJUP_TO_MEARTH),
+    'pl_dens': ('Planet Density [g/cm**3] - Computation', 1.0),
+    'pl_denserr1': ('Planet Density - Upper Unc [g/cm**3] - Computation', 1.0),
+    'pl_denserr2': ('Planet Density - Lower Unc [g/cm**3] - Computation', 1.0),
+    **_vot('pl_orbeccen', 'Eccentricity'),
+    'pl_insol': ('Insolation Flux [Earth Flux]', 1.0),
+    **_vot('pl_eqt', 'Equilibrium Temperature', 'K'),
+    'pl_imppar': ('Impact parameter', 1.0), 'pl_trandep': ('Transit Depth [%]', 1.0),
+    'st_spectype': ('Spectral Type', None),
+    **_vot('st_teff', 'Stellar Effective Temperature', 'K'), **_vot('st_rad', 'Stellar Radius', 'Rsun'),
+    **_vot('st_mass', 'Stellar Mass', 'Msun'), **_vot('st_met', 'Stellar Metallicity', 'dex'),
+    'st_logg': ('Stellar Surface Gravity [log(cm/s**2)]', 1.0), 'st_age': ('Stellar Age [Gyr]', 1.0),
+    'ra': ('Right Ascension [deg]', 1.0), 'dec': ('Declinaison [deg]', 1.0),
+    'sy_dist': ('Distance [pc]', 1.0), 'sy_vmag': ('V Mag', 1.0), 'sy_kmag': ('K Mag', 1.0),
+}
+
+# exoplanet.eu detection types -> NEA discovery methods (first listed method only)
+EU_DISCOVERY_METHODS = {
+    'Primary Transit': 'Transit',
+    'TTV': 'Transit Timing Variations',
+    'Kinematic': 'Disk Kinematics',
+}
+
+SOURCES = {
+    'nea':          dict(file="NEA_planetary_systems_composite.csv",
+                         columns={c: (c, None if c in TEXT_COLUMNS else 1.0) for c in CANONICAL_COLUMNS}),
+    'votable':      dict(file="planets.vot", columns=VOT_COLUMNS),
+    'exoplanet_eu': dict(file="Exoplaneteu.csv", columns=EU_COLUMNS, methods=EU_DISCOVERY_METHODS),
+}
+
+# Merge order: a planet is kept from the first catalog that lists it
+SOURCE_PRIORITY = ('nea', 'votable', 'exoplanet_eu')
+
+# Merged tables kept in memory (least recently used dropped first)
+MERGED_CACHE_SIZE = 8
+
+_merged = OrderedDict()     # (sources, tolerance, columns) -> (source stats, merge key, DataFrame)
+
+
+
+
+# ------------------------ HARMONISATION ------------------------
+def _text(values, methods=None):
+    values = values.astype(object).where(values.notna(), np.nan).str.strip()
+    if methods is not None:
+        values = values.str.split(',').str[0].str.strip()
+        values = values.map(lambda v: methods.get(v, v) if isinstance(v, str) else v)
+    return values
+
+
+def harmonize(df, source):
+    """Map a raw table of `source` (a key of `SOURCES`) onto the canonical schema."""
+    schema = SOURCES[source]
+    n = len(df)
+    data = {}
+    for canonical in CANONICAL_COLUMNS:
+        column, scale = schema['columns'].get(canonical, (None, None))
+        if column is None or column not in df:
+            data[canonical] = pd.Series(np.nan, index=range(n), dtype=object if canonical in TEXT_COLUMNS else float)
+        elif canonical in TEXT_COLUMNS:
+            methods = schema.get('methods') if canonical == 'discoverymethod' else None
+            data[canonical] = _text(df[column], methods).reset_index(drop=True)
+        else:
+            values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float) * scale
+            data[canonical] = -np.abs(values) if canonical.endswith('err2') else values
+
+    data['catalog'] = np.full(n, source, dtype=object)
+    return pd.DataFrame(data)
+
+
+def _source_columns(source):
+    return list(dict.fromkeys(column for column, _ in SOURCES[source]['columns'].values()))
+
+
+def iter_source(source, chunksize=CHUNK_ROWS):
+    """Yield the harmonised rows of a source catalog in chunks of at most `chunksize` rows."""
+    path = resolve_dataset_path(SOURCES[source]['file'])
+    wanted = set(_source_columns(source))
+
+    if path.suffix.lower() in VOTABLE_SUFFIXES:
+        for chunk in iter_votable(path, columns=_source_columns(source), chunksize=chunksize):
+            yield harmonize(chunk, source)
+        return
+
+    options = READ_OPTIONS.get(path.name, DEFAULT_READ_OPTIONS)
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=lambda c: c.strip() in wanted, **options):
+        chunk.columns = chunk.columns.str.strip()
+        yield harmonize(chunk, source)
+
+
+def load_source(source, chunksize=CHUNK_ROWS):
+    """One source catalog, harmonised."""
+    return pd.concat(iter_source(source, chunksize), ignore_index=True).infer_objects()
+
+
+
+
+# ------------------------ MERGING ------------------------
+def _float_column(df, column):
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def duplicate_rows(kept, candidates, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """
+    Boolean array: whether each planet of `candidates` is already in `kept`,
+    by normalised name, or by host position plus planet letter or period.
+    """
+    kept_names = normalize_names(kept['pl_name'])
+    names = normalize_names(candidates['pl_name'])
+    duplicate = np.array(names.isin(set(kept_names.dropna())))
+
+    ra, dec = _float_column(kept, 'ra'), _float_column(kept, 'dec')
+    located = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+    tree = cKDTree(unit_vectors(ra[located], dec[located]))
+
+    rows = np.flatnonzero(~duplicate)
+    i, j = match_positions(tree, _float_column(candidates, 'ra')[rows],
+                           _float_column(candidates, 'dec')[rows], tolerance_arcsec)
+    rows, matches = rows[i], located[j]
+
+    same = same_planet(planet_letters(names).to_numpy()[rows], planet_letters(kept_names).to_numpy()[matches],
+                       _float_column(candidates, 'pl_orbper')[rows], _float_column(kept, 'pl_orbper')[matches])
+    duplicate[rows[same]] = True
+    return duplicate
+
+
+def merge_catalogs(tables, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """Union of harmonised tables given in priority order, without cross-catalog duplicates."""
+    merged = None
+    for table in tables:
+        if merged is None:
+            merged = table.reset_index(drop=True)
+            continue
+        new = table[~duplicate_rows(merged, table, tolerance_arcsec)]
+        merged = pd.concat([merged, new], ignore_index=True)
+    # Same column dtypes as the CSV loaders (and as the cached copy read back)
+    return merged.infer_objects()
+
+
+def _source_stats(sources):
+    stats = [resolve_dataset_path(SOURCES[s]['file']).stat() for s in sources]
+    return tuple((stat.st_size, stat.st_mtime_ns) for stat in stats)
+
+
+def _remember(memo, stats, key, df):
+    _merged[memo] = (stats, key, df)
+    _merged.move_to_end(memo)
+    while len(_merged) > MERGED_CACHE_SIZE:
+        _merged.popitem(last=False)
+    return df
+
+
+def _merge_key(sources, tolerance_arcsec):
+    inputs = [HARMONIZE_VERSION, list(sources), tolerance_arcsec,
+              [catalog_fingerprint(resolve_dataset_path(SOURCES[s]['file'])) for s in sources]]
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+
+def load_harmonized(sources=SOURCE_PRIORITY, columns=None, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC, use_cache=True):
+    """
+    The merged, de-duplicated union of `sources` (in priority order) on the
+    canonical schema, optionally restricted to `columns`. Read from the
+    columnar cache when none of the sources changed since it was built.
+    """
+    sources = tuple(sources)
+    columns = list(dict.fromkeys(columns)) if columns is not None else None
+    memo = (sources, tolerance_arcsec, tuple(columns) if columns is not None else None)
+    stats = _source_stats(sources)
+    cached = _merged.get(memo) if use_cache else None
+    if cached is not None and cached[0] == stats:
+        return _remember(memo, stats, cached[1], cached[2])
+
+    key = _merge_key(sources, tolerance_arcsec)
+    if cached is not None and cached[1] == key:
+        # Sources touched but unchanged
+        return _remember(memo, stats, key, cached[2])
+
+    name = "harmonized_" + "_".join(sources)
+    df = load_table(name, key, columns) if use_cache else None
+    if df is None:
+        df = merge_catalogs((load_source(source) for source in sources), tolerance_arcsec)
+        if use_cache:
+            store_table(name, key, df)
+        if columns is not None:
+            df = df[columns]
+
+    if use_cache:
+        _remember(memo, stats, key, df)
+    return df
@@ -0,0 +1,257 @@
+"""
+Sorted Range Index Module
+------------------------------------------------
+This module keeps, for the numeric columns most often cut by range
+(`INDEXED_COLUMNS`), a sorted index of a catalog: the row positions of the
+non-missing values ordered by value (`argsort`), and the values in that
+order. A range cut such as `Teff_min`/`Teff_max` then becomes two
+`searchsorted` calls and a slice of positions, and cuts on several columns
+an intersection of those slices.
+
+Indexes are built on first use, once per column of a given DataFrame
+object, and rebuilt when the column is edited in place or reassigned (they
+are checked against `statistics.column_version()` on every use). Without
+pandas copy-on-write such edits cannot be detected cheaply: indexes are then
+built per call and never cached, and `filters.evaluate_plan()` does not use
+them (a plain mask is cheaper than a sort). Missing values are never
+selected, and bounds keep the exact semantics of the mask kernels of
+`utils.filters` (strict `>`/`<` for the keyword filters, same dtype
+promotion), so both paths select the same rows.
+
+Many cuts at once go through `batch_range_rows()`, and `grid_counts()`
+counts the rows of a whole grid of cuts (e.g. 100 x 100 radius / period
+thresholds) in milliseconds without materialising the selections.
+
+Usage:
+    rows = range_rows(df, compile_filters(rade_min=1, rade_max=4, P=10))
+    counts = grid_counts(df, [("pl_rade", "gt", radii), ("pl_orbper", "lt", periods)])
+    order, values, rank = sorted_column(df, "pl_rade")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numbers
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+from utils.statistics import column_version
+
+
+# ------------------------ CONFIGURATION ------------------------
+# Columns range cuts go through a sorted index for; () disables the indexes
+INDEXED_COLUMNS = ('st_teff', 'pl_rade', 'pl_bmasse', 'pl_orbper', 'pl_eqt', 'disc_year')
+
+RANGE_OPS = ('gt', 'ge', 'lt', 'le')
+
+# `order`: row positions of the non-missing values by increasing value;
+# `values`: the column values in that order; `rank`: position of each row
+# in `order` (-1 for missing values)
+SortedColumn = namedtuple("SortedColumn", ["order", "values", "rank"])
+
+_indexes = {}   # id(DataFrame) -> {column: (version, column Series, SortedColumn)}
+
+
+
+
+# ------------------------ INDEXES ------------------------
+def _values(values):
+    # Same conversion as the filter kernels: numeric columns as they are
+    if values.dtype.kind in 'biuf':
+        return values.to_numpy()
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def sorted_column(df, column):
+    """Sorted index of one column of `df`, built on first use and after each change of the column."""
+    key = id(df)
+    if key not in _indexes:
+        _indexes[key] = {}
+        weakref.finalize(df, _indexes.pop, key, None)
+
+    columns, series = _indexes[key], df[column]
+    version = column_version(series)
+    if version is None or column not in columns or columns[column][0] != version:
+        values = _values(series)
+        order = np.argsort(values, kind='stable')
+        if values.dtype.kind == 'f':
+            # NaN sort last: keep only the present values
+            order = order[:np.count_nonzero(~np.isnan(values))]
+        rank = np.full(len(values), -1, dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        index = SortedColumn(order, values[order], rank)
+        for array in index:
+            array.setflags(write=False)
+        if version is None:
+            return index
+        columns[column] = (version, series, index)
+    return columns[column][2]
+
+
+def forget_indexes(df):
+    """Drop the cached sorted indexes of a frame, to free them."""
+    _indexes.pop(id(df), None)
+
+
+def is_indexable(predicate):
+    """Whether a filter predicate can be answered by a sorted index."""
+    value = predicate.value
+    return (predicate.op in RANGE_OPS and predicate.columns[0] in INDEXED_COLUMNS
+            and isinstance(value, numbers.Real) and not isinstance(value, bool))
+
+
+
+
+# ------------------------ RANGE QUERIES ------------------------
+_TESTS = {
+    'gt': lambda v, t: v > t,
+    'ge': lambda v, t: v >= t,
+    'lt': lambda v, t: v < t,
+    'le': lambda v, t: v <= t,
+}
+
+
+def _boundary(values, op, value):
+    """
+    First sorted position where `values <op> value` switches (to True for
+    gt/ge, to False for lt/le), exactly as the element-wise comparison.
+    """
+    if np.isnan(value):
+        # Nothing compares with NaN: empty selection
+        return len(values) if op in ('gt', 'ge') else 0
+
+    test = _TESTS[op]
+    lower = op in ('gt', 'ge')
+    n = len(values)
+    k = int(np.searchsorted(values, value, side='right' if op in ('gt', 'le') else 'left'))
+
+    # Adjust for dtype promotion (e.g. float32 columns against float thresholds)
+    while k > 0 and bool(test(values[k - 1], value)) == lower:
+        k -= 1
+    while k < n and bool(test(values[k], value)) != lower:
+        k += 1
+    return k
+
+
+def _boundaries(values, op, thresholds):
+    # Vectorised `_boundary` for many thresholds; rare promotion mismatches fall back to it
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    k = np.searchsorted(values, thresholds, side='right' if op in ('gt', 'le') else 'left')
+    test, n = _TESTS[op], len(values)
+    lower = op in ('gt', 'ge')
+    with np.errstate(invalid='ignore'):
+        before = (k > 0) & (test(values[np.maximum(k - 1, 0)], thresholds) == lower)
+        after = (k < n) & (test(values[np.minimum(k, n - 1)], thresholds) != lower)
+    for i in np.flatnonzero(before | after | np.isnan(thresholds)):
+        k[i] = _boundary(values, op, thresholds[i])
+    return k
+
+
+def _combine(df, bounds):
+    # bounds: {column: (start, stop)} -> sorted rows inside every range
+    if not bounds:
+        return np.arange(len(df))
+
+    indexes = {column: sorted_column(df, column) for column in bounds}
+    narrowest = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0])
+    start, stop = bounds[narrowest]
+    rows = indexes[narrowest].order[start:max(start, stop)]
+    for column, (start, stop) in bounds.items():
+        if column != narrowest and rows.size:
+            rank = indexes[column].rank[rows]
+            rows = rows[(rank >= start) & (rank < stop)]
+    return np.sort(rows)
+
+
+def _bounds(lengths, boundaries):
+    # [(column, op, boundary)] -> {column: (start, stop)}
+    bounds = {}
+    for column, op, k in boundaries:
+        start, stop = bounds.get(column, (0, lengths[column]))
+        bounds[column] = (max(start, k), stop) if op in ('gt', 'ge') else (start, min(stop, k))
+    return bounds
+
+
+def range_rows(df, predicates):
+    """Sorted row positions of `df` satisfying every (indexable) range predicate."""
+    boundaries, lengths = [], {}
+    for predicate in predicates:
+        column = predicate.columns[0]
+        values = sorted_column(df, column).values
+        lengths[column] = len(values)
+        boundaries.append((column, predicate.op, _boundary(values, predicate.op, predicate.value)))
+    return _combine(df, _bounds(lengths, boundaries))
+
+
+def batch_range_rows(df, plans):
+    """
+    `range_rows()` for many predicate lists at once (e.g. a grid of cuts):
+    the boundaries of all distinct thresholds of a column are found with one
+    vectorised `searchsorted`. Returns one sorted row array per plan.
+    """
+    thresholds = {}
+    for plan in plans:
+        for predicate in plan:
+            thresholds.setdefault((predicate.columns[0], predicate.op), set()).add(predicate.value)
+
+    found, lengths = {}, {}
+    for (column, op), values in thresholds.items():
+        values = sorted(values, key=float)
+        index_values = sorted_column(df, column).values
+        lengths[column] = len(index_values)
+        for value, k in zip(values, _boundaries(index_values, op, values)):
+            found[column, op, value] = int(k)
+
+    return [_combine(df, _bounds(lengths, [(p.columns[0], p.op, found[p.columns[0], p.op, p.value]) for p in plan]))
+            for plan in plans]
+
+
+
+def grid_counts(df, axes, predicates=()):
+    """
+    Number of rows selected on every point of a grid of range cuts, without
+    materialising the selections.
+
+    `axes` lists (column, op, thresholds) for the varying cuts and
+    `predicates` the fixed (indexable) ones; returns an integer array of
+    shape `(len(thresholds) for each axis)`. The boundaries of each axis are
+    found with one vectorised `searchsorted`; the last axis is then counted
+    for all its thresholds at once on the sorted ranks of the rows selected
+    by the other cuts, so a 100 x 100 grid costs about 100 small sorts.
+    """
+    lengths, fixed = {}, []
+    for predicate in predicates:
+        column = predicate.columns[0]
+        values = sorted_column(df, column).values
+        lengths[column] = len(values)
+        fixed.append((column, predicate.op, _boundary(values, predicate.op, predicate.value)))
+
+    boundaries = []
+    for column, op, thresholds in axes:
+        values = sorted_column(df, column).values
+        lengths[column] = len(values)
+        boundaries.append(_boundaries(values, op, np.atleast_1d(thresholds)))
+
+    shape = tuple(len(k) for k in boundaries)
+    counts = np.zeros(shape, dtype=np.intp)
+    if not axes:
+        return counts + len(_combine(df, _bounds(lengths, fixed)))
+
+    swept_column, swept_op, _ = axes[-1]
+    rank = sorted_column(df, swept_column).rank
+    swept = boundaries[-1]
+
+    for point in np.ndindex(*shape[:-1]):
+        cuts = fixed + [(column, op, boundaries[axis][i]) for axis, ((column, op, _), i) in enumerate(zip(axes, point))]
+        bounds = _bounds(lengths, cuts)
+        ranks = np.sort(rank[_combine(df, bounds)])
+        ranks = ranks[np.searchsorted(ranks, 0):]       # rows missing the swept column
+        start, stop = bounds.get(swept_column, (0, lengths[swept_column]))
+        if swept_op in ('gt', 'ge'):
+            low, high = np.maximum(swept, start), np.full(len(swept), stop)
+        else:
+            low, high = np.full(len(swept), start), np.minimum(swept, stop)
+        counts[point] = np.maximum(np.searchsorted(ranks, high) - np.searchsorted(ranks, low), 0)
+    return counts
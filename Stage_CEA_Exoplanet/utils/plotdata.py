@@ -0,0 +1,139 @@
+"""
+Plot Data Module
+------------------------------------------------
+This module prepares the arrays drawn by `utils.plots` without touching the
+plotted DataFrame: each needed column is pulled once as a contiguous,
+read-only float64 NumPy array (a view of the frame's own data when it is
+already stored that way), and derived quantities (density ratio,
+composition category and its color, JWST flags) are computed from those
+arrays instead of being written back as new columns. The density ratio comes
+from `pl_dens`, or from mass and radius on catalogs without densities.
+
+Arrays are cached per DataFrame object, so every plot of a figure batch
+drawn from the same sample shares them, and subsets such as the JWST planets
+are taken by indexing the arrays rather than re-slicing the frame. Each array
+is kept with the `statistics.column_version()` of the columns it comes from
+and recomputed when one of them is edited in place or reassigned (without
+pandas copy-on-write, where such edits cannot be detected cheaply, arrays
+are recomputed on every call).
+
+Usage:
+    mass, ratio = plot_arrays(df_filtered, "pl_bmasse", "density_ratio")
+    is_jwst = jwst_flags(df_filtered, df_JWST)
+    ax.scatter(mass[is_jwst], ratio[is_jwst])
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import dataset_fingerprint
+from utils.classification import catalog_density_ratio, category_colors, classify_planets
+from utils.crossmatch import PLANET_COLUMNS, observed_by_jwst
+from utils.statistics import column_version
+
+
+# ------------------------ CONFIGURATION ------------------------
+_arrays = {}    # id(DataFrame) -> {name: (column versions, column Series, read-only array)}
+
+
+
+
+# ------------------------ COLUMNS ------------------------
+def _column(df, column):
+    # Float64 columns come out as views of the frame's data; others are converted once
+    values = df[column]
+    if values.dtype == np.float64:
+        array = values.to_numpy()
+    elif values.dtype.kind in 'biuf':
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        array = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.ascontiguousarray(array)
+
+
+def _density_ratio(df):
+    # From pl_dens, or from mass and radius for catalogs without it
+    return catalog_density_ratio(df)
+
+
+def _category(df):
+    return classify_planets(plot_array(df, 'pl_bmasse'), plot_array(df, 'density_ratio'))
+
+
+def _color(df):
+    return category_colors(plot_array(df, 'category'))
+
+
+def _density_columns(df):
+    return ('pl_dens',) if 'pl_dens' in df else ('pl_bmasse', 'pl_rade')
+
+
+def _category_columns(df):
+    return ('pl_bmasse', *_density_columns(df))
+
+
+# Quantities derived from the columns: name -> function(df)
+DERIVED_ARRAYS = {
+    'density_ratio': _density_ratio,
+    'category': _category,
+    'color': _color,
+}
+
+# Columns each derived quantity is computed from: name -> function(df)
+DERIVED_COLUMNS = {
+    'density_ratio': _density_columns,
+    'category': _category_columns,
+    'color': _category_columns,
+}
+
+
+def _frame_arrays(df):
+    key = id(df)
+    if key not in _arrays:
+        _arrays[key] = {}
+        weakref.finalize(df, _arrays.pop, key, None)
+    return _arrays[key]
+
+
+def _remember(df, name, columns, compute):
+    # `compute()` once per frame, and again after an edit of one of `columns`
+    arrays = _frame_arrays(df)
+    series = tuple(df[column] for column in columns)
+    versions = tuple(column_version(values) for values in series)
+    if name in arrays and arrays[name][0] == versions and None not in versions:
+        return arrays[name][2]
+
+    # Read-only view: never copies, and the frame's data cannot be changed through it
+    array = np.asarray(compute()).view()
+    array.setflags(write=False)
+    if None not in versions:
+        arrays[name] = (versions, series, array)
+    return array
+
+
+def plot_array(df, name):
+    """A column or derived quantity of `df` as a read-only array, computed once per frame."""
+    if name in DERIVED_ARRAYS:
+        return _remember(df, name, DERIVED_COLUMNS[name](df), lambda: DERIVED_ARRAYS[name](df))
+    return _remember(df, name, (name,), lambda: _column(df, name))
+
+
+def plot_arrays(df, *names):
+    """Several `plot_array()`s at once, as a tuple."""
+    return tuple(plot_array(df, name) for name in names)
+
+
+def jwst_flags(df, df_JWST):
+    """Boolean array: whether each planet of `df` was observed by JWST (cached per frame)."""
+    return _remember(df, ('observed_by_jwst', dataset_fingerprint(df_JWST)),
+                     [c for c in PLANET_COLUMNS if c in df], lambda: observed_by_jwst(df, df_JWST))
+
+
+def forget_plot_arrays(df):
+    """Drop the cached plot arrays of a frame, to free them."""
+    _arrays.pop(id(df), None)
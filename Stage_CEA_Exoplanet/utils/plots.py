@@ -1,16 +1,21 @@
 # Required libraries
+import hashlib
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.ticker import ScalarFormatter
 from IPython.display import display, HTML
 import numpy as np
-from scipy.interpolate import CubicSpline
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 from scipy.stats import norm
 import matplotlib.colors as mcolors
-from scipy.stats import linregress
+from utils.classification import CATEGORY_COLORS, CATEGORY_LABELS
+from utils.composition import model_curve
+from utils.crossmatch import observed_by_jwst
+from utils.plotdata import plot_arrays, jwst_flags
+from utils.regression import cached_line_fit, fit_lines, is_fitted, predict
+from matplotlib.colors import LogNorm
 
 # ------------------------------------------------------------------------------
 # Utility function to display a DataFrame in a scrollable table format.
@@ -31,23 +36,155 @@ def display_table(df):
 
 
 
+# ------------------------------------------------------------------------------
+# Plot functions show their figure interactively. When SHOW_FIGURES is False
+# (headless batch rendering, see utils.render) they return it instead.
+# ------------------------------------------------------------------------------
+SHOW_FIGURES = True
+
+def show_figure(fig):
+    fig.tight_layout()
+    if not SHOW_FIGURES:
+        return fig
+    plt.show()
+
+
+
+
+# ------------------------------------------------------------------------------
+# Density raster mode: scatter layers with more than DENSITY_THRESHOLD points
+# (merged catalogs, Monte-Carlo realisations) are pre-binned with NumPy on a
+# grid that is log-spaced along log axes, and drawn as a single image.
+# Only the highlighted subsets keep individual markers. Grids computed from
+# a full catalog are cached per dataset.
+# ------------------------------------------------------------------------------
+DENSITY_THRESHOLD = 50_000
+DENSITY_BINS = 200
+
+_DENSITY_CACHE_SIZE = 32
+_density_grids = {}
+
+def use_density(df, threshold=None):
+    # Whether a layer of len(df) points is drawn as a density image
+    return len(df) > (DENSITY_THRESHOLD if threshold is None else threshold)
+
+def _bin_edges(values, bins, log):
+    low, high = values.min(), values.max()
+    if low == high:
+        low, high = (low / 2, high * 2) if log else (low - 0.5, high + 0.5)
+    if log:
+        return np.logspace(np.log10(low), np.log10(high), bins + 1)
+    return np.linspace(low, high, bins + 1)
+
+def density_grid(x, y, bins=DENSITY_BINS, log_x=False, log_y=False, weights=None):
+    # 2D histogram of (x, y): counts, or the mean of `weights` in each cell.
+    # Returns (grid, x_edges, y_edges), or None when there is nothing to bin.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if log_x:
+        keep &= x > 0
+    if log_y:
+        keep &= y > 0
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        keep &= np.isfinite(weights)
+    if not keep.any():
+        return None
+
+    x, y = x[keep], y[keep]
+    edges = (_bin_edges(x, bins, log_x), _bin_edges(y, bins, log_y))
+    counts, _, _ = np.histogram2d(x, y, bins=edges)
+    if weights is None:
+        return counts, *edges
+
+    sums, _, _ = np.histogram2d(x, y, bins=edges, weights=weights[keep])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts, *edges
+
+def _columns_hash(df, columns):
+    # Content hash of the binned columns only (not of the whole frame)
+    digest = hashlib.sha1()
+    for column in columns:
+        digest.update(str(column).encode())
+        digest.update(np.ascontiguousarray(df[column].to_numpy(dtype=float, na_value=np.nan)).tobytes())
+    return digest.hexdigest()
+
+def cached_density_grid(df, x_col, y_col, bins=DENSITY_BINS, log_x=False, log_y=False, weights_col=None):
+    # density_grid() of two columns of a dataset, memoized per content of those columns
+    columns = (x_col, y_col) if weights_col is None else (x_col, y_col, weights_col)
+    key = (_columns_hash(df, columns), x_col, y_col, bins, log_x, log_y, weights_col)
+    if key not in _density_grids:
+        weights = df[weights_col] if weights_col is not None else None
+        _density_grids[key] = density_grid(df[x_col], df[y_col], bins, log_x, log_y, weights)
+        while len(_density_grids) > _DENSITY_CACHE_SIZE:
+            del _density_grids[next(iter(_density_grids))]
+    return _density_grids[key]
+
+def forget_density_grids():
+    # Drop every memoized density grid
+    _density_grids.clear()
+
+def draw_density(ax, grid, cmap='Greys', zorder=1, norm=None):
+    # Draw a density_grid() result as one rasterized image; empty cells are left blank
+    values, x_edges, y_edges = grid
+    values = np.ma.masked_where(~np.isfinite(values) | (values == 0), values)
+    return ax.pcolormesh(x_edges, y_edges, values.T, cmap=cmap, norm=norm,
+                         zorder=zorder, rasterized=True)
+
+
+
+
+# ------------------------------------------------------------------------------
+# Trend lines: straight lines in log-log space fitted by utils.regression
+# (memoized per dataset and subset), drawn over the range of the fitted points.
+# Samples with fewer than two usable points get no line.
+# ------------------------------------------------------------------------------
+def draw_fit(ax, fit, scale=1, color='blue', points=200):
+    if not is_fitted(fit):
+        return None
+    if fit.log_x:
+        x_fit = np.logspace(np.log10(fit.x_min), np.log10(fit.x_max), points)
+    else:
+        x_fit = np.linspace(fit.x_min, fit.x_max, points)
+    return ax.plot(x_fit, predict(fit, x_fit) * scale, color=color, linestyle='-', linewidth=2)
+
+def set_log_axes(ax):
+    # Log-log axes; an empty sample keeps fixed limits instead of failing to autoscale
+    ax.set_yscale('log')
+    ax.set_xscale('log')
+    if not np.isfinite(ax.dataLim.get_points()).all():
+        ax.set_xlim(1, 10)
+        ax.set_ylim(1, 10)
+
+
+
+
 # ------------------------------------------------------------------------------
 # Plot a Hertzsprung–Russell-like diagram: Stellar Radius vs Effective Temperature
 # for all stars in the dataset and a filtered subset.
 # ------------------------------------------------------------------------------
-def plot_sample_stellar_radi_vs_teff(df, df_filtered):
+def plot_sample_stellar_radi_vs_teff(df, df_filtered, density_threshold=None):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    # Plot all stars in light gray
-    ax.scatter(
-        df['st_teff'], df['st_rad'],
-        color="#CECECE", alpha=0.6, s=25, zorder=1,
-        label="All Stars"
-    )
+    # Plot all stars in light gray (as a density image for very large catalogs)
+    dense = use_density(df, density_threshold)
+    if dense:
+        grid = cached_density_grid(df, 'st_teff', 'st_rad', log_y=True)
+        if grid is not None:
+            draw_density(ax, grid, cmap='Greys', zorder=1, norm=LogNorm())
+        ax.scatter([], [], color="#CECECE", s=25, label="All Stars")
+    else:
+        ax.scatter(
+            df['st_teff'], df['st_rad'],
+            color="#CECECE", alpha=0.6, s=25, zorder=1,
+            label="All Stars"
+        )
 
     # Plot filtered stars on top in a distinct color
+    teff, radius = plot_arrays(df_filtered, 'st_teff', 'st_rad')
     ax.scatter(
-        df_filtered['st_teff'], df_filtered['st_rad'],
+        teff, radius,
         c="#3D2490", edgecolors="#363535", s=25, zorder=2,
         label="Filtered Stars"
     )
@@ -59,10 +196,10 @@ def plot_sample_stellar_radi_vs_teff(df, df_filtered):
 
     ax.set_xlabel("Stellar Effective Temperature (K)")
     ax.set_ylabel("Stellar Radius ($R_{\\odot}$)")
-    ax.legend()
+    # 'best' placement would scan every cell of a density image
+    ax.legend(loc='upper right' if dense else 'best')
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -70,28 +207,36 @@ def plot_sample_stellar_radi_vs_teff(df, df_filtered):
 # ------------------------------------------------------------------------------
 # Plot Planetary Radius vs Mass for M-type stars, colored by equilibrium temperature.
 # ------------------------------------------------------------------------------
-def plot_radii_vs_mass_Mtype(df_filtered, df_JWST):
+def plot_radii_vs_mass_Mtype(df_filtered, df_JWST, density_threshold=None):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    is_jwst = df_filtered['pl_name'].isin(df_JWST['Planet'])
-    has_temp = df_filtered['pl_eqt'].notna()
+    is_jwst = jwst_flags(df_filtered, df_JWST)
+    mass, radius, eqt = plot_arrays(df_filtered, 'pl_bmasse', 'pl_rade', 'pl_eqt')
+    has_temp = ~np.isnan(eqt)
 
     # Scatter plot with color mapped to equilibrium temperature
-    scatter = ax.scatter(
-        df_filtered['pl_bmasse'], df_filtered['pl_rade'],
-        c=df_filtered['pl_eqt'], cmap='plasma', s=25, zorder=1 
-    )
+    # (mean temperature per cell for very large samples)
+    dense = use_density(df_filtered, density_threshold)
+    if dense:
+        grid = cached_density_grid(df_filtered, 'pl_bmasse', 'pl_rade', log_x=True, log_y=True,
+                                   weights_col='pl_eqt')
+        scatter = draw_density(ax, grid, cmap='plasma') if grid is not None else ax.scatter([], [])
+    else:
+        scatter = ax.scatter(
+            mass, radius,
+            c=eqt, cmap='plasma', s=25, zorder=1 
+        )
 
     
     # Add colorbar indicating equilibrium temperature
-    cbar = plt.colorbar(scatter, ax=ax)
+    cbar = fig.colorbar(scatter, ax=ax)
     cbar.set_label("Equilibrium Temperature (K)")
 
     circle = is_jwst & has_temp
 
-    plt.scatter(
-        df_filtered[circle]['pl_bmasse'], 
-        df_filtered[circle]['pl_rade'],
+    ax.scatter(
+        mass[circle], 
+        radius[circle],
         facecolors='none',           
         edgecolors='red',            
         linewidths=1.5,              
@@ -105,10 +250,10 @@ def plot_radii_vs_mass_Mtype(df_filtered, df_JWST):
 
     ax.set_xlabel("Planet Mass ($M_{\\oplus}$)")
     ax.set_ylabel("Planet Radius ($R_{\\oplus}$)")
-    ax.legend()
+    # 'best' placement would scan every cell of a density image
+    ax.legend(loc='upper right' if dense else 'best')
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -116,24 +261,41 @@ def plot_radii_vs_mass_Mtype(df_filtered, df_JWST):
 # ------------------------------------------------------------------------------
 # Plot Planetary Radius vs Mass for planets around M-type stars, colored by equilibrium temperature.
 # ------------------------------------------------------------------------------
-def plot_radii_vs_mass_Mtype_comparaison(df_filtered, df_JWST):
+# (model, temperature, color, label) of the composition lines drawn on the plot
+COMPOSITION_CURVES = [
+    ("H2O_50", 700, 'blue', '50%H2O 700k'),
+    ("H2O_50", 1000, 'royalblue', '50%H2O 1000k'),
+    ("H2O_50", 500, 'dodgerblue', '50%H2O 500k'),
+    ("H2O_50", 300, 'deepskyblue', '50%H2O 300k'),
+    ("earth_like", None, 'green', 'earth like'),
+]
+
+def plot_radii_vs_mass_Mtype_comparaison(df_filtered, df_JWST, density_threshold=None):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    is_jwst = df_filtered['pl_name'].isin(df_JWST['Planet'])
+    is_jwst = jwst_flags(df_filtered, df_JWST)
+    mass, radius, eqt = plot_arrays(df_filtered, 'pl_bmasse', 'pl_rade', 'pl_eqt')
 
     brown_to_yellow = LinearSegmentedColormap.from_list(
     'BrownYellow', ['saddlebrown', 'khaki'], N=256
     )
 
     # Scatter plot with color mapped to equilibrium temperature
-    scatter = ax.scatter(
-        df_filtered['pl_bmasse'], df_filtered['pl_rade'],edgecolors='black',linewidths=0.6,
-        c=df_filtered['pl_eqt'], cmap=brown_to_yellow, s=25, zorder=2
-    )
+    # (mean temperature per cell for very large samples)
+    dense = use_density(df_filtered, density_threshold)
+    if dense:
+        grid = cached_density_grid(df_filtered, 'pl_bmasse', 'pl_rade', log_x=True,
+                                   weights_col='pl_eqt')
+        scatter = draw_density(ax, grid, cmap=brown_to_yellow, zorder=2) if grid is not None else ax.scatter([], [])
+    else:
+        scatter = ax.scatter(
+            mass, radius,edgecolors='black',linewidths=0.6,
+            c=eqt, cmap=brown_to_yellow, s=25, zorder=2
+        )
 
-    plt.scatter(
-        df_filtered[is_jwst]['pl_bmasse'], 
-        df_filtered[is_jwst]['pl_rade'], 
+    ax.scatter(
+        mass[is_jwst], 
+        radius[is_jwst], 
         facecolors='none',           
         edgecolors='red',            
         linewidths=1.5,              
@@ -141,105 +303,13 @@ def plot_radii_vs_mass_Mtype_comparaison(df_filtered, df_JWST):
     )
 
     # Add colorbar indicating equilibrium temperature
-    cbar = plt.colorbar(scatter, ax=ax)
+    cbar = fig.colorbar(scatter, ax=ax)
     cbar.set_label("Equilibrium Temperature (K)")
 
-    earth_like_x = np.array([
-        2.2233, 2.7682, 3.4297, 4.2296,
-        5.1932, 6.3505, 7.7363, 9.3912, 11.3628, 13.7066, 16.4870
-    ])
-    earth_like_y = np.array([
-        1.2485, 1.3245, 1.4019, 1.4806,
-        1.5604, 1.6412, 1.7228, 1.8052, 1.8883, 1.9719, 2.0559
-    ])
-
-    cs = CubicSpline(earth_like_x, earth_like_y, extrapolate=True)
-    x_extended = np.logspace(np.log10(0.6), np.log10(16), 200)
-    y_extended = cs(x_extended)
-
-    H2O_50_700k_x = [
-        0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0,
-        10.0, 12.0, 16.0
-    ]
-
-        # Radii (in Earth radii)
-    H2O_50_700k_y = [
-        1.232, 1.302, 1.392, 1.512, 1.609, 1.762, 1.881, 1.981, 2.205,
-        2.319, 2.415, 2.571
-    ]
-
-    H2O_50_1000k_x = [
-        0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0,
-        10.0, 12.0, 16.0
-    ]
-
-        # Radii (in Earth radii)
-    H2O_50_1000k_y = [ 
-        1.397, 1.438, 1.511, 1.612, 1.696, 1.832, 1.942, 2.034, 2.247, 
-        2.356, 2.448, 2.6
-    ]
-
-    H2O_50_500k_x = [
-        0.5, 0.7, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 8.0,
-        10.0, 12.0, 16.0
-    ]
-
-        # Radii (in Earth radii)
-    H2O_50_500k_y = [ 
-        1.118, 1.207, 1.314, 1.448, 1.553, 1.717, 1.842, 1.946, 2.178,
-        2.294, 2.393, 2.553
-    ]
-
-    H2O_50_300k_x = [
-        0.5, 0.595, 0.707, 0.841, 1.0, 1.189, 1.414, 1.682, 2.0,
-        4.0, 8.0, 16.0
-    ]
-
-        # Radii (in Earth radii)
-    H2O_50_300k_y = [ 
-        1.018, 1.07, 1.125, 1.182, 1.241, 1.302, 1.366, 1.432, 1.502,
-        1.805, 2.152, 2.553
-    ]
-
-    spline = CubicSpline(H2O_50_700k_x, H2O_50_700k_y, extrapolate=True)
-
-    # Create new x range from 0 to 16
-    H2O_50_700k_x_extended = np.logspace(np.log10(0.6), np.log10(16), 200)
-    H2O_50_700k_y_extended = spline(H2O_50_700k_x_extended)
-
-    plt.plot(H2O_50_700k_x_extended, H2O_50_700k_y_extended, linestyle='-', color='blue', label='50%H2O 700k', zorder=1)
-    plt.legend()
-
-
-    spline = CubicSpline(H2O_50_1000k_x, H2O_50_1000k_y, extrapolate=True)
-
-    H2O_50_1000k_x_extended = np.logspace(np.log10(0.6), np.log10(16), 200)
-    H2O_50_1000k_y_extended = spline(H2O_50_1000k_x_extended)
-
-    plt.plot(H2O_50_1000k_x_extended, H2O_50_1000k_y_extended, linestyle='-', color='royalblue', label='50%H2O 1000k', zorder=1)
-    plt.legend()
-
-
-    spline = CubicSpline(H2O_50_500k_x, H2O_50_500k_y, extrapolate=True)
-
-    H2O_50_500k_x_extended = np.logspace(np.log10(0.6), np.log10(16), 200)
-    H2O_50_500k_y_extended = spline(H2O_50_500k_x_extended)
-
-    plt.plot(H2O_50_500k_x_extended, H2O_50_500k_y_extended, linestyle='-', color='dodgerblue', label='50%H2O 500k', zorder=1)
-    plt.legend()
-
-
-    spline = CubicSpline(H2O_50_300k_x, H2O_50_300k_y, extrapolate=True)
-
-    H2O_50_300k_x_extended = np.logspace(np.log10(0.6), np.log10(16), 200)
-    H2O_50_300k_y_extended = spline(H2O_50_300k_x_extended)
-
-    plt.plot(H2O_50_300k_x_extended, H2O_50_300k_y_extended, linestyle='-', color='deepskyblue', label='50%H2O 500k', zorder=1)
-    plt.legend()
-
-        # Plot
-    plt.plot(x_extended, y_extended, linestyle='-', color='green', label='earth like', zorder=1)
-    plt.legend()
+    # Composition models (splines and grids are precomputed in utils.composition)
+    for model, T, color, label in COMPOSITION_CURVES:
+        x_curve, y_curve = model_curve(model, T)
+        ax.plot(x_curve, y_curve, linestyle='-', color=color, label=label, zorder=1)
 
     # Log-log scaling for both axes
     ax.set_xscale('log')
@@ -248,50 +318,37 @@ def plot_radii_vs_mass_Mtype_comparaison(df_filtered, df_JWST):
 
     ax.set_xlabel("Planet Mass ($M_{\\oplus}$)")
     ax.set_ylabel("Planet Radius ($R_{\\oplus}$)")
-    ax.legend()
+    # 'best' placement would scan every cell of a density image
+    ax.legend(loc='upper right' if dense else 'best')
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
 
 # ------------------------------------------------------------------------------
 # Plot Planetary density/earth density vs Mass for planets around M-type stars.
+# Planets are classified with utils.classification (Earth-like / Water World /
+# Sub-Neptune).
 # ------------------------------------------------------------------------------
-def classify_planet(mass, density_ratio):
-    earth_like = 1
-    water_like = 2.11 / 4.79 
-    mid_density = (earth_like + water_like) / 2
-
-    if density_ratio >= mid_density:
-        return 'saddlebrown'      # Rocky (Earth-like)
-    elif mass <= 6:
-        return 'lightskyblue'     # Water world
-    else:
-        return 'darkblue'         # Sub-Neptune
-
 def plot_density_vs_mass_Mtype(df_filtered, df_JWST):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    is_jwst = df_filtered['pl_name'].isin(df_JWST['Planet'])
+    is_jwst = jwst_flags(df_filtered, df_JWST)
 
-    df_filtered['density_ratio'] = df_filtered['pl_dens'] / 4.79
-
-    df_filtered['color'] = df_filtered.apply(
-        lambda row: classify_planet(row['pl_bmasse'], row['density_ratio']),
-        axis=1
-    )
+    # Density ratio and category colors are derived arrays (utils.plotdata):
+    # the input DataFrame is left untouched
+    mass, density_ratio, color = plot_arrays(df_filtered, 'pl_bmasse', 'density_ratio', 'color')
 
     scatter = ax.scatter(
-        df_filtered['pl_bmasse'], df_filtered['density_ratio'],
-        c=df_filtered['color'], edgecolors='black', s=25, zorder=2,
+        mass, density_ratio,
+        c=color, edgecolors='black', s=25, zorder=2,
         label="Filtered planets"
     )
 
-    plt.scatter(
-        df_filtered[is_jwst]['pl_bmasse'], 
-        df_filtered[is_jwst]['density_ratio'], 
+    ax.scatter(
+        mass[is_jwst], 
+        density_ratio[is_jwst], 
         facecolors='none',           
         edgecolors='red',            
         linewidths=1.5,              
@@ -302,8 +359,8 @@ def plot_density_vs_mass_Mtype(df_filtered, df_JWST):
     ax.axhline(y=1, color='green', linestyle='-', label='Earth-like', zorder=1, linewidth=1)
     ax.axhline(y=2.11/4.79, color='blue', linestyle='-', label='50% H₂O', zorder=1, linewidth=1)
 
-    plt.axvline(x=2, color='lightskyblue', linestyle='--', linewidth=1)
-    plt.axvline(x=6, color='lightskyblue', linestyle='--', linewidth=1)
+    ax.axvline(x=2, color='lightskyblue', linestyle='--', linewidth=1)
+    ax.axvline(x=6, color='lightskyblue', linestyle='--', linewidth=1)
 
     # Set log scale and labels
     ax.set_yscale('log')
@@ -324,8 +381,7 @@ def plot_density_vs_mass_Mtype(df_filtered, df_JWST):
     ]
     ax.legend(handles=legend_elements, loc='upper right')
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -333,16 +389,6 @@ def plot_density_vs_mass_Mtype(df_filtered, df_JWST):
 # ------------------------------------------------------------------------------
 # Plot histogram of planet density/earth density for planets around M-type stars.
 # ------------------------------------------------------------------------------
-def classify_planet(mass, density_ratio):
-    mid_density = (1 + 2.11 / 4.79) / 2
-
-    if density_ratio >= mid_density:
-        return 'saddlebrown'      # Earth-like
-    elif mass <= 6:
-        return 'lightskyblue'     # Water world
-    else:
-        return 'darkblue'         # Sub-Neptune
-
 # Darken color
 def darken_color(color, amount=0.6):
     c = np.array(mcolors.to_rgb(color))
@@ -364,26 +410,17 @@ def plot_histogram_with_gaps(data, bins, color='steelblue', ax=None, label=None)
 def plot_histogram_density_Mtype_with_gauss(df_filtered):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    # Planets density ratio calculation
-    df_filtered['density_ratio'] = df_filtered['pl_dens'] / 4.79
-
-    # Planets category classification
-    df_filtered['category'] = df_filtered.apply(
-        lambda row: classify_planet(row['pl_bmasse'], row['density_ratio']),
-        axis=1
-    )
+    # Planets density ratio and category classification (derived arrays, see utils.plotdata)
+    density_ratio, category = plot_arrays(df_filtered, 'density_ratio', 'category')
 
     # Define bins once over entire dataset density_ratio range
-    all_density = df_filtered['density_ratio']
-    bins = np.linspace(all_density.min(), all_density.max(), 21)
+    measured = np.isfinite(density_ratio)
+    low, high = (density_ratio[measured].min(), density_ratio[measured].max()) if measured.any() else (0, 1)
+    bins = np.linspace(low, high, 21)
 
-    # Colors and labels
-    categories = ['saddlebrown', 'lightskyblue', 'darkblue']
-    labels = ['Earth-like', 'Water World', 'Sub-Neptune']
-
-    # Plot histograms and Gaussian fits
-    for color, label in zip(categories, labels):
-        data = df_filtered[df_filtered['category'] == color]['density_ratio']
+    # Plot histograms and Gaussian fits (planets without a density are left out)
+    for k, (color, label) in enumerate(zip(CATEGORY_COLORS, CATEGORY_LABELS)):
+        data = density_ratio[measured & (category == k)]
         if len(data) == 0:
             continue  
 
@@ -403,8 +440,8 @@ def plot_histogram_density_Mtype_with_gauss(df_filtered):
     ax.set_ylabel("Number of Planets")
 
     ax.legend()
-    plt.tight_layout()
-    plt.show()
+
+    return show_figure(fig)
 
 
 
@@ -417,15 +454,14 @@ def plot_histogram(df_filtered):
 
     # Histogram of planetary radii
     ax.hist(
-        df_filtered['pl_rade'], bins=200, color='steelblue', edgecolor='black'
+        plot_arrays(df_filtered, 'pl_rade')[0], bins=200, color='steelblue', edgecolor='black'
     )
 
     ax.set_xlabel("Planet Radius ($R_{\\oplus}$)")
     ax.set_ylabel("Number of Planets")
     ax.set_title("Distribution of Planet Radii")
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -437,8 +473,7 @@ def plot_radii_vs_period_JWST(df_filtered):
     fig, ax = plt.subplots(figsize=(10, 6))
 
     # Extract data and remove NaNs
-    x = df_filtered['Period (d)'].values
-    y = df_filtered['Radius (Re)'].values
+    x, y = plot_arrays(df_filtered, 'Period (d)', 'Radius (Re)')
     mask = np.isfinite(x) & np.isfinite(y)
     x = x[mask]
     y = y[mask]
@@ -446,24 +481,20 @@ def plot_radii_vs_period_JWST(df_filtered):
     # Scatter plot
     ax.scatter(x, y, s=25, zorder=1, edgecolors='black')
 
-    # Linear fit
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    x_fit = np.linspace(x.min(), x.max(), 200)
-    y_fit = slope * x_fit + intercept
+    # Linear fit in log-log space
+    fit = cached_line_fit(df_filtered, 'Period (d)', 'Radius (Re)')
 
     # Plot the fit line
-    ax.plot(x_fit, y_fit, color='blue', linestyle='-', linewidth=2)
+    draw_fit(ax, fit)
 
     # Formatting
-    ax.set_yscale('log')
-    ax.set_xscale('log')
+    set_log_axes(ax)
     ax.xaxis.set_major_formatter(ScalarFormatter())
     ax.set_xlabel("Period (days)")
     ax.set_ylabel("Radius ($R_{\\oplus}$)")
     ax.legend()
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -474,45 +505,40 @@ def plot_radii_vs_period_JWST(df_filtered):
 def plot_radii_vs_period_Mtype(df_filtered, df_JWST):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    is_jwst = df_filtered['pl_name'].isin(df_JWST['Planet'])
+    is_jwst = jwst_flags(df_filtered, df_JWST)
 
     # Extract data and remove NaNs
-    x = df_filtered['pl_orbper'].values
-    y = df_filtered['pl_rade'].values
-    mask = np.isfinite(x) & np.isfinite(y)
-    x = x[mask]
-    y = y[mask]
+    period, radius = plot_arrays(df_filtered, 'pl_orbper', 'pl_rade')
+    mask = np.isfinite(period) & np.isfinite(radius)
+    x = period[mask]
+    y = radius[mask]
 
     # Scatter plot
     ax.scatter(x, y, s=25, zorder=1, edgecolors='black')
 
-    plt.scatter(
-        df_filtered[is_jwst]['pl_orbper'], 
-        df_filtered[is_jwst]['pl_rade'], 
+    ax.scatter(
+        period[is_jwst], 
+        radius[is_jwst], 
         facecolors='none',           
         edgecolors='red',            
         linewidths=1.5,              
         label='Observed by JWST'  
     )
 
-    # Linear fit
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    x_fit = np.linspace(x.min(), x.max(), 200)
-    y_fit = slope * x_fit + intercept
+    # Linear fit in log-log space
+    fit = cached_line_fit(df_filtered, 'pl_orbper', 'pl_rade')
 
     # Plot the fit line
-    ax.plot(x_fit, y_fit, color='blue', linestyle='-', linewidth=2)
+    draw_fit(ax, fit)
 
     # Formatting
-    ax.set_yscale('log')
-    ax.set_xscale('log')
+    set_log_axes(ax)
     ax.xaxis.set_major_formatter(ScalarFormatter())
     ax.set_xlabel("Period (days)")
     ax.set_ylabel("Radius ($R_{\\oplus}$)")
     ax.legend()
 
-    plt.tight_layout()
-    plt.show()
+    return show_figure(fig)
 
 
 
@@ -523,42 +549,70 @@ def plot_radii_vs_period_Mtype(df_filtered, df_JWST):
 def plot_density_vs_period_Mtype(df_filtered, df_JWST):
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    is_jwst = df_filtered['pl_name'].isin(df_JWST['Planet'])
+    is_jwst = jwst_flags(df_filtered, df_JWST)
 
     # Extract data and remove NaNs
-    x = df_filtered['pl_orbper'].values
-    y = df_filtered['pl_dens'].values/4.79
-    mask = np.isfinite(x) & np.isfinite(y)
-    x = x[mask]
-    y = y[mask]
+    period, density_ratio = plot_arrays(df_filtered, 'pl_orbper', 'density_ratio')
+    mask = np.isfinite(period) & np.isfinite(density_ratio)
+    x = period[mask]
+    y = density_ratio[mask]
 
     # Scatter plot
     ax.scatter(x, y, s=25, zorder=1, edgecolors='black')
 
-    plt.scatter(
-        df_filtered[is_jwst]['pl_orbper'], 
-        df_filtered[is_jwst]['pl_dens']/4.79, 
+    ax.scatter(
+        period[is_jwst], 
+        density_ratio[is_jwst], 
         facecolors='none',           
         edgecolors='red',            
         linewidths=1.5,              
         label='Observed by JWST'  
     )
 
-    # Linear fit
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    x_fit = np.linspace(x.min(), x.max(), 200)
-    y_fit = slope * x_fit + intercept
+    # Linear fit in log-log space, of the plotted density ratios
+    fit, = fit_lines(x, y)
 
     # Plot the fit line
-    ax.plot(x_fit, y_fit, color='blue', linestyle='-', linewidth=2)
+    draw_fit(ax, fit)
 
     # Formatting
-    ax.set_yscale('log')
-    ax.set_xscale('log')
+    set_log_axes(ax)
     ax.xaxis.set_major_formatter(ScalarFormatter())
     ax.set_xlabel("Period (days)")
     ax.set_ylabel("Density ($\\rho / \\rho_\\oplus$)")
     ax.legend()
 
-    plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    return show_figure(fig)
+
+
+
+# ------------------------------------------------------------------------------
+# Columns read by each plot function from its planet table, so callers can load
+# only what they draw: load_dataset(columns=plot_columns(...)).
+# Plots taking a JWST program table also read its name and coordinate columns
+# (JWST planets are found through utils.crossmatch, with a positional fallback).
+# The density ratio comes from `pl_dens`, or from mass and radius on catalogs
+# without it: pass densities=False to leave `pl_dens` out.
+# ------------------------------------------------------------------------------
+PLOT_COLUMNS = {
+    'plot_sample_stellar_radi_vs_teff':        ('st_teff', 'st_rad'),
+    'plot_radii_vs_mass_Mtype':                ('pl_name', 'ra', 'dec', 'pl_orbper', 'pl_bmasse', 'pl_rade', 'pl_eqt'),
+    'plot_radii_vs_mass_Mtype_comparaison':    ('pl_name', 'ra', 'dec', 'pl_orbper', 'pl_bmasse', 'pl_rade', 'pl_eqt'),
+    'plot_density_vs_mass_Mtype':              ('pl_name', 'ra', 'dec', 'pl_orbper', 'pl_bmasse', 'pl_rade', 'pl_dens'),
+    'plot_histogram_density_Mtype_with_gauss': ('pl_bmasse', 'pl_rade', 'pl_dens'),
+    'plot_histogram':                          ('pl_rade',),
+    'plot_radii_vs_period_JWST':               ('Period (d)', 'Radius (Re)'),
+    'plot_radii_vs_period_Mtype':              ('pl_name', 'ra', 'dec', 'pl_orbper', 'pl_rade'),
+    'plot_density_vs_period_Mtype':            ('pl_name', 'ra', 'dec', 'pl_orbper', 'pl_bmasse', 'pl_rade', 'pl_dens'),
+}
+
+JWST_COLUMNS = ('Planet', 'RA (deg)', 'Dec (deg)', 'Period (d)', 'prog_no', 'Cycle', 'Prog Type', 'Obs type')
+
+def plot_columns(*plots, densities=True):
+    # Union of the columns needed by the given plot functions (or their names)
+    columns = {}
+    for plot in plots:
+        columns.update(dict.fromkeys(PLOT_COLUMNS[getattr(plot, '__name__', plot)]))
+    if not densities:
+        columns.pop('pl_dens', None)
+    return tuple(columns)
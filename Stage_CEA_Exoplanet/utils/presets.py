@@ -1,45 +1,56 @@
-import pandas as pd 
-from utils.filters import apply_filters
-from pathlib import Path
+from utils.cache import cached_apply_filters
+from utils.datasets import load_dataset, shared_dataset
+from utils.filters import batch_filter_masks, compile_filters, missing_columns
 
-# ------------------------ DATASET PATH ------------------------
-csv_path1 = Path("..") / "Dataset" / "Confirmed_Data.csv"
+# ------------------------ DATASET ------------------------
+# The catalog is loaded lazily on the first preset call (see utils.datasets).
+# Every preset also accepts an explicit DataFrame so batch jobs can share one table.
+# Presets go through the selection cache (see utils.cache): repeated calls on the
+# same table only re-slice the memoized rows, so the default catalog is the
+# shared, read-only one.
+def _dataset(df):
+    return shared_dataset() if df is None else df
 
-df = pd.read_csv(csv_path1, comment='#')
-
-df.columns = df.columns.str.strip()
+def __getattr__(name):
+    # Backward compatibility: `presets.df` used to be read at import time
+    if name == "df":
+        return load_dataset()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 
 
 # ------------------------ STELLAR TYPE PRESETS ------------------------
+STELLAR_TYPE_FILTERS = {
+    st_type: dict(st_type=st_type) for st_type in "OBAFGKMLT"
+}
 
-def O_type():
-    return apply_filters(df, st_type="O")
+def O_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["O"])
 
-def B_type():
-    return apply_filters(df, st_type="B")
+def B_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["B"])
 
-def A_type():
-    return apply_filters(df, st_type="A")
+def A_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["A"])
 
-def F_type():
-    return apply_filters(df, st_type="F")
+def F_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["F"])
 
-def G_type():
-    return apply_filters(df, st_type="G")
+def G_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["G"])
 
-def K_type():
-    return apply_filters(df, st_type="K")
+def K_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["K"])
 
-def M_type():
-    return apply_filters(df, st_type="M")
+def M_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["M"])
 
-def L_type():
-    return apply_filters(df, st_type="L")
+def L_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["L"])
 
-def T_type():
-    return apply_filters(df, st_type="T")
+def T_type(df=None):
+    return cached_apply_filters(_dataset(df), **STELLAR_TYPE_FILTERS["T"])
 
 STELLAR_TYPE_PRESETS = {
     "O": O_type,
@@ -57,36 +68,48 @@ STELLAR_TYPE_PRESETS = {
 
 
 # ------------------------ MISSION PRESETS ------------------------
+MISSION_FILTERS = {
+    "Kepler":  dict(mission="Kepler"),
+    "K2":      dict(mission="K2"),
+    "TESS":    dict(mission="Transiting Exoplanet Survey Satellite (TESS)"),
+    "CoRoT":   dict(mission="CoRoT"),
+    "CHEOPS":  dict(mission="CHaracterising ExOPlanets Satellite (CHEOPS)"),
+    "JWST":    dict(mission="James Webb Space Telescope (JWST)"),
+    "Spitzer": dict(mission="Spitzer Space Telescope"),
+    "Hubble":  dict(mission="Hubble Space Telescope"),
+    "Gaia":    dict(mission="European Space Agency (ESA) Gaia Satellite"),
+    "WISE":    dict(mission="Wide-field Infrared Survey Explorer (WISE) Sat"),
+}
 
-def filter_kepler():
-    return apply_filters(df, mission="Kepler")
+def filter_kepler(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["Kepler"])
 
-def filter_k2():
-    return apply_filters(df, mission="K2")
+def filter_k2(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["K2"])
 
-def filter_tess():
-    return apply_filters(df, mission="Transiting Exoplanet Survey Satellite (TESS)")
+def filter_tess(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["TESS"])
 
-def filter_corot():
-    return apply_filters(df, mission="CoRoT")
+def filter_corot(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["CoRoT"])
 
-def filter_cheops():
-    return apply_filters(df, mission="CHaracterising ExOPlanets Satellite (CHEOPS)")
+def filter_cheops(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["CHEOPS"])
 
-def filter_jwst():
-    return apply_filters(df, mission="James Webb Space Telescope (JWST)")
+def filter_jwst(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["JWST"])
 
-def filter_spitzer():
-    return apply_filters(df, mission="Spitzer Space Telescope")
+def filter_spitzer(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["Spitzer"])
 
-def filter_hubble():
-    return apply_filters(df, mission="Hubble Space Telescope")
+def filter_hubble(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["Hubble"])
 
-def filter_gaia():
-    return apply_filters(df, mission="European Space Agency (ESA) Gaia Satellite")
+def filter_gaia(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["Gaia"])
 
-def filter_wise():
-    return apply_filters(df, mission="Wide-field Infrared Survey Explorer (WISE) Sat")
+def filter_wise(df=None):
+    return cached_apply_filters(_dataset(df), **MISSION_FILTERS["WISE"])
 
 MISSION_PRESETS = {
     "Kepler": filter_kepler,
@@ -105,21 +128,57 @@ MISSION_PRESETS = {
 
 
 # ------------------------ PAPER PRESETS ------------------------
+PAPER_FILTERS = {
+    "Fulton_2017": dict(
+        mission='Kepler', date_max=2017, kp=14.2,
+        Teff_min=4700, Teff_max=6500, Fulton_2017=True,
+        b=0.7
+    ),
+    "Luque_Paille_2022": dict(
+        #date_max=2022,
+        st_type='M',
+        rade_max=4, rade_err=0.08, mass_max=20, mass_err=0.25
+    ),
+}
 
-def Fulton_2017():
-    return apply_filters(df,
-                         mission='Kepler', date_max=2017, kp=14.2,
-                         Teff_min=4700, Teff_max=6500, Fulton_2017=True,
-                         b=0.7
-                         )
+def Fulton_2017(df=None):
+    return cached_apply_filters(_dataset(df), **PAPER_FILTERS["Fulton_2017"])
 
-def Luque_Paille_2022():
-    return apply_filters(df,
-                         #date_max=2022,
-                         st_type='M',
-                         rade_max=4, rade_err=0.08, mass_max=20,mass_err=0.25)
+def Luque_Paille_2022(df=None):
+    return cached_apply_filters(_dataset(df), **PAPER_FILTERS["Luque_Paille_2022"])
 
 PAPER_PRESETS = {
     "Fulton_2017"      : Fulton_2017,
     "Luque_Paille_2022": Luque_Paille_2022
-}
\ No newline at end of file
+}
+
+
+
+
+# ------------------------ BATCH EVALUATION ------------------------
+# Every preset configuration, keyed "<group>/<name>" (e.g. "mission/Kepler").
+ALL_PRESET_FILTERS = {
+    **{f"stellar_type/{name}": filters for name, filters in STELLAR_TYPE_FILTERS.items()},
+    **{f"mission/{name}": filters for name, filters in MISSION_FILTERS.items()},
+    **{f"paper/{name}": filters for name, filters in PAPER_FILTERS.items()},
+}
+
+def supported_presets(presets=None, df=None):
+    """
+    The presets (all by default) whose filters only read columns of the
+    dataset: e.g. "paper/Fulton_2017" needs `sy_kepmag` and `pl_imppar`,
+    which the NEA composite table does not have.
+    """
+    if presets is None:
+        presets = ALL_PRESET_FILTERS
+    df = _dataset(df)
+    return {name: filters for name, filters in presets.items()
+            if not missing_columns(df, compile_filters(**filters))}
+
+def evaluate_presets(presets=None, df=None, as_index=False):
+    """
+    Evaluate several presets (all by default) in a single pass over the dataset.
+    Presets reading columns the dataset lacks are left out (see `supported_presets()`).
+    """
+    df = _dataset(df)
+    return batch_filter_masks(df, supported_presets(presets, df), as_index=as_index)
@@ -0,0 +1,365 @@
+"""
+Log-Space Regression Module
+------------------------------------------------
+This module fits straight lines in log-log space (log10 y = intercept +
+slope * log10 x, the trend drawn on the period plots) on many subsets of a
+catalog at once.
+
+Subsets are rows of a membership matrix (e.g. the columns of
+`filters.batch_filter_masks()`), so the sufficient statistics of every
+subset (weighted sums of x, y, x^2, xy, y^2) come out of one matrix product.
+Three estimators are available:
+    'ols'   ordinary least squares (as `scipy.stats.linregress`)
+    'wls'   least squares weighted by the y errors
+    'york'  errors in both variables (York et al. 2004), iterated on all
+            subsets together
+and each fit comes with the standard errors of its slope and intercept.
+Subsets with fewer than two usable points give NaN fits instead of failing.
+
+Fits of a catalog are memoized per (versions of the fitted columns, see
+`statistics.column_version()`, subset rows, columns, options): no hash of the
+frame is needed, an edited column gets new fits, plots only draw cached
+results and every stellar-type and mission preset is fitted in one pass with
+`fit_presets()`. Without pandas copy-on-write, fits are never reused.
+
+Usage:
+    fit = cached_line_fit(df_filtered, "pl_orbper", "pl_rade")
+    ax.plot(x_fit, predict(fit, x_fit))
+    fits = fit_presets(df, "pl_orbper", "pl_rade", method="york",
+                       x_err=("pl_orbpererr1", "pl_orbpererr2"), y_err=("pl_radeerr1", "pl_radeerr2"))
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import hashlib
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from utils.statistics import column_version
+
+
+# ------------------------ CONFIGURATION ------------------------
+FIT_METHODS = ('ols', 'wls', 'york')
+
+# Preset groups fitted by `fit_presets()` by default
+PRESET_GROUPS = ('stellar_type', 'mission')
+
+YORK_ITERATIONS = 50
+YORK_TOLERANCE = 1e-10
+
+_CACHE_SIZE = 256
+_fits = OrderedDict()   # (column versions, rows hash, columns, options) -> (column Series, LineFit)
+
+# `x_min`/`x_max` span the fitted points (in data units), `n` counts them
+LineFit = namedtuple(
+    "LineFit",
+    ["slope", "intercept", "slope_err", "intercept_err", "r_value", "n", "x_min", "x_max", "log_x", "log_y"],
+)
+
+
+
+
+# ------------------------ INPUTS ------------------------
+def _numeric(df, column):
+    values = df[column]
+    if values.dtype.kind in 'biuf':
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def column_errors(df, errors):
+    """
+    Symmetric 1-sigma errors from a column name, or from an (upper, lower)
+    pair of columns (mean of their absolute values). None stays None.
+    """
+    if errors is None:
+        return None
+    if isinstance(errors, str):
+        return np.abs(_numeric(df, errors))
+    return np.mean([np.abs(_numeric(df, column)) for column in errors], axis=0)
+
+
+def _transform(values, errors, log):
+    # Values (and errors, propagated to first order) in the fitted space
+    if not log:
+        return values, errors
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logged = np.where(values > 0, np.log10(values), np.nan)
+        if errors is not None:
+            errors = errors / (values * np.log(10))
+    return logged, errors
+
+
+def _members(subsets, n):
+    # Subsets (boolean masks or row positions, or None for all rows) -> (k, n) boolean matrix
+    members = np.zeros((len(subsets), n), dtype=bool)
+    for i, subset in enumerate(subsets):
+        if subset is None:
+            members[i] = True
+        else:
+            subset = np.asarray(subset)
+            if subset.dtype == bool:
+                members[i] = subset
+            else:
+                members[i, subset] = True
+    return members
+
+
+
+
+# ------------------------ BATCHED FITS ------------------------
+def _moments(x, y, weights):
+    # Weighted sums (S, Sx, Sy, Sxx, Sxy, Syy) of each subset; weights are (k, n)
+    terms = np.column_stack([np.ones_like(x), x, y, x * x, x * y, y * y])
+    return (weights @ terms).T
+
+
+def _solve(n, s, sx, sy, sxx, sxy, syy, weighted):
+    # Least-squares line and standard errors from (weighted) sufficient statistics
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean, y_mean = sx / s, sy / s
+        xx, xy, yy = sxx - sx * x_mean, sxy - sx * y_mean, syy - sy * y_mean
+        slope = xy / xx
+        intercept = y_mean - slope * x_mean
+        if not weighted:
+            # Residual variance estimated from the scatter
+            residual = np.maximum(yy - slope * xy, 0) / (n - 2)
+            slope_var = np.where(n > 2, residual / xx, np.nan)
+        else:
+            slope_var = 1 / xx
+        intercept_var = slope_var * sxx / s
+    return slope, intercept, np.sqrt(slope_var), np.sqrt(intercept_var)
+
+
+def _least_squares(x, y, members, y_sigma):
+    n = members.sum(axis=1)
+    weights = members if y_sigma is None else members / y_sigma ** 2
+    return _solve(n, *_moments(x, y, weights.astype(float)), weighted=y_sigma is not None)
+
+
+def _correlation(s, sx, sy, sxx, sxy, syy):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sxy - sx * sy / s) / np.sqrt((sxx - sx * sx / s) * (syy - sy * sy / s))
+
+
+def _line_fits(n, solution, r_value, x_min, x_max, log_x, log_y):
+    slope, intercept, slope_err, intercept_err = solution
+    fits = []
+    for i in range(len(n)):
+        if n[i] < 2 or not np.isfinite(slope[i]):
+            fits.append(LineFit(np.nan, np.nan, np.nan, np.nan, np.nan, int(n[i]),
+                                np.nan, np.nan, log_x, log_y))
+        else:
+            fits.append(LineFit(float(slope[i]), float(intercept[i]), float(slope_err[i]),
+                                float(intercept_err[i]), float(r_value[i]), int(n[i]),
+                                float(x_min[i]), float(x_max[i]), log_x, log_y))
+    return fits
+
+
+def _york(x, y, members, x_sigma, y_sigma):
+    # York et al. (2004), uncorrelated errors, all subsets iterated together
+    wx, wy = 1 / x_sigma ** 2, 1 / y_sigma ** 2
+    slope, _, _, _ = _least_squares(x, y, members, None)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(YORK_ITERATIONS):
+            b = slope[:, None]
+            w = members * (wx * wy / (wx + b ** 2 * wy))
+            total = w.sum(axis=1)
+            x_mean, y_mean = (w @ x) / total, (w @ y) / total
+            u, v = x - x_mean[:, None], y - y_mean[:, None]
+            beta = w * (u / wy + b * v / wx)
+            updated = (w * beta * v).sum(axis=1) / (w * beta * u).sum(axis=1)
+            done = ~(np.abs(updated - slope) > YORK_TOLERANCE * np.abs(updated))
+            slope = updated
+            if done.all():
+                break
+
+        b = slope[:, None]
+        w = members * (wx * wy / (wx + b ** 2 * wy))
+        total = w.sum(axis=1)
+        x_mean, y_mean = (w @ x) / total, (w @ y) / total
+        u, v = x - x_mean[:, None], y - y_mean[:, None]
+        adjusted = x_mean[:, None] + w * (u / wy + b * v / wx)
+        adjusted_mean = (w * adjusted).sum(axis=1) / total
+        slope_var = 1 / (w * (adjusted - adjusted_mean[:, None]) ** 2).sum(axis=1)
+        intercept_var = 1 / total + adjusted_mean ** 2 * slope_var
+    return slope, y_mean - slope * x_mean, np.sqrt(slope_var), np.sqrt(intercept_var)
+
+
+def fit_lines(x, y, subsets=(None,), method='ols', x_err=None, y_err=None, log_x=True, log_y=True):
+    """
+    Fit one line per subset of the points (x, y) and return one `LineFit`
+    per subset. Subsets are boolean masks or row positions (None: every
+    point); `x_err` / `y_err` are 1-sigma errors in data units, required by
+    'york' (both) and 'wls' (`y_err`). Points that cannot be fitted (missing,
+    non-positive on a log axis, missing error) are ignored.
+    """
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method {method!r}, expected one of {FIT_METHODS}")
+    if (method == 'wls' and y_err is None) or (method == 'york' and (x_err is None or y_err is None)):
+        raise ValueError(f"Fit method {method!r} needs the errors of {'y' if method == 'wls' else 'x and y'}")
+
+    raw_x = np.asarray(x, dtype=float)
+    raw_y = np.asarray(y, dtype=float)
+    x, x_sigma = _transform(raw_x, None if x_err is None else np.asarray(x_err, dtype=float), log_x)
+    y, y_sigma = _transform(raw_y, None if y_err is None else np.asarray(y_err, dtype=float), log_y)
+
+    usable = np.isfinite(x) & np.isfinite(y)
+    for sigma in (x_sigma if method == 'york' else None, y_sigma if method != 'ols' else None):
+        if sigma is not None:
+            with np.errstate(invalid='ignore'):
+                usable &= np.isfinite(sigma) & (sigma > 0)
+    members = _members(subsets, len(x)) & usable
+    x, y = np.where(usable, x, 0), np.where(usable, y, 0)
+    if x_sigma is not None:
+        x_sigma = np.where(usable, x_sigma, 1)
+    if y_sigma is not None:
+        y_sigma = np.where(usable, y_sigma, 1)
+
+    if method == 'york':
+        solution = _york(x, y, members, x_sigma, y_sigma)
+    else:
+        solution = _least_squares(x, y, members, y_sigma if method == 'wls' else None)
+
+    # Correlation coefficient and fitted range of the (unweighted) points
+    n = members.sum(axis=1)
+    r_value = _correlation(*_moments(x, y, members.astype(float)))
+    x_min = np.where(members, raw_x, np.inf).min(axis=1, initial=np.inf)
+    x_max = np.where(members, raw_x, -np.inf).max(axis=1, initial=-np.inf)
+    return _line_fits(n, solution, r_value, x_min, x_max, log_x, log_y)
+
+
+def line_sums(x, y, labels=None, n_groups=1, log_x=True, log_y=True):
+    """
+    Unweighted sufficient statistics of the points (x, y) in each group
+    (`labels` in 0..n_groups-1, or one group): a (n_groups, 6) array of the
+    sums (n, x, y, x^2, xy, y^2) in the fitted space, and the range of x.
+    Sums of disjoint sets of points add up, so they can be merged or
+    subtracted; `fit_sums()` turns them into `LineFit`s.
+    """
+    raw_x = np.asarray(x, dtype=float)
+    x, _ = _transform(raw_x, None, log_x)
+    y, _ = _transform(np.asarray(y, dtype=float), None, log_y)
+    labels = np.zeros(len(x), dtype=np.intp) if labels is None else np.asarray(labels, dtype=np.intp)
+
+    usable = np.isfinite(x) & np.isfinite(y)
+    x, y, raw_x, labels = x[usable], y[usable], raw_x[usable], labels[usable]
+    terms = (np.ones_like(x), x, y, x * x, x * y, y * y)
+    sums = np.column_stack([np.bincount(labels, weights=t, minlength=n_groups) for t in terms])
+    x_min = np.full(n_groups, np.inf)
+    x_max = np.full(n_groups, -np.inf)
+    np.minimum.at(x_min, labels, raw_x)
+    np.maximum.at(x_max, labels, raw_x)
+    return sums, x_min, x_max
+
+
+def fit_sums(sums, x_min, x_max, log_x=True, log_y=True):
+    """Ordinary least-squares `LineFit`s (one per row) from `line_sums()` statistics."""
+    sums = np.atleast_2d(np.asarray(sums, dtype=float))
+    n = np.rint(sums[:, 0]).astype(np.int64)
+    moments = sums.T
+    return _line_fits(n, _solve(n, *moments, weighted=False), _correlation(*moments),
+                      np.atleast_1d(x_min), np.atleast_1d(x_max), log_x, log_y)
+
+
+def predict(fit, x):
+    """Values of a fitted line at `x` (data units)."""
+    x = np.asarray(x, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = fit.intercept + fit.slope * (np.log10(x) if fit.log_x else x)
+    return 10 ** y if fit.log_y else y
+
+
+def is_fitted(fit):
+    """Whether a `LineFit` holds a line (enough points were available)."""
+    return np.isfinite(fit.slope)
+
+
+
+
+# ------------------------ CACHED FITS ------------------------
+def _rows_key(subset, n):
+    if subset is None:
+        return 'all'
+    subset = np.asarray(subset)
+    rows = np.flatnonzero(subset) if subset.dtype == bool else np.sort(subset)
+    if len(rows) == n and (n == 0 or rows[-1] == n - 1):
+        return 'all'
+    return hashlib.sha1(np.ascontiguousarray(rows, dtype=np.int64).tobytes()).hexdigest()
+
+
+def _fit_columns(x, y, x_err, y_err):
+    columns = [x, y]
+    for errors in (x_err, y_err):
+        if errors is not None:
+            columns += [errors] if isinstance(errors, str) else list(errors)
+    return columns
+
+
+def _cached_fits(df, x, y, subsets, method, x_err, y_err, log_x, log_y):
+    # {name: subset} -> [LineFit], fitting the subsets not cached yet in one batch.
+    # Entries keep the fitted Series, so their versions (data addresses) stay unique.
+    series = tuple(df[column] for column in _fit_columns(x, y, x_err, y_err))
+    versions = tuple(column_version(values) for values in series)
+
+    def fit(subsets):
+        return fit_lines(_numeric(df, x), _numeric(df, y), subsets, method,
+                         column_errors(df, x_err), column_errors(df, y_err), log_x, log_y)
+
+    if None in versions:
+        return fit(list(subsets.values()))
+
+    options = (x, y, method, x_err, y_err, log_x, log_y)
+    keys = [(versions, _rows_key(subset, len(df)), options) for subset in subsets.values()]
+
+    missing = {key: subset for key, subset in zip(keys, subsets.values()) if key not in _fits}
+    if missing:
+        _fits.update((key, (series, line)) for key, line in zip(missing, fit(list(missing.values()))))
+
+    fits = [_fits[key][1] for key in keys]
+    for key in keys:
+        _fits.move_to_end(key)
+    while len(_fits) > _CACHE_SIZE:
+        _fits.popitem(last=False)
+    return fits
+
+
+def fit_subsets(df, x, y, subsets, method='ols', x_err=None, y_err=None, log_x=True, log_y=True):
+    """
+    `LineFit`s of columns `x` and `y` of `df` on named subsets (name -> mask
+    or row positions), memoized per dataset and subset; subsets not fitted
+    yet are fitted together in one batch. Returns a DataFrame with one row
+    per subset.
+    """
+    fits = _cached_fits(df, x, y, subsets, method, x_err, y_err, log_x, log_y)
+    return pd.DataFrame(fits, columns=LineFit._fields, index=pd.Index(list(subsets), name='subset'))
+
+
+def cached_line_fit(df, x, y, rows=None, method='ols', x_err=None, y_err=None, log_x=True, log_y=True):
+    """Memoized `LineFit` of columns `x` and `y` of `df` (optionally only `rows`)."""
+    return _cached_fits(df, x, y, {'fit': rows}, method, x_err, y_err, log_x, log_y)[0]
+
+
+def forget_fits():
+    """Drop every memoized `LineFit`."""
+    _fits.clear()
+
+
+def fit_presets(df, x, y, presets=None, method='ols', x_err=None, y_err=None, log_x=True, log_y=True):
+    """
+    Fit every preset (the stellar-type and mission presets by default) in
+    one pass: the selections come from `filters.batch_filter_masks()` and
+    the fits from one batched `fit_lines()` call. One row per preset.
+    """
+    from utils.filters import batch_filter_masks
+    from utils.presets import ALL_PRESET_FILTERS
+
+    if presets is None:
+        presets = {name: filters for name, filters in ALL_PRESET_FILTERS.items()
+                   if name.split('/')[0] in PRESET_GROUPS}
+    masks = batch_filter_masks(df, presets, as_index=True)
+    return fit_subsets(df, x, y, masks, method, x_err, y_err, log_x, log_y)
@@ -0,0 +1,185 @@
+"""
+Headless Figure Rendering Module
+------------------------------------------------
+This module renders the figures of `utils.plots` in bulk, without a
+notebook: each job of a manifest names a plot function, a preset, an output
+path, a format and a resolution.
+
+Jobs run on the Agg backend, across a process pool when `workers` > 1. Each
+worker loads the catalogs once through `datasets.shared_dataset()` (backed by
+the columnar cache) and selects each preset sample once: plots never modify
+their input, so all the jobs of a sample share it and its plot arrays.
+Every figure is closed as soon as it is written.
+Run in-process with `output=None`, a job returns the figure object instead.
+
+Usage:
+    manifest = build_manifest(["plot_radii_vs_mass_Mtype"], ["paper/Luque_Paille_2022"],
+                              "figures", formats=("png", "pdf"))
+    results = render_figures(manifest, workers=4)
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import inspect
+import os
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import matplotlib
+
+
+# ------------------------ CONFIGURATION ------------------------
+DEFAULT_DPI = 150
+DEFAULT_FORMAT = "png"
+
+JWST_DATASET = "JWST.csv"
+
+# Plots whose `df_filtered` argument is the JWST program table itself
+JWST_TABLE_PLOTS = ('plot_radii_vs_period_JWST',)
+
+_SAMPLE_CACHE_SIZE = 16
+_samples = {}   # (catalog fingerprint, filters) -> sample shared by the jobs of a process
+
+RenderJob = namedtuple("RenderJob", ["plot", "preset", "output", "format", "dpi"])
+RenderResult = namedtuple("RenderResult", ["job", "output", "error"])
+
+
+
+
+# ------------------------ MANIFEST ------------------------
+def render_job(plot, preset=None, output=None, format=None, dpi=DEFAULT_DPI):
+    """Build a job; `format` defaults to the output suffix (or PNG)."""
+    plot = getattr(plot, '__name__', plot)
+    if format is None:
+        format = Path(output).suffix.lstrip('.') if output is not None and Path(output).suffix else DEFAULT_FORMAT
+    return RenderJob(plot, preset, output, format, dpi)
+
+
+def build_manifest(plots, presets, directory, formats=(DEFAULT_FORMAT,), dpi=DEFAULT_DPI):
+    """Every (plot, preset, format) combination, written as `<directory>/<preset>/<plot>.<format>`."""
+    directory = Path(directory)
+    manifest = []
+    for preset in presets:
+        folder = directory / (str(preset).replace('/', '_') if preset is not None else 'all')
+        for plot in plots:
+            name = getattr(plot, '__name__', plot)
+            for format in formats:
+                manifest.append(render_job(name, preset, folder / f"{name}.{format}", format, dpi))
+    return manifest
+
+
+
+
+# ------------------------ RENDERING ------------------------
+@contextmanager
+def headless():
+    """Make the plot functions return their figure instead of showing it."""
+    from utils import plots
+
+    previous, plots.SHOW_FIGURES = plots.SHOW_FIGURES, False
+    try:
+        yield
+    finally:
+        plots.SHOW_FIGURES = previous
+
+
+def _init_worker():
+    matplotlib.use('Agg')
+    from utils import plots
+    plots.SHOW_FIGURES = False
+
+
+def _sample(preset, df):
+    # One DataFrame object per (catalog, preset), so the plots of a batch share
+    # its plot arrays (see utils.plotdata) instead of re-extracting them
+    from utils.presets import ALL_PRESET_FILTERS
+    from utils.cache import cached_apply_filters, dataset_fingerprint
+
+    if preset is None:
+        return df
+    filters = preset if isinstance(preset, dict) else ALL_PRESET_FILTERS[preset]
+    key = (dataset_fingerprint(df), repr(sorted(filters.items())))
+    if key not in _samples:
+        _samples[key] = cached_apply_filters(df, **filters)
+        while len(_samples) > _SAMPLE_CACHE_SIZE:
+            del _samples[next(iter(_samples))]
+    return _samples[key]
+
+
+def _plot_arguments(job):
+    from utils import plots
+    from utils.datasets import shared_dataset
+
+    function = getattr(plots, job.plot)
+    df = shared_dataset()
+    jwst = shared_dataset(JWST_DATASET)
+
+    arguments = {}
+    for name in inspect.signature(function).parameters:
+        if name == 'df':
+            arguments[name] = df
+        elif name == 'df_JWST':
+            arguments[name] = jwst
+        elif name == 'df_filtered':
+            arguments[name] = jwst if job.plot in JWST_TABLE_PLOTS else _sample(job.preset, df)
+    return function, arguments
+
+
+def render(job):
+    """Run one job in the current process; returns the written path, or the figure if `output` is None."""
+    import matplotlib.pyplot as plt
+
+    function, arguments = _plot_arguments(job)
+    opened = set(plt.get_fignums())
+    try:
+        with headless():
+            fig = function(**arguments)
+    except Exception:
+        # Do not leak the half-drawn figure of a failing plot
+        for number in set(plt.get_fignums()) - opened:
+            plt.close(number)
+        raise
+
+    if job.output is None:
+        return fig
+
+    try:
+        output = Path(job.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(output, format=job.format, dpi=job.dpi)
+        return output
+    finally:
+        plt.close(fig)
+
+
+def _render_safely(job):
+    try:
+        return RenderResult(job, render(job), None)
+    except Exception:
+        return RenderResult(job, None, traceback.format_exc())
+
+
+def render_figures(manifest, workers=None):
+    """
+    Render every job of `manifest` headlessly and return one `RenderResult`
+    per job, in order. Failing jobs carry the traceback in `error` instead
+    of stopping the batch.
+    """
+    manifest = [job if isinstance(job, RenderJob) else render_job(**job) for job in manifest]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(manifest) <= 1:
+        # Same non-interactive backend as the workers, restored afterwards
+        previous = matplotlib.get_backend()
+        matplotlib.use('Agg')
+        try:
+            return [_render_safely(job) for job in manifest]
+        finally:
+            matplotlib.use(previous)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(_render_safely, manifest, chunksize=max(1, len(manifest) // (4 * workers))))
@@ -0,0 +1,415 @@
+"""
+Catalog Snapshot Module
+------------------------------------------------
+This module keeps versioned columnar copies (snapshots) of the catalogs of
+the `Dataset/` folder, computes row-level differences between two versions
+of a catalog, and carries the results computed on the old version over to
+the new one, recomputing them only for the rows that changed.
+
+Snapshots live in `.snapshots/<catalog>/` next to the catalog (so
+`Dataset/.snapshots/` for the repository catalogs), one Feather (or `.npy`
+columns) file per version plus a `versions.json` index; a new version is
+written only when the source file content changed, and the oldest versions
+beyond `SNAPSHOT_KEEP` are pruned. The results computed on a version (filter
+selections and JWST join tables) are saved next to it in a
+`<version>.results/` folder, so the next refresh starts from them instead of
+recomputing them on the old version.
+
+Rows are matched between versions on the planet name column of the catalog
+(`SNAPSHOT_KEYS`: `pl_name` for the NEA table, `name` for exoplanet.eu, ...).
+`diff_catalogs()` reports the added, removed and changed planets and which
+columns changed. From that diff, `update_selection()` derives the rows a
+filter plan selects on the new version from its selection on the old one
+(stored with the old snapshot), evaluating the plan only on the added rows
+and on the changed rows when the plan reads a changed column, and
+`update_observations()` does the same for the JWST cross-match. Both seed
+the caches of `utils.cache` and `utils.crossmatch`, so later presets and
+plots hit them directly.
+Column statistics and sorted indexes of the new version are rebuilt lazily on
+first use.
+
+A weekly refresh is one call:
+    update = refresh_catalog("NEA_planetary_systems_composite.csv", jwst=load_dataset("JWST.csv"))
+    update.diff.added, update.diff.changed, update.selections["stellar_type/M"]
+
+Usage:
+    info = take_snapshot("Exoplaneteu.csv")
+    list_snapshots("Exoplaneteu.csv")
+    old = load_snapshot("Exoplaneteu.csv", version=3)
+    diff = diff_catalogs(old, load_dataset("Exoplaneteu.csv"), key="name")
+    rows = load_selection("Exoplaneteu.csv", 3, compile_filters(st_type="M"))
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import cached_plan_index, dataset_fingerprint, store_plan_index
+from utils.crossmatch import DEFAULT_TOLERANCE_ARCSEC, jwst_observations, store_observations
+from utils.datasets import (
+    catalog_fingerprint, feather, read_columnar, remove_columnar, resolve_dataset_path,
+    shared_dataset, write_columnar
+)
+from utils.filters import FILTER_VERSION, compile_filters, evaluate_plan, plan_columns
+
+
+# ------------------------ CONFIGURATION ------------------------
+SNAPSHOT_DIRNAME = ".snapshots"
+
+# Versions kept per catalog (older ones are pruned); None keeps every version
+SNAPSHOT_KEEP = 12
+
+# Column identifying a planet in each catalog; unknown files use `pl_name`
+SNAPSHOT_KEYS = {
+    "NEA_planetary_systems_composite.csv": "pl_name",
+    "Exoplaneteu.csv":                     "name",
+    "planets.vot":                         "Planet Name",
+    "JWST.csv":                            "Planet",
+}
+DEFAULT_KEY = "pl_name"
+
+# Columns read by the JWST cross-match of a planet table
+MATCH_COLUMNS = ('pl_name', 'ra', 'dec', 'pl_orbper')
+
+SnapshotInfo = namedtuple("SnapshotInfo", ["version", "sha1", "rows", "created", "file"])
+
+# `added`, `changed`: row positions in the new version; `removed`: row
+# positions in the old one; `old_rows`: for every new row, the position of
+# the same planet in the old version (-1 if added); `columns`: columns whose
+# values changed; `schema`: columns added to or removed from the catalog
+CatalogDiff = namedtuple("CatalogDiff", ["key", "added", "removed", "changed", "old_rows", "columns", "schema"])
+
+CatalogUpdate = namedtuple("CatalogUpdate", ["snapshot", "previous", "diff", "selections", "observations"])
+
+RESULTS_SUFFIX = ".results"
+
+
+
+
+# ------------------------ SNAPSHOTS ------------------------
+def _snapshot_dir(path):
+    return path.parent / SNAPSHOT_DIRNAME / path.name
+
+
+def _read_versions(path):
+    try:
+        with open(_snapshot_dir(path) / "versions.json") as f:
+            return [SnapshotInfo(**entry) for entry in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def _write_versions(path, versions):
+    index = _snapshot_dir(path) / "versions.json"
+    tmp = index.with_suffix(".json.tmp")
+    with open(tmp, 'w') as f:
+        json.dump([info._asdict() for info in versions], f, indent=1)
+    os.replace(tmp, index)
+
+
+def list_snapshots(path=None):
+    """The stored versions of a catalog, oldest first, as a DataFrame."""
+    versions = _read_versions(resolve_dataset_path(path))
+    return pd.DataFrame(versions, columns=SnapshotInfo._fields)
+
+
+def take_snapshot(path=None, df=None):
+    """
+    Store the current content of a catalog as a new version (unless it is
+    identical to the latest one) and return its `SnapshotInfo`. `df` is the
+    loaded catalog, read with `shared_dataset()` when omitted.
+    """
+    path = resolve_dataset_path(path)
+    sha1 = catalog_fingerprint(path)
+    versions = _read_versions(path)
+    if versions and versions[-1].sha1 == sha1:
+        return versions[-1]
+
+    df = shared_dataset(path) if df is None else df
+    version = versions[-1].version + 1 if versions else 1
+    suffix = '.feather' if feather is not None else '.npcols'
+    info = SnapshotInfo(version, sha1, len(df), datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                        f"v{version:04d}.{sha1[:16]}{suffix}")
+
+    directory = _snapshot_dir(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    write_columnar(df, directory / info.file)
+    versions.append(info)
+
+    if SNAPSHOT_KEEP is not None:
+        for old in versions[:-SNAPSHOT_KEEP]:
+            if (directory / old.file).exists():
+                remove_columnar(directory / old.file)
+            shutil.rmtree(_results_dir(path, old), ignore_errors=True)
+        versions = versions[-SNAPSHOT_KEEP:]
+    _write_versions(path, versions)
+    return info
+
+
+def _snapshot_info(path, version):
+    matches = [info for info in _read_versions(path) if version is None or info.version == version]
+    if not matches:
+        raise KeyError(f"No snapshot {'' if version is None else f'{version} '}of {path.name}")
+    return matches[-1]
+
+
+def load_snapshot(path=None, version=None, columns=None):
+    """A stored version of a catalog (the latest by default) as a DataFrame."""
+    path = resolve_dataset_path(path)
+    return read_columnar(_snapshot_dir(path) / _snapshot_info(path, version).file, columns)
+
+
+
+
+# ------------------------ STORED RESULTS ------------------------
+# Selections are saved as `<plan hash>.npy` row positions and JWST join tables
+# as `jwst.<hash>` columnar files, in the results folder of their version.
+def _results_dir(path, info):
+    return _snapshot_dir(path) / (info.file.rsplit('.', 1)[0] + RESULTS_SUFFIX)
+
+
+def _plan_file(plan):
+    return hashlib.sha1(f"{plan!r}|{FILTER_VERSION}".encode()).hexdigest() + ".npy"
+
+
+def _join_file(jwst, tolerance_arcsec):
+    key = hashlib.sha1(f"{dataset_fingerprint(jwst)}|{tolerance_arcsec!r}".encode()).hexdigest()
+    return f"jwst.{key[:16]}{'.feather' if feather is not None else '.npcols'}"
+
+
+def save_selection(path, version, plan, rows):
+    """Store the rows a compiled filter plan selects on a snapshot version."""
+    path = resolve_dataset_path(path)
+    directory = _results_dir(path, _snapshot_info(path, version))
+    directory.mkdir(exist_ok=True)
+    np.save(directory / _plan_file(plan), np.asarray(rows, dtype=np.intp))
+
+
+def load_selection(path, version, plan):
+    """Rows of a snapshot version selected by a plan, as stored by `save_selection()`, or None."""
+    path = resolve_dataset_path(path)
+    try:
+        return np.load(_results_dir(path, _snapshot_info(path, version)) / _plan_file(plan))
+    except (OSError, ValueError):
+        return None
+
+
+def save_observations(path, version, jwst, join, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """Store the JWST join table (see `crossmatch.jwst_observations()`) of a snapshot version."""
+    path = resolve_dataset_path(path)
+    directory = _results_dir(path, _snapshot_info(path, version))
+    directory.mkdir(exist_ok=True)
+    target = directory / _join_file(jwst, tolerance_arcsec)
+    if target.exists():
+        remove_columnar(target)
+    write_columnar(join, target)
+
+
+def load_observations(path, version, jwst, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """JWST join table of a snapshot version, as stored by `save_observations()`, or None."""
+    path = resolve_dataset_path(path)
+    target = _results_dir(path, _snapshot_info(path, version)) / _join_file(jwst, tolerance_arcsec)
+    if not target.exists():
+        return None
+    try:
+        return read_columnar(target)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+
+
+# ------------------------ DIFFS ------------------------
+def _row_keys(df, key):
+    # Planet name plus occurrence number, so repeated names (JWST programs) pair up in order
+    names = df[key].astype(object).where(df[key].notna(), '').astype(str)
+    return pd.Index(names + '\0' + names.groupby(names).cumcount().astype(str))
+
+
+def _differs(old, new):
+    # Element-wise "value changed", missing values comparing equal to each other
+    old, new = old.reset_index(drop=True), new.reset_index(drop=True)
+    missing = old.isna().to_numpy() & new.isna().to_numpy()
+    if old.dtype.kind in 'biuf' and new.dtype.kind in 'biuf':
+        equal = old.to_numpy(dtype=float, na_value=np.nan) == new.to_numpy(dtype=float, na_value=np.nan)
+    else:
+        equal = (old.astype(object).to_numpy() == new.astype(object).to_numpy())
+    return ~(equal | missing)
+
+
+def diff_catalogs(old, new, key=DEFAULT_KEY):
+    """Row-level differences between two versions of a catalog, planets matched on `key`."""
+    old_rows = _row_keys(old, key).get_indexer(_row_keys(new, key))
+    matched = np.flatnonzero(old_rows >= 0)
+    added = np.flatnonzero(old_rows < 0)
+
+    present = np.zeros(len(old), dtype=bool)
+    present[old_rows[matched]] = True
+    removed = np.flatnonzero(~present)
+
+    changed = np.zeros(len(matched), dtype=bool)
+    columns = []
+    for column in [c for c in new.columns if c in old.columns]:
+        differs = _differs(old[column].take(old_rows[matched]), new[column].take(matched))
+        if differs.any():
+            changed |= differs
+            columns.append(column)
+
+    schema = tuple(c for c in new.columns if c not in old.columns) + tuple(c for c in old.columns if c not in new.columns)
+    return CatalogDiff(key, added, removed, matched[changed], old_rows, tuple(columns), schema)
+
+
+def diff_summary(diff, old, new):
+    """One row per added, removed or changed planet: its key, status and new/old row positions."""
+    rows = [
+        pd.DataFrame({diff.key: new[diff.key].to_numpy()[diff.added], 'status': 'added',
+                      'row': diff.added, 'old_row': -1}),
+        pd.DataFrame({diff.key: old[diff.key].to_numpy()[diff.removed], 'status': 'removed',
+                      'row': -1, 'old_row': diff.removed}),
+        pd.DataFrame({diff.key: new[diff.key].to_numpy()[diff.changed], 'status': 'changed',
+                      'row': diff.changed, 'old_row': diff.old_rows[diff.changed]}),
+    ]
+    return pd.concat(rows, ignore_index=True)
+
+
+
+
+# ------------------------ INCREMENTAL UPDATES ------------------------
+def _recheck(diff, columns):
+    # New rows whose result may differ from the old version for a computation reading `columns`
+    if set(columns) & set(diff.columns):
+        return np.union1d(diff.added, diff.changed)
+    return diff.added
+
+
+def _carried(diff, recheck):
+    # New rows that keep the result of their old row
+    carried = diff.old_rows >= 0
+    carried[recheck] = False
+    return np.flatnonzero(carried)
+
+
+def update_selection(old, new, diff, plan, previous=None):
+    """
+    Rows a compiled filter plan selects on `new`, from its selection on
+    `old` (`previous`, e.g. from `load_selection()`; evaluated on `old` when
+    None): only rows added or changed in a column the plan reads are
+    evaluated. The result is stored in the selection cache of `new`.
+    """
+    columns = plan_columns(plan)
+    if set(columns) & set(diff.schema):
+        return cached_plan_index(new, plan)
+
+    selected = np.zeros(len(old), dtype=bool)
+    selected[cached_plan_index(old, plan) if previous is None else previous] = True
+    recheck = _recheck(diff, columns)
+    carried = _carried(diff, recheck)
+    carried = carried[selected[diff.old_rows[carried]]]
+
+    if len(recheck):
+        recheck = recheck[evaluate_plan(new[list(columns)].take(recheck), plan)]
+    return store_plan_index(new, plan, np.sort(np.concatenate([carried, recheck])))
+
+
+def update_observations(old, new, diff, jwst, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC, previous=None):
+    """
+    JWST join table of `new` (see `crossmatch.jwst_observations()`) from the
+    one of `old` (`previous`, e.g. from `load_observations()`; matched on
+    `old` when None): only planets added or changed in their name,
+    coordinates or period are matched again. The result is stored in the
+    cross-match cache.
+    """
+    if set(MATCH_COLUMNS) & set(diff.schema):
+        return jwst_observations(new, jwst, tolerance_arcsec)
+
+    recheck = _recheck(diff, MATCH_COLUMNS)
+    carried = _carried(diff, recheck)
+    new_rows = np.full(len(old), -1, dtype=np.intp)
+    new_rows[diff.old_rows[carried]] = carried
+
+    if previous is None:
+        previous = jwst_observations(old, jwst, tolerance_arcsec)
+    kept = previous[new_rows[previous['row'].to_numpy()] >= 0].copy()
+    kept['row'] = new_rows[kept['row'].to_numpy()]
+
+    columns = [c for c in new.columns if c in MATCH_COLUMNS]
+    matched = jwst_observations(new[columns].take(recheck).reset_index(drop=True), jwst, tolerance_arcsec).copy()
+    matched['row'] = recheck[matched['row'].to_numpy()]
+
+    join = pd.concat([kept, matched] if len(matched) else [kept], ignore_index=True)
+    join['pl_name'] = new['pl_name'].to_numpy()[join['row'].to_numpy()]
+    join = join.sort_values(['row', 'match'], kind='stable').reset_index(drop=True)
+    return store_observations(new, jwst, join, tolerance_arcsec)
+
+
+def _stored_selection(path, version, df, plan):
+    # Selection of a plan on a snapshot version: stored, or computed and stored
+    rows = load_selection(path, version, plan)
+    if rows is not None:
+        return store_plan_index(df, plan, rows)
+    rows = cached_plan_index(df, plan)
+    save_selection(path, version, plan, rows)
+    return rows
+
+
+def _stored_observations(path, version, df, jwst, tolerance_arcsec):
+    # JWST join table of a snapshot version: stored, or matched and stored
+    join = load_observations(path, version, jwst, tolerance_arcsec)
+    if join is not None:
+        return store_observations(df, jwst, join, tolerance_arcsec)
+    join = jwst_observations(df, jwst, tolerance_arcsec)
+    save_observations(path, version, jwst, join, tolerance_arcsec)
+    return join
+
+
+def refresh_catalog(path=None, presets=None, jwst=None, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+    """
+    Snapshot a refreshed catalog and bring the results up to date from the
+    ones stored with the previous version: the selections of `presets` (all
+    presets of `utils.presets` whose columns the catalog has, by default)
+    and, given a JWST program table, the cross-match. The new results are
+    stored with the new version. Returns a `CatalogUpdate`; its `diff` is
+    None when there was no previous version or nothing changed.
+    """
+    from utils.presets import ALL_PRESET_FILTERS
+
+    path = resolve_dataset_path(path)
+    versions = _read_versions(path)
+    new = shared_dataset(path)
+    snapshot = take_snapshot(path, new)
+    previous = versions[-1] if versions and versions[-1].sha1 != snapshot.sha1 else None
+
+    presets = ALL_PRESET_FILTERS if presets is None else presets
+    plans = {name: compile_filters(**filters) for name, filters in presets.items()}
+    plans = {name: plan for name, plan in plans.items() if set(plan_columns(plan)) <= set(new.columns)}
+    match = jwst is not None and 'pl_name' in new
+
+    if previous is None:
+        selections = {name: _stored_selection(path, snapshot.version, new, plan) for name, plan in plans.items()}
+        observations = _stored_observations(path, snapshot.version, new, jwst, tolerance_arcsec) if match else None
+        return CatalogUpdate(snapshot, None, None, selections, observations)
+
+    old = load_snapshot(path, previous.version)
+    diff = diff_catalogs(old, new, SNAPSHOT_KEYS.get(path.name, DEFAULT_KEY))
+
+    selections = {}
+    for name, plan in plans.items():
+        rows = update_selection(old, new, diff, plan, load_selection(path, previous.version, plan))
+        save_selection(path, snapshot.version, plan, rows)
+        selections[name] = rows
+
+    observations = None
+    if match:
+        stored = load_observations(path, previous.version, jwst, tolerance_arcsec)
+        observations = update_observations(old, new, diff, jwst, tolerance_arcsec, stored)
+        save_observations(path, snapshot.version, jwst, observations, tolerance_arcsec)
+    return CatalogUpdate(snapshot, previous, diff, selections, observations)
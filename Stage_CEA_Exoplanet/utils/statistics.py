@@ -0,0 +1,247 @@
+"""
+Column Statistics Module
+------------------------------------------------
+This module computes per-column statistics of a catalog: row and null
+counts, number of distinct values, min/max and a histogram for numeric
+columns, and value frequencies for text and categorical columns (e.g.
+`disc_facility`, `st_spectype`).
+
+Statistics are computed lazily, once per column of a given DataFrame
+object, and are checked against the current data of the column on every use
+(`column_version()`): a column edited in place or reassigned gets fresh
+statistics, so the planner never works from stale ones. That check relies on
+pandas copy-on-write (pandas >= 3, or `pd.options.mode.copy_on_write = True`);
+without it an edit cannot be detected short of rehashing the column, so
+statistics are recomputed on every call and the planner does without them
+(see `tracks_edits()`). They serve the filter
+planner of `utils.filters`: `estimate_selectivity()` predicts the fraction
+of rows a predicate keeps, and `is_unsatisfiable()` proves from min/max or
+the frequency table that a predicate keeps none.
+
+Usage:
+    stats = column_statistics(df, "st_teff")
+    summary = statistics_summary(df, ["st_teff", "pl_rade", "disc_facility"])
+    estimate_selectivity(df, Predicate("gt", ("st_teff",), 6000))
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import numbers
+import weakref
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------ CONFIGURATION ------------------------
+HISTOGRAM_BINS = 64
+
+# Text columns keep the frequencies of at most this many values
+MAX_CATEGORIES = 256
+
+# Selectivity assumed for predicates the statistics cannot estimate
+DEFAULT_SELECTIVITY = 0.5
+
+# `edges`/`counts` are None for text columns, `frequencies` (value -> fraction
+# of all rows) is None for numeric ones; `complete` tells whether
+# `frequencies` lists every value of the column.
+ColumnStatistics = namedtuple(
+    "ColumnStatistics",
+    ["rows", "nulls", "distinct", "min", "max", "edges", "counts", "frequencies", "complete"],
+)
+
+_statistics = {}    # id(DataFrame) -> {column: (version, column Series, ColumnStatistics)}
+
+
+
+
+# ------------------------ COLUMN VERSIONS ------------------------
+def _copy_on_write():
+    # Always on from pandas 3, an option before
+    return int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+
+def tracks_edits():
+    """Whether `column_version()` detects in-place edits (pandas copy-on-write is on)."""
+    return _copy_on_write()
+
+
+def column_version(values):
+    """
+    Token of the data of a column (a Series taken from the frame), which
+    changes when the column is reassigned or edited in place. Caches keep the
+    Series they were computed from alongside the token: pandas copy-on-write
+    then copies the frame's column before any in-place edit, so an edited
+    column no longer shares its data (address, or array object) with it.
+    Without copy-on-write the token is None: nothing cached may be reused.
+    """
+    if not _copy_on_write():
+        return None
+    if isinstance(values.dtype, np.dtype):
+        array = values.to_numpy()
+        return (len(array), str(array.dtype), array.__array_interface__['data'][0], array.strides)
+    return (len(values), str(values.dtype), id(values.array))
+
+
+
+
+# ------------------------ STATISTICS ------------------------
+def _is_numeric(values):
+    return values.dtype.kind in 'biuf' and not isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def _numeric_statistics(values):
+    array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    present = array[~np.isnan(array)]
+    if present.size == 0:
+        return ColumnStatistics(len(array), len(array), 0, None, None, None, None, None, True)
+
+    finite = present[np.isfinite(present)]
+    counts, edges = np.histogram(finite, bins=HISTOGRAM_BINS) if finite.size else (None, None)
+    return ColumnStatistics(
+        rows=len(array), nulls=len(array) - present.size, distinct=len(np.unique(present)),
+        min=float(present.min()), max=float(present.max()),
+        edges=edges, counts=counts, frequencies=None, complete=False,
+    )
+
+
+def _text_statistics(values):
+    counts = values.value_counts(dropna=True)
+    counts = counts[counts > 0]     # unused categories of a categorical
+    rows = len(values)
+    nulls = int(values.isna().sum())
+    frequencies = (counts.iloc[:MAX_CATEGORIES] / rows).to_dict() if rows else {}
+    return ColumnStatistics(
+        rows=rows, nulls=nulls, distinct=len(counts), min=None, max=None,
+        edges=None, counts=None, frequencies=frequencies, complete=len(counts) <= MAX_CATEGORIES,
+    )
+
+
+def column_statistics(df, column):
+    """Statistics of one column of `df`, computed on first use and after each change of the column."""
+    key = id(df)
+    if key not in _statistics:
+        _statistics[key] = {}
+        weakref.finalize(df, _statistics.pop, key, None)
+
+    columns, values = _statistics[key], df[column]
+    version = column_version(values)
+    if version is None or column not in columns or columns[column][0] != version:
+        stats = _numeric_statistics(values) if _is_numeric(values) else _text_statistics(values)
+        if version is None:
+            return stats
+        columns[column] = (version, values, stats)
+    return columns[column][2]
+
+
+def statistics_summary(df, columns=None):
+    """One row of statistics per column: nulls, distinct values, min and max."""
+    columns = df.columns if columns is None else columns
+    rows = {}
+    for column in columns:
+        stats = column_statistics(df, column)
+        rows[column] = dict(rows=stats.rows, nulls=stats.nulls, distinct=stats.distinct,
+                            min=stats.min, max=stats.max)
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def forget_statistics(df):
+    """Drop the cached statistics of a frame, to free them."""
+    _statistics.pop(id(df), None)
+
+
+
+
+# ------------------------ ESTIMATES ------------------------
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _fraction_below(stats, value):
+    # Fraction of the non-null values below `value`, interpolated in the histogram
+    if stats.edges is None:
+        return 0.0 if value < stats.min else 1.0
+    cumulative = np.concatenate([[0], np.cumsum(stats.counts)]) / max(stats.counts.sum(), 1)
+    return float(np.interp(value, stats.edges, cumulative))
+
+
+def _text_fraction(stats, values):
+    # Fraction of all rows equal to one of `values`
+    seen = sum(stats.frequencies.get(v, 0.0) for v in values)
+    if stats.complete:
+        return seen
+    listed = sum(stats.frequencies.values())
+    rest = max(1.0 - stats.nulls / stats.rows - listed, 0.0)
+    unseen = sum(v not in stats.frequencies for v in values)
+    return seen + unseen * rest / max(stats.distinct - len(stats.frequencies), 1)
+
+
+def estimate_selectivity(df, predicate):
+    """Estimated fraction of the rows of `df` kept by a filter predicate."""
+    if predicate.op == 'expr':
+        present = min(1 - column_statistics(df, c).nulls / max(column_statistics(df, c).rows, 1)
+                      for c in predicate.columns)
+        return DEFAULT_SELECTIVITY * present
+
+    stats = column_statistics(df, predicate.columns[0])
+    if stats.rows == 0 or stats.nulls == stats.rows:
+        return 0.0
+    present = 1 - stats.nulls / stats.rows
+    op, value = predicate.op, predicate.value
+
+    if stats.frequencies is not None:
+        if op == 'eq':
+            return _text_fraction(stats, [value])
+        if op == 'ne':
+            return present - _text_fraction(stats, [value])
+        if op == 'isin':
+            return _text_fraction(stats, value)
+        if op == 'startswith':
+            return _text_fraction(stats, [v for v in stats.frequencies if str(v).startswith(value)]) \
+                if stats.complete else DEFAULT_SELECTIVITY * present
+        return DEFAULT_SELECTIVITY * present
+
+    if op in ('gt', 'ge', 'lt', 'le') and _is_number(value):
+        below = _fraction_below(stats, value)
+        return present * (1 - below if op in ('gt', 'ge') else below)
+    if op in ('eq', 'isin'):
+        return present * min(len(value) if op == 'isin' else 1, stats.distinct) / max(stats.distinct, 1)
+    if op == 'ne':
+        return present * (1 - 1 / max(stats.distinct, 1))
+    return DEFAULT_SELECTIVITY * present
+
+
+def is_unsatisfiable(df, predicate):
+    """
+    True when the statistics prove that `predicate` keeps no row of `df`:
+    a range cut beyond the column min/max, a value absent from a complete
+    frequency table, or a column with no values at all.
+    """
+    if predicate.op == 'expr':
+        # Arithmetic may turn missing values into numbers (e.g. x ** 0): never assume
+        return False
+
+    stats = column_statistics(df, predicate.columns[0])
+    if stats.nulls == stats.rows:
+        # Missing values satisfy no predicate
+        return True
+    op, value = predicate.op, predicate.value
+
+    if stats.frequencies is not None:
+        if not stats.complete:
+            return False
+        if op == 'eq':
+            return value not in stats.frequencies
+        if op == 'isin':
+            return not any(v in stats.frequencies for v in value)
+        if op == 'startswith':
+            return not any(str(v).startswith(value) for v in stats.frequencies)
+        return False
+
+    if not _is_number(value) or np.isnan(value):
+        return False
+    return ((op == 'gt' and value >= stats.max) or (op == 'ge' and value > stats.max)
+            or (op == 'lt' and value <= stats.min) or (op == 'le' and value < stats.min)
+            or (op == 'eq' and not stats.min <= value <= stats.max))
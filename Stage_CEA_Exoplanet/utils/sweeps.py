@@ -0,0 +1,206 @@
+"""
+Parameter Sweep Module
+------------------------------------------------
+This module sweeps the thresholds of a filter configuration (e.g. the
+`rade_err` / `mass_err` cuts of `Luque_Paille_2022`, or `kp` / `b` for
+`Fulton_2017` on a catalog with `sy_kepmag` and `pl_imppar`) over a grid and evaluates, on every grid point, the sample
+size and downstream statistics: category counts and Gaussian fits of the
+density ratio, and the slope of the radius-period relation in log space
+(`utils.regression`).
+
+The grid is any set of `apply_filters()` keyword arguments. Predicates
+shared by every grid point are evaluated once, on the whole catalog
+(through the planner and sorted indexes of `utils.filters`); the sweep then
+runs on the rows they keep only, where each distinct varying predicate
+(e.g. `rade_err < 0.08`) is evaluated once and its mask reused by every
+grid point using it. Grid points are spread across a process pool when
+`workers` > 1.
+
+Usage:
+    grid = parameter_grid(rade_err=[0.04, 0.08, 0.12], mass_err=[0.15, 0.25, 0.35])
+    result = sweep_filters(grid, base="paper/Luque_Paille_2022", workers=4)
+    result.pivot(index="rade_err", columns="mass_err", values="n")
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.classification import CATEGORY_LABELS, catalog_density_ratio, classify_planets
+from utils.filters import compile_filters, evaluate_plan, evaluate_predicate, plan_columns
+from utils.regression import fit_lines
+
+
+# ------------------------ CONFIGURATION ------------------------
+# Grids smaller than this run in-process whatever `workers` is
+PARALLEL_MIN_POINTS = 64
+
+# `function(frame, rows)` returns a dict of values for the rows of `frame`
+# selected at one grid point; `columns` lists the catalog columns it reads
+Statistic = namedtuple("Statistic", ["function", "columns"])
+
+_state = {}     # per-process sweep state: frame, plans, statistics, predicate masks
+
+
+
+
+# ------------------------ STATISTICS ------------------------
+def _label(category):
+    return category.lower().replace(' ', '_').replace('-', '_')
+
+
+def _values(frame, column, rows):
+    return frame[column].to_numpy(dtype=float, na_value=np.nan)[rows]
+
+
+def sample_size(frame, rows):
+    """Number of planets selected."""
+    return {'n': len(rows)}
+
+
+def density_categories(frame, rows):
+    """
+    Count, mean and width (Gaussian fit, as `uncertainty.category_fits()`) of
+    the density ratio in each composition category, the ratio coming from
+    `classification.catalog_density_ratio()`.
+    """
+    mass = _values(frame, 'pl_bmasse', rows)
+    ratio = catalog_density_ratio(frame.iloc[rows])
+    keep = np.isfinite(ratio)
+    mass, ratio = mass[keep], ratio[keep]
+    labels = classify_planets(mass, ratio)
+
+    values = {}
+    for k, category in enumerate(CATEGORY_LABELS):
+        label, members = _label(category), ratio[labels == k]
+        values[f"{label}_count"] = len(members)
+        values[f"{label}_mu"] = members.mean() if len(members) else np.nan
+        values[f"{label}_std"] = members.std() if len(members) else np.nan
+    return values
+
+
+def radius_period_slope(frame, rows):
+    """Slope (with its standard error) and intercept of log10(radius) against log10(period)."""
+    fit, = fit_lines(_values(frame, 'pl_orbper', rows), _values(frame, 'pl_rade', rows))
+    return {'slope': fit.slope, 'slope_err': fit.slope_err, 'intercept': fit.intercept}
+
+
+SWEEP_STATISTICS = {
+    'sample_size': Statistic(sample_size, ()),
+    'density_categories': Statistic(density_categories, ('pl_bmasse', 'pl_dens', 'pl_rade')),
+    'radius_period_slope': Statistic(radius_period_slope, ('pl_orbper', 'pl_rade')),
+}
+
+
+
+
+# ------------------------ GRID ------------------------
+def parameter_grid(**axes):
+    """Every combination of the values of each keyword (one dict per grid point, last keyword fastest)."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def _base_filters(base):
+    from utils.presets import ALL_PRESET_FILTERS
+
+    if base is None:
+        return {}
+    if isinstance(base, str):
+        return dict(ALL_PRESET_FILTERS[base])
+    return dict(base)
+
+
+def _statistics(statistics):
+    if isinstance(statistics, dict):
+        return dict(statistics)
+    return {name: SWEEP_STATISTICS[name] for name in statistics}
+
+
+
+
+# ------------------------ EVALUATION ------------------------
+def _init_sweep(frame, plans, statistics):
+    _state.clear()
+    _state.update(frame=frame, plans=plans, statistics=statistics, masks={})
+
+
+def _point_rows(plan):
+    # Rows of the swept frame kept by a plan, from the shared predicate masks
+    frame, masks = _state['frame'], _state['masks']
+    mask = np.ones(len(frame), dtype=bool)
+    for predicate in plan:
+        if predicate not in masks:
+            masks[predicate] = evaluate_predicate(frame, predicate)
+        mask &= masks[predicate]
+    return np.flatnonzero(mask)
+
+
+def _evaluate_points(points):
+    results = []
+    for point in points:
+        rows = _point_rows(_state['plans'][point])
+        values = {}
+        for statistic in _state['statistics'].values():
+            values.update(statistic.function(_state['frame'], rows))
+        results.append(values)
+    return results
+
+
+def _batches(n_points, workers):
+    size = max(1, n_points // (4 * workers))
+    return [range(start, min(start + size, n_points)) for start in range(0, n_points, size)]
+
+
+def sweep_filters(grid, base=None, df=None, statistics=tuple(SWEEP_STATISTICS), workers=None):
+    """
+    Evaluate `statistics` on every point of a grid of filter configurations.
+
+    `grid` is a list of `apply_filters()` keyword dicts (see
+    `parameter_grid()`), each overriding the `base` configuration (a dict or
+    an `ALL_PRESET_FILTERS` name such as "paper/Luque_Paille_2022"). `statistics`
+    names entries of `SWEEP_STATISTICS` or maps names to `Statistic`s.
+    Returns a tidy DataFrame: one row per grid point, the swept keywords
+    followed by one column per statistic value.
+    """
+    from utils.datasets import shared_dataset
+
+    df = shared_dataset() if df is None else df
+    base = _base_filters(base)
+    statistics = _statistics(statistics)
+    grid = [dict(point) for point in grid]
+    if not grid:
+        raise ValueError("Empty parameter grid")
+    parameters = list(dict.fromkeys(name for point in grid for name in point))
+
+    plans = [compile_filters(**{**base, **point}) for point in grid]
+    shared = set.intersection(*map(set, plans))
+    varying = [tuple(predicate for predicate in plan if predicate not in shared) for plan in plans]
+
+    # Predicates common to every grid point: evaluated once on the whole catalog
+    rows = np.flatnonzero(evaluate_plan(df, tuple(p for p in plans[0] if p in shared)))
+    columns = set(plan_columns([p for plan in varying for p in plan]))
+    columns.update(c for statistic in statistics.values() for c in statistic.columns)
+    frame = df[[c for c in df.columns if c in columns]].take(rows).reset_index(drop=True)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(grid) < PARALLEL_MIN_POINTS:
+        _init_sweep(frame, varying, statistics)
+        try:
+            values = _evaluate_points(range(len(grid)))
+        finally:
+            _state.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep,
+                                 initargs=(frame, varying, statistics)) as pool:
+            values = [v for batch in pool.map(_evaluate_points, _batches(len(grid), workers)) for v in batch]
+
+    result = pd.DataFrame([{name: point.get(name) for name in parameters} for point in grid], columns=parameters)
+    return pd.concat([result, pd.DataFrame(values, index=result.index)], axis=1)
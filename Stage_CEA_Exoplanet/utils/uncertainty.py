@@ -0,0 +1,329 @@
+"""
+Monte-Carlo Uncertainty Propagation Module
+------------------------------------------------
+This module propagates the asymmetric catalog errors (`*err1` upper,
+`*err2` lower) to derived quantities without a Python loop per planet.
+
+For every planet, N realisations are drawn at once from a split normal
+distribution into a (n_planets x N) float32 array. Planets are processed in
+row chunks sized to a memory budget, on a thread pool (NumPy releases the
+GIL in the sampling and array kernels). Each chunk has its own random
+stream, so results are reproducible for a given seed and memory budget,
+whatever the number of workers.
+
+`propagate_density_classification()` derives the density ratio from the
+sampled mass and radius, classifies every realisation with
+`classification.classify_planets()` and returns per-planet percentiles,
+class probabilities, and the distribution over realisations of the
+per-category Gaussian fits drawn on the density histogram.
+
+`bootstrap_category_fits()` and `jackknife_category_fits()` resample the
+filtered sample itself to give confidence intervals on those Gaussian fits
+(summarised by `fit_intervals()`), as vectorised batched statistics.
+
+Usage:
+    result = propagate_density_classification(sample, n_samples=10_000, seed=1)
+    result.summary                       # one row per planet
+    result.category_fits['Earth-like']   # one row per realisation
+    fit_intervals(bootstrap_category_fits(sample, n_boot=5000, seed=1))
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.classification import (
+    CATEGORY_LABELS, catalog_density_ratio, classify_planets, density_ratio_from_mass_radius
+)
+
+
+# ------------------------ CONFIGURATION ------------------------
+# Catalog value -> (upper error, lower error) columns
+UNCERTAIN_COLUMNS = {
+    'pl_rade':   ('pl_radeerr1', 'pl_radeerr2'),
+    'pl_bmasse': ('pl_bmasseerr1', 'pl_bmasseerr2'),
+    'st_rad':    ('st_raderr1', 'st_raderr2'),
+    'st_teff':   ('st_tefferr1', 'st_tefferr2'),
+    'pl_orbper': ('pl_orbpererr1', 'pl_orbpererr2'),
+}
+
+DEFAULT_PERCENTILES = (16, 50, 84)
+
+# Memory budget (bytes) of one chunk; at most `workers` chunks run at once
+DEFAULT_MAX_MEMORY = 128 * 2**20
+
+# Number of (chunk x N) float32 arrays alive at once while processing a chunk
+_ARRAYS_PER_CHUNK = 6
+
+MonteCarloResult = namedtuple("MonteCarloResult", ["summary", "category_fits"])
+
+
+
+
+# ------------------------ SAMPLING ------------------------
+def sample_asymmetric(value, err_upper, err_lower, n_samples, rng=None, dtype=np.float32):
+    """
+    Draw `n_samples` realisations of each value from a split normal
+    distribution: the upper error scales positive deviations and the lower
+    error negative ones. Missing errors count as zero. Returns an array of
+    shape (len(value), n_samples).
+    """
+    rng = np.random.default_rng(rng)
+    value = np.asarray(value, dtype=dtype)[:, None]
+    upper = np.nan_to_num(np.abs(np.asarray(err_upper, dtype=dtype)))[:, None]
+    lower = np.nan_to_num(np.abs(np.asarray(err_lower, dtype=dtype)))[:, None]
+
+    samples = rng.standard_normal((len(value), n_samples), dtype=dtype)
+    samples *= np.where(samples > 0, upper, lower)
+    samples += value
+    return samples
+
+
+def sample_column(df, column, n_samples, rng=None):
+    """Realisations of a catalog column using its `UNCERTAIN_COLUMNS` error columns."""
+    err_upper, err_lower = UNCERTAIN_COLUMNS[column]
+    return sample_asymmetric(df[column], df[err_upper], df[err_lower], n_samples, rng)
+
+
+def chunk_rows(n_samples, max_memory=DEFAULT_MAX_MEMORY):
+    """Number of planets per chunk keeping a chunk within `max_memory` bytes."""
+    per_row = _ARRAYS_PER_CHUNK * n_samples * np.dtype(np.float32).itemsize
+    return max(1, int(max_memory // per_row))
+
+
+
+
+# ------------------------ STATISTICS ------------------------
+def row_percentiles(samples, percentiles=DEFAULT_PERCENTILES):
+    """Percentiles of each row, ignoring NaN realisations (linear interpolation)."""
+    ordered = np.sort(samples, axis=1)          # NaN are sorted last
+    valid = np.count_nonzero(~np.isnan(samples), axis=1)
+
+    result = np.full((len(samples), len(percentiles)), np.nan)
+    rows = np.flatnonzero(valid)
+    if rows.size == 0:
+        return result
+
+    ordered, valid = ordered[rows], valid[rows]
+    for i, q in enumerate(percentiles):
+        position = q / 100 * (valid - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, valid - 1)
+        frac = position - low
+        v_low = np.take_along_axis(ordered, low[:, None], axis=1)[:, 0]
+        v_high = np.take_along_axis(ordered, high[:, None], axis=1)[:, 0]
+        result[rows, i] = v_low + frac * (v_high - v_low)
+    return result
+
+
+def _category_moments(ratio, labels, valid):
+    # Per-realisation count, sum and sum of squares of the density ratio in each category
+    moments = np.zeros((len(CATEGORY_LABELS), 3, ratio.shape[1]))
+    for k in range(len(CATEGORY_LABELS)):
+        in_category = valid & (labels == k)
+        values = np.where(in_category, ratio, 0)
+        moments[k, 0] = in_category.sum(axis=0)
+        moments[k, 1] = values.sum(axis=0, dtype=np.float64)
+        moments[k, 2] = np.square(values, out=values).sum(axis=0, dtype=np.float64)
+    return moments
+
+
+
+
+# ------------------------ PROPAGATION ------------------------
+def _propagate_chunk(mass, mass_err, radius, radius_err, n_samples, seed, percentiles, thresholds):
+    rng = np.random.default_rng(seed)
+    mass_samples = sample_asymmetric(mass, *mass_err, n_samples, rng)
+    radius_samples = sample_asymmetric(radius, *radius_err, n_samples, rng)
+
+    # Non-physical draws (mass or radius <= 0) are discarded
+    valid = (mass_samples > 0) & (radius_samples > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = density_ratio_from_mass_radius(mass_samples, radius_samples)
+    ratio[~valid] = np.nan
+    del radius_samples
+
+    labels = classify_planets(mass_samples, ratio, **thresholds)
+    del mass_samples
+
+    n_valid = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probabilities = np.stack(
+            [(valid & (labels == k)).sum(axis=1) / n_valid for k in range(len(CATEGORY_LABELS))],
+            axis=1
+        )
+
+    return row_percentiles(ratio, percentiles), probabilities, _category_moments(ratio, labels, valid)
+
+
+def propagate_density_classification(df, n_samples=10_000, percentiles=DEFAULT_PERCENTILES,
+                                     seed=None, workers=None, max_memory=DEFAULT_MAX_MEMORY,
+                                     **thresholds):
+    """
+    Monte-Carlo propagation of mass and radius errors to the density ratio
+    and the planet classification.
+
+    Returns a `MonteCarloResult` with:
+        summary       : DataFrame indexed like `df`, with density ratio
+                        percentiles and the probability of each category,
+        category_fits : dict category -> DataFrame with one row per
+                        realisation (count, mu, std of the Gaussian fit).
+
+    Extra keyword arguments are forwarded to `classify_planets()` thresholds.
+    """
+    workers = workers or os.cpu_count() or 1
+    rows = chunk_rows(n_samples, max_memory)
+    starts = range(0, len(df), rows)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+
+    columns = {column: df[column].to_numpy(dtype=np.float32, na_value=np.nan)
+               for column in ('pl_bmasse', 'pl_rade', *UNCERTAIN_COLUMNS['pl_bmasse'], *UNCERTAIN_COLUMNS['pl_rade'])}
+
+    def run(i, start):
+        chunk = slice(start, start + rows)
+        return _propagate_chunk(
+            columns['pl_bmasse'][chunk],
+            [columns[c][chunk] for c in UNCERTAIN_COLUMNS['pl_bmasse']],
+            columns['pl_rade'][chunk],
+            [columns[c][chunk] for c in UNCERTAIN_COLUMNS['pl_rade']],
+            n_samples, seeds[i], percentiles, thresholds
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, range(len(starts)), starts))
+
+    moments = np.zeros((len(CATEGORY_LABELS), 3, n_samples))
+    for _, _, chunk_moments in results:
+        moments += chunk_moments
+
+    if results:
+        ratio_percentiles = np.concatenate([r[0] for r in results])
+        probabilities = np.concatenate([r[1] for r in results])
+    else:
+        ratio_percentiles = np.empty((0, len(percentiles)))
+        probabilities = np.empty((0, len(CATEGORY_LABELS)))
+
+    summary = pd.DataFrame(index=df.index)
+    for i, q in enumerate(percentiles):
+        summary[f'density_ratio_p{q:g}'] = ratio_percentiles[:, i]
+    for k, label in enumerate(CATEGORY_LABELS):
+        summary[f'p_{label}'] = probabilities[:, k]
+
+    category_fits = {}
+    for k, label in enumerate(CATEGORY_LABELS):
+        count, total, total_sq = moments[k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mu = total / count
+            std = np.sqrt(np.maximum(total_sq / count - mu ** 2, 0))
+        category_fits[label] = pd.DataFrame({'count': count.astype(np.int64), 'mu': mu, 'std': std})
+
+    return MonteCarloResult(summary, category_fits)
+
+
+
+
+# ------------------------ BOOTSTRAP AND JACKKNIFE ------------------------
+# Resampling of the per-category Gaussian fits of the density histogram
+# (`plots.plot_histogram_density_Mtype_with_gauss`). Every replicate only
+# needs the count, sum and sum of squares of the density ratio per category,
+# so all replicates are computed as one matrix product between resampling
+# weights and those per-planet contributions, without refitting in a loop.
+def _category_contributions(df, thresholds):
+    # Per-planet (count, x, x^2) in each category, shape (n_planets, n_categories * 3)
+    mass = df['pl_bmasse'].to_numpy(dtype=float, na_value=np.nan)
+    ratio = catalog_density_ratio(df)
+    keep = np.isfinite(ratio)
+    mass, ratio = mass[keep], ratio[keep]
+
+    labels = classify_planets(mass, ratio, **thresholds)
+    contributions = np.zeros((len(ratio), len(CATEGORY_LABELS) * 3))
+    for k in range(len(CATEGORY_LABELS)):
+        in_category = labels == k
+        contributions[:, 3 * k] = in_category
+        contributions[:, 3 * k + 1] = np.where(in_category, ratio, 0)
+        contributions[:, 3 * k + 2] = np.where(in_category, ratio ** 2, 0)
+    return contributions
+
+
+def _fits_from_moments(moments):
+    # Gaussian maximum-likelihood fit (as `scipy.stats.norm.fit`) from summed moments
+    fits = {}
+    for k, label in enumerate(CATEGORY_LABELS):
+        count, total, total_sq = moments[:, 3 * k], moments[:, 3 * k + 1], moments[:, 3 * k + 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mu = total / count
+            std = np.sqrt(np.maximum(total_sq / count - mu ** 2, 0))
+        fits[label] = pd.DataFrame({'count': np.rint(count).astype(np.int64), 'mu': mu, 'std': std})
+    return fits
+
+
+def category_fits(df, **thresholds):
+    """Per-category Gaussian fit (count, mu, std) of the density ratio on the sample itself."""
+    moments = _category_contributions(df, thresholds).sum(axis=0, keepdims=True)
+    return _fits_from_moments(moments)
+
+
+def bootstrap_category_fits(df, n_boot=5000, seed=None, max_memory=DEFAULT_MAX_MEMORY, **thresholds):
+    """
+    Bootstrap distribution of the per-category Gaussian fits: the planets
+    are resampled with replacement `n_boot` times. Returns a dict
+    category -> DataFrame with one row per replicate (count, mu, std).
+    """
+    rng = np.random.default_rng(seed)
+    contributions = _category_contributions(df, thresholds)
+    n = len(contributions)
+    if n == 0:
+        return _fits_from_moments(np.full((n_boot, contributions.shape[1]), np.nan))
+
+    # Replicates per batch so that the (batch x n) arrays alive at once (int64
+    # draws, int64 weights and their float64 copy) fit in max_memory
+    batch = max(1, int(max_memory // (3 * n * np.dtype(np.float64).itemsize)))
+
+    moments = np.empty((n_boot, contributions.shape[1]))
+    for start in range(0, n_boot, batch):
+        size = min(batch, n_boot - start)
+        draws = rng.integers(0, n, size=(size, n))
+        draws += np.arange(size)[:, None] * n
+        weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n)
+        moments[start:start + size] = weights.astype(np.float64) @ contributions
+
+    return _fits_from_moments(moments)
+
+
+def jackknife_category_fits(df, **thresholds):
+    """Leave-one-out fits: one row per removed planet, per category."""
+    contributions = _category_contributions(df, thresholds)
+    return _fits_from_moments(contributions.sum(axis=0) - contributions)
+
+
+def fit_intervals(fits, level=0.68, jackknife=False):
+    """
+    Summarise resampled fits into one row per category and parameter:
+    mean, standard error and central `level` interval. With `jackknife`,
+    the standard error uses the jackknife variance formula.
+    """
+    tail = (1 - level) / 2 * 100
+    rows = []
+    for label, replicates in fits.items():
+        for parameter in ('mu', 'std'):
+            values = replicates[parameter].to_numpy()
+            values = values[np.isfinite(values)]
+            if values.size == 0:
+                rows.append((label, parameter, np.nan, np.nan, np.nan, np.nan))
+                continue
+
+            if jackknife:
+                n = values.size
+                error = np.sqrt((n - 1) / n * np.sum((values - values.mean()) ** 2))
+            else:
+                error = values.std(ddof=1) if values.size > 1 else np.nan
+            low, high = np.percentile(values, [tail, 100 - tail])
+            rows.append((label, parameter, values.mean(), error, low, high))
+
+    return pd.DataFrame(rows, columns=['category', 'parameter', 'mean', 'error', 'low', 'high'])
@@ -0,0 +1,396 @@
+"""
+VOTable Reading Module
+------------------------------------------------
+This module reads the first table of a VOTable (such as `Dataset/planets.vot`,
+written by astropy) into a DataFrame with the same conventions as the CSV
+loaders: one column per FIELD (named after its `name` attribute), numeric
+FIELDs as float/int columns (integers with missing cells become floats),
+text and boolean FIELDs as object columns, missing cells as NaN.
+
+The file is fed to an XML parser in blocks and never built as a tree: rows
+are decoded as they are read, `chunksize` rows at a time, straight into typed
+NumPy buffers (one per requested column, FIELD datatype -> dtype), so memory
+stays bounded by the output chunk rather than the file. Unrequested columns
+are skipped. BINARY and BINARY2 streams (base64) are decoded incrementally as
+their text arrives, one `np.frombuffer` call per block of `chunksize` rows
+for fixed-size fields; variable-length fields fall back to a row-by-row
+decoder.
+
+Usage:
+    df = read_votable("Dataset/planets.vot")
+    df = read_votable(path, columns=["Planet Name", "Planet Mass [Mjup]"])
+    for chunk in iter_votable(path, chunksize=100_000):
+        ...
+
+Author: S.WITTMANN & V.REGNARD
+Repository: https://github.com/SimonWtmn/Stage_CEA_Exoplanet
+"""
+
+import base64
+import struct
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------ CONFIGURATION ------------------------
+CHUNK_ROWS = 100_000
+
+# Bytes of the file fed to the parser at a time, and base64 characters of a
+# BINARY stream buffered before decoding
+READ_BYTES = 1 << 20
+STREAM_CHARS = 1 << 20
+
+# FIELD datatype -> big-endian NumPy dtype of one element (BINARY layout)
+DATATYPES = {
+    'boolean': 'S1', 'unsignedByte': 'u1', 'short': '>i2', 'int': '>i4', 'long': '>i8',
+    'char': 'S1', 'unicodeChar': '>u2', 'float': '>f4', 'double': '>f8',
+    'floatComplex': '>c8', 'doubleComplex': '>c16',
+}
+TEXT_DATATYPES = ('char', 'unicodeChar')
+
+TRUE_VALUES = ('T', 't', '1', 'true', 'True', 'TRUE')
+FALSE_VALUES = ('F', 'f', '0', 'false', 'False', 'FALSE')
+
+Field = namedtuple("Field", ["name", "datatype", "count", "null"])
+
+
+
+
+# ------------------------ FIELDS ------------------------
+def _local(tag):
+    # Tag name without its XML namespace
+    return tag.rsplit('}', 1)[-1]
+
+
+def _field(attrib, null):
+    # Element count from `arraysize`: 1 for scalars, None for variable length ("*", "10*")
+    arraysize = attrib.get('arraysize')
+    if arraysize is None:
+        count = 1
+    elif '*' in arraysize or 'x' in arraysize:
+        count = None
+    else:
+        count = int(arraysize)
+    return Field(attrib.get('name') or attrib.get('ID'), attrib.get('datatype'), count, null)
+
+
+def _is_scalar(field):
+    return field.datatype in TEXT_DATATYPES or field.count == 1
+
+
+
+
+# ------------------------ COLUMN BUFFERS ------------------------
+def _text_column(values):
+    values = pd.Series(values, dtype=object)
+    return values.where(values != '', np.nan).to_numpy()
+
+
+def _boolean_column(values):
+    out = np.full(len(values), np.nan, dtype=object)
+    values = np.asarray(values)
+    out[np.isin(values, TRUE_VALUES)] = True
+    out[np.isin(values, FALSE_VALUES)] = False
+    return out
+
+
+def _numeric_column(cells, field):
+    # TABLEDATA cells -> typed array; empty or null cells become NaN
+    cells = np.asarray(cells, dtype=str)
+    missing = cells == ''
+    if field.null is not None:
+        missing |= cells == field.null
+
+    dtype = np.dtype(DATATYPES[field.datatype]).newbyteorder('=')
+    if dtype.kind in 'iu' and not missing.any():
+        return cells.astype(dtype)
+    cells = np.where(missing, 'nan', cells)
+    return cells.astype(np.complex128 if dtype.kind == 'c' else np.float64)
+
+
+def _tabledata_column(cells, field):
+    if field.datatype in TEXT_DATATYPES:
+        return _text_column(cells)
+    if field.datatype == 'boolean':
+        return _boolean_column([c.strip() for c in cells])
+    if not _is_scalar(field):
+        return np.array([np.array(c.split(), dtype=float) if c else np.nan for c in cells], dtype=object)
+    return _numeric_column([c.strip() for c in cells], field)
+
+
+def _frame(columns, names):
+    return pd.DataFrame({name: columns[name] for name in names}, columns=names)
+
+
+
+
+# ------------------------ BINARY STREAMS ------------------------
+def _fixed_dtype(fields):
+    return np.dtype([(f"f{i}", DATATYPES[f.datatype], (f.count,)) if f.count != 1 else (f"f{i}", DATATYPES[f.datatype])
+                     for i, f in enumerate(fields)])
+
+
+def _binary_column(values, field, null):
+    # Raw BINARY values of one field -> same column as the TABLEDATA path
+    if field.datatype == 'char':
+        values = values.reshape(len(values), -1) if values.ndim > 1 else values[:, None]
+        text = [b''.join(row).split(b'\0', 1)[0].decode('ascii', 'replace') for row in values]
+        return np.where(null, np.nan, _text_column(text)).astype(object)
+    if field.datatype == 'unicodeChar':
+        values = values.reshape(len(values), -1)
+        text = [row.astype('>u2').tobytes().decode('utf-16-be', 'replace').split('\0', 1)[0] for row in values]
+        return np.where(null, np.nan, _text_column(text)).astype(object)
+    if field.datatype == 'boolean':
+        return np.where(null, np.nan, _boolean_column([v.decode('ascii', 'replace') for v in values])).astype(object)
+    if not _is_scalar(field):
+        return np.array([np.nan if n else np.asarray(v, dtype=float) for v, n in zip(values, null)], dtype=object)
+
+    values = values.astype(values.dtype.newbyteorder('='))
+    if field.null is not None and values.dtype.kind in 'iu':
+        null = null | (values == int(field.null))
+    if values.dtype.kind in 'iu' and not null.any():
+        return values
+    values = values.astype(np.complex128 if values.dtype.kind == 'c' else np.float64)
+    values[null] = np.nan
+    return values
+
+
+def _row_dtype(fields, binary2):
+    # Layout of one row of fixed-size fields, or None when a field has variable length
+    if any(f.count is None for f in fields):
+        return None
+    dtype = _fixed_dtype(fields)
+    if binary2:
+        dtype = np.dtype([('nulls', 'u1', ((len(fields) + 7) // 8,))] + dtype.descr)
+    return dtype
+
+
+def _binary_rows(data, fields, binary2):
+    # Row-by-row decoder for streams with variable-length fields:
+    # (complete rows, bytes they use); a row cut at the end of `data` is left out
+    nulls_size = (len(fields) + 7) // 8 if binary2 else 0
+    rows, offset = [], 0
+    while offset < len(data):
+        start = offset
+        try:
+            nulls = np.unpackbits(np.frombuffer(data, np.uint8, nulls_size, offset)) if binary2 else None
+            offset += nulls_size
+            row = []
+            for i, f in enumerate(fields):
+                count = f.count
+                if count is None:
+                    count = struct.unpack_from('>I', data, offset)[0]
+                    offset += 4
+                dtype = np.dtype(DATATYPES[f.datatype])
+                value = np.frombuffer(data, dtype, count, offset)
+                offset += dtype.itemsize * count
+                is_null = bool(nulls[i]) if binary2 else False
+                row.append((value if count != 1 or not _is_scalar(f) else value[0], is_null))
+        except (struct.error, ValueError):
+            return rows, start
+        rows.append(row)
+    return rows, offset
+
+
+def _decode_binary(data, fields, wanted, binary2):
+    """Decode whole rows of fixed-size fields (BINARY / BINARY2 bytes) into {name: column} for the `wanted` fields."""
+    columns = {}
+    table = np.frombuffer(data, _row_dtype(fields, binary2))
+    nulls = np.unpackbits(table['nulls'], axis=1) if binary2 else None
+    for i, f in enumerate(fields):
+        if f.name in wanted:
+            null = nulls[:, i].astype(bool) if binary2 else np.zeros(len(table), dtype=bool)
+            columns[f.name] = _binary_column(table[f"f{i}"], f, null)
+    return columns
+
+
+def _decode_rows(rows, fields, wanted):
+    """Rows from `_binary_rows()` -> {name: column} for the `wanted` fields."""
+    columns = {}
+    for i, f in enumerate(fields):
+        if f.name in wanted:
+            values = [row[i][0] for row in rows]
+            null = np.array([row[i][1] for row in rows], dtype=bool)
+            if f.datatype in TEXT_DATATYPES or not _is_scalar(f):
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+                values = array
+            else:
+                values = np.array(values, dtype=DATATYPES[f.datatype])
+            columns[f.name] = _binary_column(values, f, null)
+    return columns
+
+
+def _check_stream(attrib):
+    if attrib.get('href') is not None:
+        raise ValueError("VOTable streams referencing external files are not supported")
+    if attrib.get('encoding', 'base64') != 'base64':
+        raise ValueError(f"Unsupported VOTable stream encoding: {attrib.get('encoding')}")
+
+
+
+
+# ------------------------ READING ------------------------
+def _wanted(fields, columns):
+    names = [f.name for f in fields]
+    if columns is None:
+        return names
+    columns = list(dict.fromkeys(columns))
+    missing = [c for c in columns if c not in names]
+    if missing:
+        raise KeyError(f"Columns not in VOTable: {missing}")
+    return columns
+
+
+def _chunk(rows, positions, wanted):
+    # Buffered TABLEDATA rows (projected cells) -> typed columns
+    return _frame({f.name: _tabledata_column([row[k] for row in rows], f)
+                   for k, (_, f) in enumerate(positions)}, wanted)
+
+
+class _TableReader:
+    """
+    XML parser target reading the first table of a VOTable: its FIELDs, then
+    its TABLEDATA rows or BINARY / BINARY2 stream, appended to `chunks` as
+    DataFrames as soon as `chunksize` rows are read. `done` is set at the end
+    of the table.
+    """
+
+    def __init__(self, columns, chunksize):
+        self.columns, self.chunksize = columns, chunksize
+        self.fields, self.field, self.format = [], None, None
+        self.wanted, self.positions = None, []
+        self.chunks, self.emitted, self.done = [], 0, False
+        self.text = None                    # text parts of the current TD or STREAM
+        self.cells, self.rows = None, []    # TABLEDATA: current TR, buffered projected rows
+        self.stream, self.encoded = None, 0 # BINARY: decoded bytes not turned into rows yet, buffered characters
+        self.row_dtype, self.binary_rows = None, []
+
+    def _emit(self, chunk):
+        self.chunks.append(chunk)
+        self.emitted += 1
+
+    def start(self, tag, attrib):
+        name = _local(tag)
+        if self.done:
+            return
+        if name == 'TD':
+            self.text = []
+        elif name == 'TR':
+            self.cells = []
+        elif name == 'FIELD' and self.format is None:
+            self.field = (attrib, None)
+        elif name == 'VALUES' and self.field is not None:
+            self.field = (self.field[0], attrib.get('null'))
+        elif name in ('TABLEDATA', 'BINARY', 'BINARY2'):
+            self.format = name
+            self.wanted = _wanted(self.fields, self.columns)
+            self.positions = [(i, f) for i, f in enumerate(self.fields) if f.name in self.wanted]
+        elif name == 'STREAM' and self.format in ('BINARY', 'BINARY2'):
+            _check_stream(attrib)
+            self.text, self.encoded, self.stream = [], 0, bytearray()
+            self.row_dtype = _row_dtype(self.fields, self.format == 'BINARY2')
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+            if self.stream is not None:
+                self.encoded += len(text)
+                if self.encoded >= STREAM_CHARS:
+                    self._decode_stream(final=False)
+
+    def end(self, tag):
+        name = _local(tag)
+        if self.done:
+            return
+        if name == 'TD':
+            self.cells.append(''.join(self.text))
+            self.text = None
+        elif name == 'TR' and self.cells is not None:
+            cells, last = self.cells, len(self.fields) - 1
+            if len(cells) <= last:
+                cells += [''] * (last + 1 - len(cells))
+            self.rows.append([cells[i] for i, _ in self.positions])
+            self.cells = None
+            if len(self.rows) >= self.chunksize:
+                self._emit(_chunk(self.rows, self.positions, self.wanted))
+                self.rows = []
+        elif name == 'FIELD' and self.field is not None:
+            self.fields.append(_field(*self.field))
+            self.field = None
+        elif name == 'STREAM' and self.stream is not None:
+            self._decode_stream(final=True)
+            self.text = self.stream = None
+        elif name == 'TABLE' and self.format is not None:
+            self.finish()
+            self.done = True
+
+    def close(self):
+        pass
+
+    def _decode_stream(self, final):
+        # Decode the buffered base64 characters (whole 4-character groups), then the complete rows
+        text = ''.join(''.join(self.text).split())
+        size = len(text) if final else len(text) // 4 * 4
+        self.stream += base64.b64decode(text[:size])
+        self.text, self.encoded = [text[size:]], len(text) - size
+        wanted, binary2 = set(self.wanted), self.format == 'BINARY2'
+
+        if self.row_dtype is not None:
+            width = self.row_dtype.itemsize
+            while len(self.stream) >= self.chunksize * width or (final and self.stream):
+                size = min(len(self.stream) // width, self.chunksize) * width
+                if size == 0:
+                    raise ValueError("Truncated VOTable BINARY stream")
+                self._emit(_frame(_decode_binary(bytes(self.stream[:size]), self.fields, wanted, binary2), self.wanted))
+                del self.stream[:size]
+            return
+
+        rows, size = _binary_rows(bytes(self.stream), self.fields, binary2)
+        del self.stream[:size]
+        if final and self.stream:
+            raise ValueError("Truncated VOTable BINARY stream")
+        self.binary_rows += rows
+        while len(self.binary_rows) >= self.chunksize or (final and self.binary_rows):
+            rows, self.binary_rows = self.binary_rows[:self.chunksize], self.binary_rows[self.chunksize:]
+            self._emit(_frame(_decode_rows(rows, self.fields, wanted), self.wanted))
+
+    def finish(self):
+        # Last TABLEDATA rows, or an empty frame for a table without rows
+        if self.rows or not self.emitted:
+            if self.wanted is None:
+                self.wanted = _wanted(self.fields, self.columns)
+                self.positions = [(i, f) for i, f in enumerate(self.fields) if f.name in self.wanted]
+            self._emit(_chunk(self.rows, self.positions, self.wanted))
+            self.rows = []
+
+
+def iter_votable(path, columns=None, chunksize=CHUNK_ROWS):
+    """
+    Yield the first table of a VOTable as DataFrames of at most `chunksize`
+    rows (TABLEDATA and BINARY / BINARY2 streams alike), optionally only `columns`.
+    """
+    reader = _TableReader(columns, chunksize)
+    parser = ET.XMLParser(target=reader)
+    with open(path, 'rb') as f:
+        while not reader.done:
+            block = f.read(READ_BYTES)
+            if not block:
+                parser.close()
+                reader.finish()
+                reader.done = True
+            else:
+                parser.feed(block)
+            yield from reader.chunks
+            reader.chunks.clear()
+
+
+def read_votable(path, columns=None, chunksize=CHUNK_ROWS):
+    """Read the first table of a VOTable into a DataFrame, optionally only `columns`."""
+    chunks = list(iter_votable(path, columns, chunksize))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)